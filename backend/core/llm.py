@@ -1,13 +1,26 @@
 """
 Minimal LangChain wrapper for insight text generation.
 LLM receives only structured inputs; constrained to avoid diagnosis and invented metrics.
+One long-lived async client is shared across requests so HTTP connections are reused.
 """
 import json
 import os
 
+import httpx
 from langchain_core.messages import HumanMessage, SystemMessage
 from langchain_openai import ChatOpenAI
 
+from core.config import (
+    LLM_MAX_CONNECTIONS,
+    LLM_MAX_RETRIES,
+    LLM_MODEL,
+    LLM_TIMEOUT_S,
+    OPENAI_BASE_URL,
+)
+from core.metrics import llm_calls
+
+PROMPT_VERSION = "1"  # bump whenever SYSTEM_PROMPT or the user message changes
+
 SYSTEM_PROMPT = """You write short, factual insight summaries from structured health data only.
 Rules:
 - Do NOT use medical diagnosis language (e.g. "you have", "diagnosis", "condition").
@@ -20,32 +33,68 @@ FALLBACK_INSIGHT = (
     "consider reviewing with your care team if you have questions."
 )
 
+_llm: ChatOpenAI | None = None
+_llm_key: str | None = None
+_http_client: httpx.AsyncClient | None = None
+
+
+def get_llm(api_key: str) -> ChatOpenAI:
+    """Return the shared client, (re)built only when the API key changes."""
+    global _llm, _llm_key, _http_client
+    if _llm is None or _llm_key != api_key:
+        if _http_client is None:
+            _http_client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=LLM_MAX_CONNECTIONS,
+                    max_keepalive_connections=LLM_MAX_CONNECTIONS,
+                ),
+                timeout=httpx.Timeout(LLM_TIMEOUT_S),
+            )
+        _llm = ChatOpenAI(
+            model=LLM_MODEL,
+            temperature=0.3,
+            api_key=api_key,
+            base_url=OPENAI_BASE_URL,
+            timeout=LLM_TIMEOUT_S,
+            max_retries=LLM_MAX_RETRIES,
+            http_async_client=_http_client,
+        )
+        _llm_key = api_key
+    return _llm
+
+
+async def aclose_llm() -> None:
+    """Close pooled HTTP connections (app shutdown)."""
+    global _llm, _llm_key, _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+    _llm = _llm_key = _http_client = None
+
 
-def generate_insight_text(payload: dict) -> str:
+async def generate_insight_text(payload: dict) -> str:
     """
     Generate insight text from structured payload (baseline deviations,
     anomaly summaries, correlation summaries). Returns deterministic fallback
-    if OPENAI_API_KEY is not set.
+    if OPENAI_API_KEY is not set or the call fails or times out.
     """
     api_key = os.getenv("OPENAI_API_KEY", "").strip()
     if not api_key:
+        llm_calls.inc("no_key")
         return FALLBACK_INSIGHT
 
     try:
-        llm = ChatOpenAI(
-            model="gpt-4o-mini",
-            temperature=0.3,
-            api_key=api_key,
-        )
+        llm = get_llm(api_key)
         # Only pass structured data as JSON; no free-form user text
         body = json.dumps(payload, default=str)
         messages = [
             SystemMessage(content=SYSTEM_PROMPT),
             HumanMessage(content=f"Summarize this structured data in one short insight.\n\n{body}"),
         ]
-        message = llm.invoke(messages)
+        message = await llm.ainvoke(messages)
         if message and hasattr(message, "content") and message.content:
+            llm_calls.inc("ok")
             return message.content.strip()
+        llm_calls.inc("empty")
     except Exception:
-        pass
+        llm_calls.inc("error")
     return FALLBACK_INSIGHT
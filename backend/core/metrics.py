@@ -0,0 +1,175 @@
+"""
+Minimal Prometheus-style metrics kept in process memory, rendered by GET /metrics.
+Recording is a dict lookup, a bisect and a few additions without locks, so it stays
+cheap on the hot path; a rare lost increment under thread races is accepted.
+
+- http_request_duration_seconds{method,route,status}: MetricsMiddleware
+- service_stage_duration_seconds{service,stage}: timed() blocks in the services
+  (fetch = SQL bucket query, compute = Python post-processing, llm, sql, stored)
+- http_response_render_seconds{route}: JSON serialization of the response body
+- db_query_rows{query}: rows returned per query
+"""
+import bisect
+import time
+from collections.abc import Callable, Iterable, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any
+
+from fastapi.responses import JSONResponse
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+ROW_BUCKETS = (0, 10, 100, 1_000, 10_000, 100_000, 1_000_000)
+
+
+def _label_str(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{n}="{v}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Histogram:
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        labelnames: tuple[str, ...],
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+    ):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = labelnames
+        self.buckets = buckets
+        self._series: dict[tuple[str, ...], list[Any]] = {}  # labels -> [bucket counts, sum, count]
+
+    def observe(self, value: float, *labels: str) -> None:
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.help_text}"
+        yield f"# TYPE {self.name} histogram"
+        for labels, (counts, total, count) in list(self._series.items()):
+            cumulative = 0
+            for bound, n in zip((*self.buckets, "+Inf"), counts):
+                cumulative += n
+                le = f'le="{bound}"'
+                yield f"{self.name}_bucket{_label_str(self.labelnames, labels, le)} {cumulative}"
+            yield f"{self.name}_sum{_label_str(self.labelnames, labels)} {total}"
+            yield f"{self.name}_count{_label_str(self.labelnames, labels)} {count}"
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labelnames: tuple[str, ...]):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = labelnames
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.help_text}"
+        yield f"# TYPE {self.name} counter"
+        for labels, value in list(self._values.items()):
+            yield f"{self.name}{_label_str(self.labelnames, labels)} {value}"
+
+
+http_request_seconds = Histogram(
+    "http_request_duration_seconds", "HTTP request latency.", ("method", "route", "status")
+)
+stage_seconds = Histogram(
+    "service_stage_duration_seconds", "Time per service stage.", ("service", "stage")
+)
+render_seconds = Histogram(
+    "http_response_render_seconds", "JSON serialization time of response bodies.", ("route",)
+)
+query_rows = Histogram("db_query_rows", "Rows returned per query.", ("query",), ROW_BUCKETS)
+llm_calls = Counter("llm_calls_total", "LLM calls by outcome.", ("outcome",))
+
+_REGISTRY: list[Histogram | Counter] = [
+    http_request_seconds,
+    stage_seconds,
+    render_seconds,
+    query_rows,
+    llm_calls,
+]
+_collectors: list[Callable[[], Iterable[str]]] = []
+
+
+def register_collector(collect: Callable[[], Iterable[str]]) -> None:
+    """Add a callable producing exposition lines at scrape time (e.g. pool gauges)."""
+    _collectors.append(collect)
+
+
+def render_metrics() -> str:
+    lines: list[str] = []
+    for metric in _REGISTRY:
+        lines.extend(metric.render())
+    for collect in _collectors:
+        lines.extend(collect())
+    return "\n".join(lines) + "\n"
+
+
+@contextmanager
+def timed(service: str, stage: str) -> Iterator[None]:
+    """Record the block's wall time under service_stage_duration_seconds{service,stage}."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        stage_seconds.observe(time.perf_counter() - started, service, stage)
+
+
+_current_scope: ContextVar[dict | None] = ContextVar("metrics_scope", default=None)
+
+
+def _route_label(scope: dict) -> str:
+    # Matched routes are static paths here, so the concrete path has bounded cardinality.
+    return scope["path"] if scope.get("route") is not None else "unmatched"
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware recording request latency by method, route and status."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        token = _current_scope.set(scope)
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            _current_scope.reset(token)
+            http_request_seconds.observe(
+                time.perf_counter() - started, scope["method"], _route_label(scope), str(status)
+            )
+
+
+class TimedJSONResponse(JSONResponse):
+    """Default response class that records body serialization time per route."""
+
+    def render(self, content: Any) -> bytes:
+        started = time.perf_counter()
+        body = super().render(content)
+        scope = _current_scope.get()
+        render_seconds.observe(time.perf_counter() - started, _route_label(scope) if scope else "unknown")
+        return body
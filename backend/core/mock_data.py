@@ -5,19 +5,33 @@ Deterministic mock data for demo mode.
 - Known anomaly: resting_hr spike for exactly 3 consecutive days (days 45–47).
 - Known correlation: sleep_hours negatively correlates with calories with 1-day lag
   (formula: calories[d] = 2000 - 80 * (sleep_hours[d-1] - 6.5)).
+
+SyntheticSpec / iter_synthetic_series scale the same formulas to many users, extra
+metrics, long ranges and up to per-minute samples, for load tests and benchmarks.
 """
+import io
 import math
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
+from typing import Any
 
+import numpy as np
 from sqlalchemy.orm import Session
 
-from models import Anomaly, HealthMetric
+from db.partitions import ensure_partitions
+from models import Anomaly
+from services.data_version import bump_data_versions
 
 DEMO_USER_ID = "demo-user"
 DEMO_SOURCE = "demo"
 START_DATE = datetime(2024, 1, 1, 12, 0, 0, tzinfo=timezone.utc)
 NUM_DAYS = 90
 ANOMALY_START_DAY = 45  # 3-day resting_hr spike: days 45, 46, 47
+ANOMALY_DAYS = 3
+ANOMALY_DELTA = 15.0
+SLEEP_CENTER = 6.5
+CALORIES_PER_SLEEP_HOUR = -80.0
 
 
 def _ts(day_offset: int) -> datetime:
@@ -34,11 +48,16 @@ def _steps(day: int) -> float:
     return 6000.0 + 2000.0 * math.sin(2 * math.pi * day / 5)
 
 
+def _resting_hr_base(day: int) -> float:
+    """Deterministic: ~60–65 bpm."""
+    return 62.0 + 3.0 * math.sin(day / 10.0)
+
+
 def _resting_hr(day: int) -> float:
     """Deterministic: ~60–65 bpm, spike +15 on days 45–47."""
-    base = 62.0 + 3.0 * math.sin(day / 10.0)
-    if ANOMALY_START_DAY <= day < ANOMALY_START_DAY + 3:
-        return base + 15.0
+    base = _resting_hr_base(day)
+    if ANOMALY_START_DAY <= day < ANOMALY_START_DAY + ANOMALY_DAYS:
+        return base + ANOMALY_DELTA
     return base
 
 
@@ -49,39 +68,30 @@ def _weight(day: int) -> float:
 
 def _calories(day: int, sleep_prev: float) -> float:
     """Negative correlation with previous day's sleep (1-day lag)."""
-    return 2000.0 - 80.0 * (sleep_prev - 6.5)
+    return 2000.0 + CALORIES_PER_SLEEP_HOUR * (sleep_prev - SLEEP_CENTER)
 
 
-def seed_demo_data(db: Session) -> None:
-    """Insert deterministic 90-day metrics and one anomaly. Idempotent only if table empty."""
+def demo_series() -> Iterator[tuple[str, str, str, np.ndarray, np.ndarray]]:
+    """The 90-day demo dataset as (user_id, metric_name, unit, ts, values) columns, rounded as stored."""
+    units = {"sleep_hours": "hours", "steps": "count", "calories": "kcal", "resting_hr": "bpm", "weight": "kg"}
+    columns: dict[str, list[float]] = {name: [] for name in units}
     sleep_prev = 6.5  # for day 0 calories
     for day in range(NUM_DAYS):
-        ts = _ts(day)
         sleep = _sleep_hours(day)
-        steps = _steps(day)
-        resting_hr = _resting_hr(day)
-        weight = _weight(day)
-        calories = _calories(day, sleep_prev)
+        columns["sleep_hours"].append(round(sleep, 2))
+        columns["steps"].append(round(_steps(day), 0))
+        columns["calories"].append(round(_calories(day, sleep_prev), 0))
+        columns["resting_hr"].append(round(_resting_hr(day), 1))
+        columns["weight"].append(round(_weight(day), 2))
         sleep_prev = sleep
+    ts = np.datetime64(START_DATE.replace(tzinfo=None), "us") + np.arange(NUM_DAYS) * np.timedelta64(1, "D")
+    for metric_name, values in columns.items():
+        yield DEMO_USER_ID, metric_name, units[metric_name], ts, np.array(values)
+
 
-        for metric_name, value, unit in [
-            ("sleep_hours", round(sleep, 2), "hours"),
-            ("steps", round(steps, 0), "count"),
-            ("calories", round(calories, 0), "kcal"),
-            ("resting_hr", round(resting_hr, 1), "bpm"),
-            ("weight", round(weight, 2), "kg"),
-        ]:
-            db.add(
-                HealthMetric(
-                    user_id=DEMO_USER_ID,
-                    source=DEMO_SOURCE,
-                    metric_name=metric_name,
-                    value=value,
-                    unit=unit,
-                    ts=ts,
-                    metadata_=None,
-                )
-            )
+def seed_demo_data(db: Session) -> None:
+    """Insert deterministic 90-day metrics and one anomaly. Idempotent only if table empty."""
+    load_series(db, demo_series(), DEMO_SOURCE)
 
     anomaly_start = _ts(ANOMALY_START_DAY)
     anomaly_end = _ts(ANOMALY_START_DAY + 3)
@@ -97,3 +107,237 @@ def seed_demo_data(db: Session) -> None:
         )
     )
     db.commit()
+
+
+# Scalable generator -------------------------------------------------------------
+
+# metric -> (unit, daily formula). Calories is flat here: its sleep coupling is a
+# LaggedCorrelation in DEFAULT_CORRELATIONS, which reproduces _calories exactly.
+DEMO_METRICS: dict[str, tuple[str, Any]] = {
+    "sleep_hours": ("hours", _sleep_hours),
+    "steps": ("count", _steps),
+    "calories": ("kcal", lambda day: _calories(day, SLEEP_CENTER)),
+    "resting_hr": ("bpm", _resting_hr_base),
+    "weight": ("kg", _weight),
+}
+
+
+@dataclass(frozen=True)
+class InjectedAnomaly:
+    """Add delta to metric_name on days [start_day, start_day + days); every_nth_user=1 hits all users."""
+
+    metric_name: str
+    start_day: int
+    days: int
+    delta: float
+    every_nth_user: int = 1
+
+
+@dataclass(frozen=True)
+class LaggedCorrelation:
+    """target[d] += coefficient * (source[d - lag_days] - center); days before the lag add nothing."""
+
+    source: str
+    target: str
+    lag_days: int
+    coefficient: float
+    center: float = 0.0
+
+
+DEFAULT_ANOMALIES = (InjectedAnomaly("resting_hr", ANOMALY_START_DAY, ANOMALY_DAYS, ANOMALY_DELTA),)
+DEFAULT_CORRELATIONS = (
+    LaggedCorrelation("sleep_hours", "calories", 1, CALORIES_PER_SLEEP_HOUR, SLEEP_CENTER),
+)
+
+
+@dataclass(frozen=True)
+class SyntheticSpec:
+    """
+    Shape of a generated dataset. With the defaults it is the demo dataset for one
+    user (daily values as in seed_demo_data, unrounded). User i reads the formulas
+    shifted by i % 7 days so users differ; injected anomalies stay on their
+    configured days. extra_metrics adds synthetic_NN series with their own periods.
+    samples_per_day > 1 spreads each day into evenly spaced samples whose
+    zero-sum intraday wave keeps the daily average equal to the daily formula.
+    noise is the standard deviation of seeded Gaussian noise relative to the value.
+    """
+
+    users: int = 1
+    days: int = NUM_DAYS
+    samples_per_day: int = 1
+    metrics: tuple[str, ...] = tuple(DEMO_METRICS)
+    extra_metrics: int = 0
+    anomalies: tuple[InjectedAnomaly, ...] = DEFAULT_ANOMALIES
+    correlations: tuple[LaggedCorrelation, ...] = DEFAULT_CORRELATIONS
+    noise: float = 0.0
+    intraday_amplitude: float = 0.1
+    seed: int = 0
+    start: datetime = START_DATE
+    user_prefix: str = "synthetic-user"
+    source: str = "synthetic"
+
+    @property
+    def metric_names(self) -> list[str]:
+        return [*self.metrics, *(f"synthetic_{i:02d}" for i in range(self.extra_metrics))]
+
+    @property
+    def rows(self) -> int:
+        return self.users * len(self.metric_names) * self.days * self.samples_per_day
+
+    def user_id(self, index: int) -> str:
+        return f"{self.user_prefix}-{index:05d}"
+
+
+def _daily_formula(metric_name: str):
+    if metric_name in DEMO_METRICS:
+        return DEMO_METRICS[metric_name]
+    k = int(metric_name.rsplit("_", 1)[1])
+    return "units", lambda day: 50.0 + 10.0 * math.sin(2 * math.pi * day / (3 + k))
+
+
+def synthetic_daily_values(spec: SyntheticSpec, user_index: int) -> dict[str, np.ndarray]:
+    """Daily values per metric for one user: formulas, correlations, anomalies, then noise."""
+    shift = user_index % 7
+    daily = {
+        name: np.array([_daily_formula(name)[1](day + shift) for day in range(spec.days)])
+        for name in spec.metric_names
+    }
+    for c in spec.correlations:
+        if c.source in daily and c.target in daily and c.lag_days < spec.days:
+            src = daily[c.source]
+            daily[c.target][c.lag_days:] += c.coefficient * (src[: spec.days - c.lag_days] - c.center)
+    for a in spec.anomalies:
+        if a.metric_name in daily and user_index % a.every_nth_user == 0:
+            daily[a.metric_name][a.start_day : a.start_day + a.days] += a.delta
+    if spec.noise > 0:
+        rng = np.random.default_rng([spec.seed, user_index])
+        for name in spec.metric_names:
+            values = daily[name]
+            values += rng.normal(0.0, spec.noise, spec.days) * np.abs(values)
+    return daily
+
+
+def synthetic_timestamps(spec: SyntheticSpec) -> np.ndarray:
+    """
+    Naive UTC datetime64[us] of every sample, day-major. Samples are evenly spaced from
+    spec.start's time of day and wrap within the same UTC day (one per day: that time).
+    """
+    day_us = 86_400_000_000
+    start = spec.start.astimezone(timezone.utc).replace(tzinfo=None)
+    midnight = start.replace(hour=0, minute=0, second=0, microsecond=0)
+    time_of_day = (start - midnight) // timedelta(microseconds=1)
+    within = (time_of_day + np.arange(spec.samples_per_day, dtype=np.int64) * (day_us // spec.samples_per_day)) % day_us
+    offsets = np.arange(spec.days, dtype=np.int64)[:, None] * day_us + within[None, :]
+    return np.datetime64(midnight, "us") + offsets.ravel().astype("timedelta64[us]")
+
+
+def synthetic_samples(spec: SyntheticSpec, daily: np.ndarray) -> np.ndarray:
+    """Expand daily values to samples_per_day each; the intraday wave sums to zero per day."""
+    n = spec.samples_per_day
+    if n == 1:
+        return daily.copy()
+    wave = np.sin(2 * np.pi * np.arange(n) / n)
+    wave -= wave.mean()
+    return (daily[:, None] * (1.0 + spec.intraday_amplitude * wave[None, :])).ravel()
+
+
+def iter_synthetic_series(spec: SyntheticSpec) -> Iterator[tuple[str, str, str, np.ndarray, np.ndarray]]:
+    """Yield (user_id, metric_name, unit, ts datetime64[us], values) per user and metric, columnar."""
+    ts = synthetic_timestamps(spec)
+    for user_index in range(spec.users):
+        user_id = spec.user_id(user_index)
+        for metric_name, daily in synthetic_daily_values(spec, user_index).items():
+            yield user_id, metric_name, _daily_formula(metric_name)[0], ts, synthetic_samples(spec, daily)
+
+
+def iter_synthetic_rows(spec: SyntheticSpec) -> Iterator[dict[str, Any]]:
+    """Row dicts shaped like services.ingest rows (ts as aware datetimes); fine up to ~1M rows."""
+    for user_id, metric_name, unit, ts, values in iter_synthetic_series(spec):
+        for t, v in zip(ts.tolist(), values.tolist()):
+            yield {
+                "user_id": user_id,
+                "source": spec.source,
+                "metric_name": metric_name,
+                "value": v,
+                "unit": unit,
+                "ts": t.replace(tzinfo=timezone.utc),
+                "metadata_": None,
+            }
+
+
+# Bulk loading -------------------------------------------------------------------
+
+COPY_BATCH_ROWS = 250_000
+_METRIC_COPY = "COPY health_metric (user_id, source, metric_name, unit, value, ts) FROM STDIN"
+_DAILY_COPY = (
+    "COPY health_metric_daily (user_id, metric_name, day, value_sum, value_count, value_min, value_max) "
+    "FROM STDIN"
+)
+
+
+def _copy(db: Session, sql: str, lines: list[str]) -> None:
+    if not lines:
+        return
+    buf = io.StringIO("\n".join(lines) + "\n")
+    cursor = db.connection().connection.cursor()
+    try:
+        cursor.copy_expert(sql, buf)
+    finally:
+        cursor.close()
+
+
+def load_series(
+    db: Session,
+    series: Iterable[tuple[str, str, str, np.ndarray, np.ndarray]],
+    source: str,
+    batch_rows: int = COPY_BATCH_ROWS,
+) -> int:
+    """
+    COPY columnar (user_id, metric_name, unit, ts, values) series into health_metric and
+    their daily aggregates into health_metric_daily; ts is naive UTC datetime64, day-major.
+    Missing monthly partitions are created first and the users' data versions bumped.
+    For seeding only: the users must not have rows yet (no upsert). Does not commit.
+    Returns rows written to health_metric.
+    """
+    metric_lines: list[str] = []
+    daily_lines: list[str] = []
+    ts_key = None
+    ts_text: list[str] = []
+    users: set[str] = set()
+    total = 0
+    for user_id, metric_name, unit, ts, values in series:
+        if ts is not ts_key:  # generators share one ts array across series
+            ts_key = ts
+            ts_text = [f"{t}+00" for t in np.datetime_as_string(ts, unit="us")]
+            days = ts.astype("datetime64[D]")
+            day_starts = np.flatnonzero(np.r_[True, days[1:] != days[:-1]])
+            day_text = np.datetime_as_string(days[day_starts]).tolist()
+            day_counts = np.diff(np.r_[day_starts, len(days)]).tolist()
+            ensure_partitions(db.connection(), np.unique(ts.astype("datetime64[M]")).tolist())
+        prefix = f"{user_id}\t{source}\t{metric_name}\t{unit}\t"
+        metric_lines.extend([f"{prefix}{v}\t{t}" for v, t in zip(values.tolist(), ts_text)])
+        sums = np.add.reduceat(values, day_starts).tolist()
+        mins = np.minimum.reduceat(values, day_starts).tolist()
+        maxs = np.maximum.reduceat(values, day_starts).tolist()
+        daily_lines.extend(
+            f"{user_id}\t{metric_name}\t{d}\t{s}\t{n}\t{lo}\t{hi}"
+            for d, s, n, lo, hi in zip(day_text, sums, day_counts, mins, maxs)
+        )
+        users.add(user_id)
+        total += len(values)
+        if len(metric_lines) >= batch_rows:
+            _copy(db, _METRIC_COPY, metric_lines)
+            _copy(db, _DAILY_COPY, daily_lines)
+            metric_lines.clear()
+            daily_lines.clear()
+    _copy(db, _METRIC_COPY, metric_lines)
+    _copy(db, _DAILY_COPY, daily_lines)
+    bump_data_versions(db, users)
+    return total
+
+
+def seed_synthetic_data(db: Session, spec: SyntheticSpec) -> int:
+    """Bulk-load a SyntheticSpec dataset (users must be new); commits. Returns rows written."""
+    total = load_series(db, iter_synthetic_series(spec), spec.source)
+    db.commit()
+    return total
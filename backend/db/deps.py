@@ -1,13 +1,62 @@
-from collections.abc import Generator
+from collections.abc import AsyncGenerator, Generator
+from datetime import datetime, timezone
 
+from fastapi import Depends, HTTPException, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from db.session import SessionLocal
+from core.config import DB_ROUTE_STATEMENT_TIMEOUTS_MS
+from db.session import AsyncSessionLocal, SessionLocal
+from services.data_version import data_etag, data_version_async, etag_matches
 
 
-def get_db() -> Generator[Session, None, None]:
+def _route_statement_timeout(request: Request) -> int | None:
+    """Per-route statement_timeout override (ms), keyed by request path (routes are static)."""
+    return DB_ROUTE_STATEMENT_TIMEOUTS_MS.get(request.url.path)
+
+
+def get_db(request: Request) -> Generator[Session, None, None]:
     db = SessionLocal()
+    timeout_ms = _route_statement_timeout(request)
+    if timeout_ms is not None:
+        db.info["statement_timeout_ms"] = timeout_ms
     try:
         yield db
     finally:
         db.close()
+
+
+async def get_async_db(request: Request) -> AsyncGenerator[AsyncSession, None]:
+    async with AsyncSessionLocal() as db:
+        timeout_ms = _route_statement_timeout(request)
+        if timeout_ms is not None:
+            db.info["statement_timeout_ms"] = timeout_ms
+        yield db
+
+
+class ConditionalGet:
+    """
+    Route dependency: ETag from (path, query params, data version of the user_id param
+    or of all users). A matching If-None-Match is answered 304 here, before the endpoint
+    runs; otherwise the ETag is set on the response and returned, for endpoints that
+    build a Response themselves. daily=True also keys on the UTC date, for responses
+    that depend on today as well as on the data.
+    """
+
+    def __init__(self, daily: bool = False):
+        self.daily = daily
+
+    async def __call__(
+        self, request: Request, response: Response, db: AsyncSession = Depends(get_async_db)
+    ) -> str:
+        version = await data_version_async(db, request.query_params.get("user_id"))
+        extra = (datetime.now(timezone.utc).date().isoformat(),) if self.daily else ()
+        etag = data_etag(request.url.path, request.query_params.multi_items(), version, *extra)
+        headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            raise HTTPException(304, headers=headers)
+        response.headers.update(headers)
+        return etag
+
+
+conditional_get = ConditionalGet()
@@ -0,0 +1,97 @@
+"""
+Monthly range partitions of health_metric on ts (UTC month boundaries).
+The parent is declared PARTITION BY RANGE (ts) on the model; partitions are created
+by the app: PARTITION_MONTHS_AHEAD months ahead at schema setup (scripts.partitions
+ensure for long-running deployments), and on demand by writers for any month their
+rows fall in (backfills, old device data). There is no default partition, so a row
+outside every partition fails loudly instead of piling up unpruned.
+"""
+from collections.abc import Iterable
+from datetime import date, datetime, timezone
+
+from sqlalchemy import Connection, text
+
+from core.config import PARTITION_MONTHS_AHEAD
+
+PARENT = "health_metric"
+
+_known: set[date] = set()  # months known to have a partition (this process)
+
+
+def month_start(ts: date | datetime) -> date:
+    """First day of the UTC month containing ts; naive datetimes are taken as UTC."""
+    if isinstance(ts, datetime) and ts.tzinfo is not None:
+        ts = ts.astimezone(timezone.utc)
+    return date(ts.year, ts.month, 1)
+
+
+def add_months(month: date, n: int) -> date:
+    index = month.year * 12 + month.month - 1 + n
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"{PARENT}_p{month:%Y%m}"
+
+
+def is_partitioned(conn: Connection) -> bool:
+    return bool(
+        conn.execute(
+            text("SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass(:name)"), {"name": PARENT}
+        ).scalar()
+    )
+
+
+def existing_partitions(conn: Connection) -> set[date]:
+    """Months with a partition, parsed from partition names."""
+    names = conn.execute(
+        text("SELECT inhrelid::regclass::text FROM pg_inherits WHERE inhparent = to_regclass(:name)"),
+        {"name": PARENT},
+    ).scalars()
+    prefix = f"{PARENT}_p"
+    return {
+        date(int(n[len(prefix) : len(prefix) + 4]), int(n[len(prefix) + 4 :]), 1)
+        for n in names
+        if n.startswith(prefix)
+    }
+
+
+def ensure_partitions(conn: Connection, months: Iterable[date]) -> list[date]:
+    """
+    Create missing monthly partitions on conn's transaction (not committed here); returns
+    the months created. No-op when health_metric is not partitioned. Creating a partition
+    locks the parent until commit, so writers pay this only for months not made ahead of time.
+    """
+    wanted = {month_start(m) for m in months} - _known
+    if not wanted:
+        return []
+    if not is_partitioned(conn):
+        return []
+    existing = existing_partitions(conn)
+    created = []
+    for month in sorted(wanted - existing):
+        conn.execute(
+            text(
+                f"CREATE TABLE IF NOT EXISTS {partition_name(month)} PARTITION OF {PARENT} "
+                f"FOR VALUES FROM ('{month} 00:00+00') TO ('{add_months(month, 1)} 00:00+00')"
+            )
+        )
+        created.append(month)
+    _known.update(wanted & existing)  # new ones are cached once seen committed
+    return created
+
+
+def ensure_partitions_for(conn: Connection, timestamps: Iterable[date | datetime]) -> list[date]:
+    """ensure_partitions for every month the given timestamps fall in."""
+    return ensure_partitions(conn, {month_start(ts) for ts in timestamps})
+
+
+def ensure_upcoming_partitions(conn: Connection, today: date | None = None) -> list[date]:
+    """Partitions for the current month and PARTITION_MONTHS_AHEAD months after it."""
+    first = month_start(today or datetime.now(timezone.utc).date())
+    return ensure_partitions(conn, (add_months(first, n) for n in range(PARTITION_MONTHS_AHEAD + 1)))
+
+
+def forget_partitions() -> None:
+    """Drop the in-process cache, e.g. after partitions were dropped or the table rebuilt."""
+    _known.clear()
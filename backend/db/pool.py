@@ -0,0 +1,130 @@
+"""
+Instrumented connection pools and per-route statement timeouts.
+Each engine's pool counts checkouts, time spent obtaining a connection (queue wait,
+pre-ping and new connections), overflow use and pool timeouts; statement timeouts
+raised by Postgres are counted per engine too. Sessions carrying
+info["statement_timeout_ms"] issue SET LOCAL statement_timeout on every transaction.
+"""
+import time
+from typing import Any
+
+from sqlalchemy import Engine, event, exc
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+from core.metrics import register_collector
+
+QUERY_CANCELED = "57014"  # SQLSTATE raised when statement_timeout fires
+
+
+class PoolStats:
+    """Counters for one engine; plain attribute increments keep the hot path cheap."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.checkouts = 0
+        self.checkins = 0
+        self.connects = 0
+        self.overflow_checkouts = 0
+        self.overflow_max = 0
+        self.pool_timeouts = 0
+        self.statement_timeouts = 0
+        self.checkout_ms_total = 0.0
+        self.checkout_ms_max = 0.0
+        self.pool: QueuePool | None = None
+
+    def snapshot(self) -> dict[str, Any]:
+        pool = self.pool
+        return {
+            "checkouts": self.checkouts,
+            "checkins": self.checkins,
+            "connects": self.connects,
+            "overflow_checkouts": self.overflow_checkouts,
+            "overflow_max": self.overflow_max,
+            "pool_timeouts": self.pool_timeouts,
+            "statement_timeouts": self.statement_timeouts,
+            "checkout_ms_avg": round(self.checkout_ms_total / self.checkouts, 3) if self.checkouts else 0.0,
+            "checkout_ms_max": round(self.checkout_ms_max, 3),
+            "size": pool.size() if pool else 0,
+            "checked_out": pool.checkedout() if pool else 0,
+            "overflow": max(pool.overflow(), 0) if pool else 0,
+        }
+
+
+pool_stats = {"sync": PoolStats("sync"), "async": PoolStats("async")}
+
+
+def _instrumented(base: type[QueuePool], stats: PoolStats) -> type[QueuePool]:
+    class InstrumentedPool(base):
+        def connect(self):
+            started = time.perf_counter()
+            try:
+                conn = super().connect()
+            except exc.TimeoutError:
+                stats.pool_timeouts += 1
+                raise
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            stats.checkouts += 1
+            stats.checkout_ms_total += elapsed_ms
+            if elapsed_ms > stats.checkout_ms_max:
+                stats.checkout_ms_max = elapsed_ms
+            overflow = self.checkedout() - self.size()
+            if overflow > 0:
+                stats.overflow_checkouts += 1
+                stats.overflow_max = max(stats.overflow_max, overflow)
+            return conn
+
+    InstrumentedPool.__name__ = f"Instrumented{base.__name__}"
+    return InstrumentedPool
+
+
+InstrumentedQueuePool = _instrumented(QueuePool, pool_stats["sync"])
+InstrumentedAsyncPool = _instrumented(AsyncAdaptedQueuePool, pool_stats["async"])
+
+
+def is_statement_timeout(error: BaseException) -> bool:
+    orig = getattr(error, "orig", error)
+    return QUERY_CANCELED in (getattr(orig, "pgcode", None), getattr(orig, "sqlstate", None))
+
+
+def instrument_engine(engine: Engine, stats: PoolStats) -> None:
+    """Attach pool and error listeners; for an AsyncEngine pass its sync_engine."""
+    stats.pool = engine.pool
+
+    @event.listens_for(engine, "connect")
+    def _connect(dbapi_conn, record):
+        stats.connects += 1
+
+    @event.listens_for(engine, "checkin")
+    def _checkin(dbapi_conn, record):
+        stats.checkins += 1
+
+    @event.listens_for(engine, "handle_error")
+    def _handle_error(context):
+        if is_statement_timeout(context.original_exception):
+            stats.statement_timeouts += 1
+
+
+@event.listens_for(Session, "after_begin")
+def _apply_statement_timeout(session, transaction, connection):
+    timeout_ms = session.info.get("statement_timeout_ms")
+    if timeout_ms is not None:
+        connection.exec_driver_sql(f"SET LOCAL statement_timeout = {int(timeout_ms)}")
+
+
+def _collect_metrics():
+    snapshots = {name: stats.snapshot() for name, stats in pool_stats.items()}
+    for key in ("checkouts", "connects", "overflow_checkouts", "pool_timeouts", "statement_timeouts"):
+        yield f"# TYPE db_pool_{key}_total counter"
+        for name, snap in snapshots.items():
+            yield f'db_pool_{key}_total{{engine="{name}"}} {snap[key]}'
+    yield "# TYPE db_pool_checkout_seconds_total counter"
+    for name, stats in pool_stats.items():
+        yield f'db_pool_checkout_seconds_total{{engine="{name}"}} {stats.checkout_ms_total / 1000}'
+    for key in ("size", "checked_out", "overflow"):
+        yield f"# TYPE db_pool_{key} gauge"
+        for name, snap in snapshots.items():
+            yield f'db_pool_{key}{{engine="{name}"}} {snap[key]}'
+
+
+register_collector(_collect_metrics)
@@ -0,0 +1,55 @@
+"""
+Schema setup without a migration tool: create_all for new tables, then idempotent
+DDL for columns and indexes added to tables that may already exist (dropping the
+indexes they supersede), and upcoming health_metric partitions. An existing
+unpartitioned health_metric is left as is; convert it with scripts.partitions migrate.
+"""
+from sqlalchemy import Engine, text
+
+import models  # noqa: F401  (registers every table on Base.metadata)
+from db.base import Base
+from db.partitions import ensure_upcoming_partitions
+
+_ADDITIVE_DDL = (
+    "ALTER TABLE anomaly ADD COLUMN IF NOT EXISTS user_id VARCHAR(255)",
+    "CREATE INDEX IF NOT EXISTS ix_anomaly_user_start ON anomaly (user_id, start_ts)",
+    "ALTER TABLE anomaly_watermark ADD COLUMN IF NOT EXISTS state JSONB",
+    # Duplicate detector windows from before writers were serialized block the unique index.
+    "DELETE FROM anomaly a USING anomaly b WHERE a.user_id IS NOT NULL AND a.user_id = b.user_id "
+    "AND a.metric_name = b.metric_name AND a.start_ts = b.start_ts AND a.id > b.id",
+    "CREATE UNIQUE INDEX IF NOT EXISTS ux_anomaly_user_metric_start ON anomaly (user_id, metric_name, start_ts) "
+    "WHERE user_id IS NOT NULL",
+    "ALTER TABLE analytics_snapshot ADD COLUMN IF NOT EXISTS data_version BIGINT",
+    # Start the all-users counter at the old all-users version (the sum) so ETags carry over.
+    "INSERT INTO data_version_total (id, version, updated_at) "
+    "SELECT 1, coalesce(sum(version), 0), now() FROM user_data_version ON CONFLICT (id) DO NOTHING",
+    "CREATE INDEX IF NOT EXISTS ix_health_metric_user_ts_incl ON health_metric (user_id, ts) "
+    "INCLUDE (metric_name, value)",
+    "CREATE INDEX IF NOT EXISTS ix_health_metric_ts_incl ON health_metric (ts) INCLUDE (metric_name, value)",
+    "CREATE INDEX IF NOT EXISTS ix_health_metric_daily_user_day_incl ON health_metric_daily (user_id, day) "
+    "INCLUDE (metric_name, value_sum, value_count)",
+    "CREATE INDEX IF NOT EXISTS ix_health_metric_daily_day_incl ON health_metric_daily (day) "
+    "INCLUDE (user_id, metric_name, value_sum, value_count)",
+)
+
+# Replaced by the covering indexes above; dropped once those exist.
+_SUPERSEDED_INDEXES = (
+    "ix_health_metric_user_id",
+    "ix_health_metric_metric_name",
+    "ix_health_metric_ts",
+    "ix_health_metric_user_ts",
+    "ix_health_metric_metric_ts",
+    "ix_health_metric_daily_user_day",
+    "ix_health_metric_daily_day",
+)
+
+
+def create_schema(engine: Engine) -> None:
+    """Create missing tables and apply additive changes to existing ones."""
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        for ddl in _ADDITIVE_DDL:
+            conn.execute(text(ddl))
+        for name in _SUPERSEDED_INDEXES:
+            conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+        ensure_upcoming_partitions(conn)
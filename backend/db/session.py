@@ -1,12 +1,34 @@
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
 
-from core.config import DATABASE_URL
+from core.config import (
+    ASYNC_DATABASE_URL,
+    DATABASE_URL,
+    DB_MAX_OVERFLOW,
+    DB_POOL_PRE_PING,
+    DB_POOL_RECYCLE_S,
+    DB_POOL_SIZE,
+    DB_POOL_TIMEOUT_S,
+    DB_STATEMENT_TIMEOUT_MS,
+)
+from db.pool import InstrumentedAsyncPool, InstrumentedQueuePool, instrument_engine, pool_stats
+
+_POOL_OPTIONS = {
+    "pool_size": DB_POOL_SIZE,
+    "max_overflow": DB_MAX_OVERFLOW,
+    "pool_timeout": DB_POOL_TIMEOUT_S,
+    "pool_recycle": DB_POOL_RECYCLE_S,
+    "pool_pre_ping": DB_POOL_PRE_PING,
+}
 
+# Sync engine: ingestion (COPY), startup seeding and scripts. No default statement timeout.
 engine = create_engine(
     DATABASE_URL,
-    pool_pre_ping=True,
+    poolclass=InstrumentedQueuePool,
+    **_POOL_OPTIONS,
 )
+instrument_engine(engine, pool_stats["sync"])
 
 SessionLocal = sessionmaker(
     bind=engine,
@@ -14,3 +36,19 @@ SessionLocal = sessionmaker(
     autoflush=False,
     expire_on_commit=False,
 )
+
+# Async engine: read routes, so in-flight queries are not capped by the threadpool.
+# Its connections start with DB_STATEMENT_TIMEOUT_MS, set at connect time (no extra round trip).
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    poolclass=InstrumentedAsyncPool,
+    connect_args={"server_settings": {"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)}},
+    **_POOL_OPTIONS,
+)
+instrument_engine(async_engine.sync_engine, pool_stats["async"])
+
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine,
+    autoflush=False,
+    expire_on_commit=False,
+)
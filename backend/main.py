@@ -1,42 +1,125 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy import select
+from fastapi.responses import JSONResponse, PlainTextResponse
+from sqlalchemy import inspect, select
+from sqlalchemy.exc import DBAPIError, TimeoutError as PoolTimeoutError
 
-from core.config import DEMO_MODE
-from db.base import Base
+from core.config import (
+    ANALYTICS_BACKEND,
+    DEMO_MODE,
+    DEMO_SEED_DAYS,
+    DEMO_SEED_EXTRA_METRICS,
+    DEMO_SEED_SAMPLES_PER_DAY,
+    DEMO_SEED_USERS,
+    PRECOMPUTE_ENABLED,
+)
+from core.metrics import MetricsMiddleware, TimedJSONResponse, render_metrics
+from db.pool import is_statement_timeout, pool_stats
+from db.schema import create_schema
 from db.session import SessionLocal, engine
-from models import HealthMetric
+from models import HealthMetric, HealthMetricDaily
 from routers.health import router as health_router
 from routers.insights import router as insights_router
 from routers.analytics import router as analytics_router
+from routers.dashboard import router as dashboard_router
 
-app = FastAPI(title="Smart Health API")
+app = FastAPI(title="Smart Health API", default_response_class=TimedJSONResponse)
 
 
 @app.on_event("startup")
 def startup() -> None:
-    if not DEMO_MODE:
-        return
-    Base.metadata.create_all(bind=engine)
+    if DEMO_MODE:
+        create_schema(engine)
+    elif not inspect(engine).has_table(HealthMetricDaily.__tablename__):
+        return  # schema not set up yet; scripts.rollup rebuild creates and fills it
     db = SessionLocal()
     try:
-        if db.scalar(select(HealthMetric.id).limit(1)) is None:
-            from core.mock_data import seed_demo_data
+        if DEMO_MODE and db.scalar(select(HealthMetric.id).limit(1)) is None:
+            from core.mock_data import SyntheticSpec, seed_demo_data, seed_synthetic_data
 
             seed_demo_data(db)
+            if DEMO_SEED_USERS > 0:
+                seed_synthetic_data(
+                    db,
+                    SyntheticSpec(
+                        users=DEMO_SEED_USERS,
+                        days=DEMO_SEED_DAYS,
+                        samples_per_day=DEMO_SEED_SAMPLES_PER_DAY,
+                        extra_metrics=DEMO_SEED_EXTRA_METRICS,
+                    ),
+                )
+        else:
+            # Metrics predating the rollup table are backfilled once, demo or not.
+            from services.rollup import backfill_empty_rollup
+
+            backfill_empty_rollup(db)
+    finally:
+        db.close()
+
+
+@app.on_event("startup")
+def load_analytics_backend() -> None:
+    if ANALYTICS_BACKEND != "duckdb":
+        return
+    from services.duckdb_store import get_store
+
+    store = get_store()
+    if store.read_only:
+        return
+    db = SessionLocal()
+    try:
+        store.load_from_postgres(db)
     finally:
         db.close()
 
+
+@app.on_event("startup")
+async def start_precompute() -> None:
+    if not PRECOMPUTE_ENABLED:
+        return
+    import asyncio
+
+    from services.precompute import scheduler
+
+    app.state.precompute_task = asyncio.create_task(scheduler.run_forever())
+
+
+@app.on_event("shutdown")
+async def shutdown() -> None:
+    from core.llm import aclose_llm
+    from db.session import async_engine
+
+    task = getattr(app.state, "precompute_task", None)
+    if task is not None:
+        task.cancel()
+    await aclose_llm()
+    await async_engine.dispose()
+
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(MetricsMiddleware)
 
 app.include_router(health_router, prefix="/health")
 app.include_router(insights_router, prefix="/insights")
 app.include_router(analytics_router, prefix="/analytics")
+app.include_router(dashboard_router, prefix="/dashboard")
+
+
+@app.exception_handler(DBAPIError)
+async def db_error_handler(request: Request, error: DBAPIError):
+    if is_statement_timeout(error):
+        return JSONResponse(status_code=503, content={"detail": "Query exceeded the statement timeout."})
+    raise error
+
+
+@app.exception_handler(PoolTimeoutError)
+async def pool_timeout_handler(request: Request, error: PoolTimeoutError):
+    return JSONResponse(status_code=503, content={"detail": "No database connection available."})
 
 
 @app.get("/healthz")
@@ -44,6 +127,18 @@ def healthz():
     return {"ok": True}
 
 
+@app.get("/healthz/pool")
+def healthz_pool():
+    """Connection pool counters per engine (sync: ingest/scripts, async: read routes)."""
+    return {name: stats.snapshot() for name, stats in pool_stats.items()}
+
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """Prometheus text exposition of request, stage, row-count and pool metrics."""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
 if __name__ == "__main__":
     import uvicorn
 
@@ -1,5 +1,19 @@
+from models.analytics_snapshot import AnalyticsSnapshot
 from models.anomaly import Anomaly
+from models.anomaly_watermark import AnomalyWatermark
+from models.data_version_total import DataVersionTotal
 from models.health_metric import HealthMetric
+from models.health_metric_daily import HealthMetricDaily
 from models.insight import Insight
+from models.user_data_version import UserDataVersion
 
-__all__ = ["HealthMetric", "Insight", "Anomaly"]
+__all__ = [
+    "HealthMetric",
+    "HealthMetricDaily",
+    "Insight",
+    "Anomaly",
+    "AnomalyWatermark",
+    "AnalyticsSnapshot",
+    "UserDataVersion",
+    "DataVersionTotal",
+]
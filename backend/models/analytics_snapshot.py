@@ -0,0 +1,25 @@
+from datetime import date, datetime
+from typing import Any
+
+from sqlalchemy import BigInteger, Date, DateTime, Float, Integer, String
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import Mapped, mapped_column
+
+from db.base import Base
+
+
+class AnalyticsSnapshot(Base):
+    """Precomputed analytics response per (user, kind, standard window), replaced on each run."""
+
+    __tablename__ = "analytics_snapshot"
+
+    user_id: Mapped[str] = mapped_column(String(255), primary_key=True)
+    kind: Mapped[str] = mapped_column(String(64), primary_key=True)
+    window_days: Mapped[int] = mapped_column(Integer, primary_key=True)
+    start_date: Mapped[date] = mapped_column(Date, nullable=False)
+    end_date: Mapped[date] = mapped_column(Date, nullable=False)
+    payload: Mapped[Any] = mapped_column(JSONB, nullable=False)
+    computed_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    elapsed_ms: Mapped[float] = mapped_column(Float, nullable=False)
+    # user_data_version.version the payload was computed from; NULL rows are never served
+    data_version: Mapped[int | None] = mapped_column(BigInteger, nullable=True)
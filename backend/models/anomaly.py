@@ -12,6 +12,8 @@ class Anomaly(Base):
     __tablename__ = "anomaly"
 
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    # Set for detector-written windows (services.anomaly_store); NULL for hand-written rows.
+    user_id: Mapped[str | None] = mapped_column(String(255), nullable=True)
     metric_name: Mapped[str] = mapped_column(String(255), index=True, nullable=False)
     start_ts: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), index=True, nullable=False
@@ -28,4 +30,14 @@ class Anomaly(Base):
 
     __table_args__ = (
         Index("ix_anomaly_metric_start", "metric_name", "start_ts"),
+        Index("ix_anomaly_user_start", "user_id", "start_ts"),
+        # One detector window per series start; hand-written rows (user_id NULL) are exempt.
+        Index(
+            "ux_anomaly_user_metric_start",
+            "user_id",
+            "metric_name",
+            "start_ts",
+            unique=True,
+            postgresql_where=user_id.isnot(None),
+        ),
     )
@@ -0,0 +1,23 @@
+from datetime import date, datetime
+from typing import Any
+
+from sqlalchemy import Date, DateTime, String
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import Mapped, mapped_column
+
+from db.base import Base
+
+
+class AnomalyWatermark(Base):
+    """
+    Last day scanned by incremental anomaly detection, per (user, metric), and the
+    detector's trailing window as of that day (RollingBaseline.to_state; NULL after a rewind).
+    """
+
+    __tablename__ = "anomaly_watermark"
+
+    user_id: Mapped[str] = mapped_column(String(255), primary_key=True)
+    metric_name: Mapped[str] = mapped_column(String(255), primary_key=True)
+    last_day: Mapped[date] = mapped_column(Date, nullable=False)
+    state: Mapped[dict[str, Any] | None] = mapped_column(JSONB, nullable=True)
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
@@ -0,0 +1,18 @@
+from datetime import datetime
+
+from sqlalchemy import BigInteger, CheckConstraint, DateTime, SmallInteger
+from sqlalchemy.orm import Mapped, mapped_column
+
+from db.base import Base
+
+
+class DataVersionTotal(Base):
+    """Single row (id 1): commits to any user's metrics, bumped with user_data_version."""
+
+    __tablename__ = "data_version_total"
+
+    id: Mapped[int] = mapped_column(SmallInteger, primary_key=True)
+    version: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+
+    __table_args__ = (CheckConstraint("id = 1", name="ck_data_version_total_single_row"),)
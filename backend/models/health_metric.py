@@ -1,7 +1,7 @@
 from datetime import datetime
 from typing import Any
 
-from sqlalchemy import DateTime, Float, Index, String, Text
+from sqlalchemy import DateTime, Float, Index, String, Text, UniqueConstraint
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import Mapped, mapped_column
 
@@ -9,20 +9,30 @@ from db.base import Base
 
 
 class HealthMetric(Base):
+    """Raw readings, range-partitioned by month on ts (see db.partitions)."""
+
     __tablename__ = "health_metric"
 
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
-    user_id: Mapped[str] = mapped_column(String(255), index=True, nullable=False)
+    user_id: Mapped[str] = mapped_column(String(255), nullable=False)
     source: Mapped[str] = mapped_column(String(255), nullable=False)
-    metric_name: Mapped[str] = mapped_column(String(255), index=True, nullable=False)
+    metric_name: Mapped[str] = mapped_column(String(255), nullable=False)
     value: Mapped[float] = mapped_column(Float, nullable=False)
     unit: Mapped[str] = mapped_column(String(64), nullable=False)
-    ts: Mapped[datetime] = mapped_column(DateTime(timezone=True), index=True, nullable=False)
+    # Part of the primary key: unique constraints on a partitioned table must include ts.
+    ts: Mapped[datetime] = mapped_column(DateTime(timezone=True), primary_key=True)
     metadata_: Mapped[dict[str, Any] | None] = mapped_column(
         "metadata", JSONB, nullable=True
     )
 
     __table_args__ = (
-        Index("ix_health_metric_user_ts", "user_id", "ts"),
-        Index("ix_health_metric_metric_ts", "metric_name", "ts"),
+        # Raw reads (hourly buckets, rollup refresh/rebuild) are index-only on these.
+        Index("ix_health_metric_user_ts_incl", "user_id", "ts", postgresql_include=["metric_name", "value"]),
+        Index("ix_health_metric_ts_incl", "ts", postgresql_include=["metric_name", "value"]),
+        # Idempotent ingest: device retries upsert onto the same reading.
+        UniqueConstraint(
+            "user_id", "source", "metric_name", "ts",
+            name="uq_health_metric_user_source_metric_ts",
+        ),
+        {"postgresql_partition_by": "RANGE (ts)"},
     )
@@ -0,0 +1,35 @@
+from datetime import date
+
+from sqlalchemy import Date, Float, Index, Integer, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from db.base import Base
+
+
+class HealthMetricDaily(Base):
+    """Per-(user, metric, UTC day) rollup of health_metric, maintained on write."""
+
+    __tablename__ = "health_metric_daily"
+
+    user_id: Mapped[str] = mapped_column(String(255), primary_key=True)
+    metric_name: Mapped[str] = mapped_column(String(255), primary_key=True)
+    day: Mapped[date] = mapped_column(Date, primary_key=True)
+    value_sum: Mapped[float] = mapped_column(Float, nullable=False)
+    value_count: Mapped[int] = mapped_column(Integer, nullable=False)
+    value_min: Mapped[float] = mapped_column(Float, nullable=False)
+    value_max: Mapped[float] = mapped_column(Float, nullable=False)
+
+    __table_args__ = (
+        # Bucket, anomaly and active-user queries are index-only on these.
+        Index(
+            "ix_health_metric_daily_user_day_incl",
+            "user_id",
+            "day",
+            postgresql_include=["metric_name", "value_sum", "value_count"],
+        ),
+        Index(
+            "ix_health_metric_daily_day_incl",
+            "day",
+            postgresql_include=["user_id", "metric_name", "value_sum", "value_count"],
+        ),
+    )
@@ -1,11 +1,23 @@
 from datetime import date, datetime
 
 from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from db.deps import get_db
-from schemas.analytics import WellnessScoreResponse
-from services.wellness import compute_wellness_score
+from db.deps import conditional_get, get_async_db
+from schemas.analytics import (
+    CohortWellnessRequest,
+    CohortWellnessResponse,
+    PrecomputeStats,
+    WellnessHistoryResponse,
+    WellnessScoreResponse,
+)
+from services.precompute import scheduler
+from services.snapshots import load_snapshot
+from services.wellness import (
+    compute_cohort_wellness_async,
+    compute_wellness_history_async,
+    compute_wellness_score_async,
+)
 
 router = APIRouter()
 
@@ -20,15 +32,67 @@ def _parse_date(value: str) -> date:
         raise HTTPException(400, detail="Invalid date format. Use YYYY-MM-DD.")
 
 
-@router.get("/wellness-score", response_model=WellnessScoreResponse)
-def get_wellness_score(
+@router.get(
+    "/wellness-score", response_model=WellnessScoreResponse, dependencies=[Depends(conditional_get)]
+)
+async def get_wellness_score(
     start_date: str = Query(..., description="Start date (YYYY-MM-DD)"),
     end_date: str = Query(..., description="End date (YYYY-MM-DD)"),
     user_id: str | None = Query(None, description="Filter by user ID (optional)"),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     start = _parse_date(start_date)
     end = _parse_date(end_date)
     if start > end:
         raise HTTPException(400, detail="start_date must be <= end_date.")
-    return compute_wellness_score(db, start, end, user_id=user_id)
+    snapshot = await db.run_sync(load_snapshot, "wellness", user_id, start, end)
+    if snapshot is not None:
+        return snapshot
+    return await compute_wellness_score_async(db, start, end, user_id=user_id)
+
+
+@router.get(
+    "/wellness-score/history",
+    response_model=WellnessHistoryResponse,
+    dependencies=[Depends(conditional_get)],
+)
+async def get_wellness_score_history(
+    start_date: str = Query(..., description="First day to score (YYYY-MM-DD)"),
+    end_date: str = Query(..., description="Last day to score (YYYY-MM-DD)"),
+    user_id: str | None = Query(None, description="Filter by user ID (optional)"),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """The wellness score as of each day in the range, with its components and trend."""
+    start = _parse_date(start_date)
+    end = _parse_date(end_date)
+    if start > end:
+        raise HTTPException(400, detail="start_date must be <= end_date.")
+    points = await compute_wellness_history_async(db, start, end, user_id=user_id)
+    return WellnessHistoryResponse(points=points)
+
+
+@router.post("/wellness-score/cohort", response_model=CohortWellnessResponse)
+async def get_cohort_wellness_scores(
+    body: CohortWellnessRequest,
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    Wellness scores for a page of users: body.user_ids, or every user with data in the
+    window whose id starts with user_prefix. Follow next_cursor (as `after`) for more.
+    """
+    if body.user_ids is not None and body.user_prefix is not None:
+        raise HTTPException(400, detail="Pass user_ids or user_prefix, not both.")
+    return await compute_cohort_wellness_async(
+        db,
+        body.end_date,
+        user_ids=body.user_ids,
+        user_prefix=body.user_prefix,
+        limit=body.limit,
+        after=body.after,
+    )
+
+
+@router.get("/precompute", response_model=PrecomputeStats)
+def get_precompute_stats():
+    """Progress counters of the in-process precompute scheduler."""
+    return scheduler.stats()
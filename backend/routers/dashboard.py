@@ -0,0 +1,34 @@
+from datetime import date, datetime
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from db.deps import conditional_get, get_async_db
+from schemas.dashboard import DashboardResponse
+from services.dashboard import build_dashboard
+
+router = APIRouter()
+
+_DATE_FORMAT = "%Y-%m-%d"
+
+
+def _parse_date(value: str) -> date:
+    try:
+        dt = datetime.strptime(value, _DATE_FORMAT)
+        return dt.date()
+    except ValueError:
+        raise HTTPException(400, detail="Invalid date format. Use YYYY-MM-DD.")
+
+
+@router.get("", response_model=DashboardResponse, dependencies=[Depends(conditional_get)])
+async def get_dashboard(
+    start_date: str = Query(..., description="Start date (YYYY-MM-DD)"),
+    end_date: str = Query(..., description="End date (YYYY-MM-DD)"),
+    user_id: str | None = Query(None, description="Filter by user ID (optional)"),
+    db: AsyncSession = Depends(get_async_db),
+):
+    start = _parse_date(start_date)
+    end = _parse_date(end_date)
+    if start > end:
+        raise HTTPException(400, detail="start_date must be <= end_date.")
+    return await build_dashboard(db, start, end, user_id=user_id)
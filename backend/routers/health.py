@@ -1,11 +1,16 @@
 from datetime import date, datetime
 
-from fastapi import APIRouter, Depends, HTTPException, Query
+from typing import Literal
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from db.deps import get_db
-from schemas.health import TimelineResponse
-from services.timeline import get_timeline
+from db.deps import conditional_get, get_async_db, get_db
+from schemas.health import IngestResponse, TimelineResponse
+from services.ingest import MalformedBody, OnConflict, ingest_stream
+from services.timeline import get_timeline_async, resolve_resolution, stream_timeline
 
 router = APIRouter()
 
@@ -21,14 +26,52 @@ def _parse_date(value: str) -> date:
 
 
 @router.get("/timeline", response_model=TimelineResponse)
-def timeline(
+async def timeline(
     start_date: str = Query(..., description="Start date (YYYY-MM-DD)"),
     end_date: str = Query(..., description="End date (YYYY-MM-DD)"),
     user_id: str | None = Query(None, description="Filter by user ID (optional)"),
-    db: Session = Depends(get_db),
+    max_points: int | None = Query(
+        None, ge=3, description="Downsample each metric to about this many points (LTTB)"
+    ),
+    resolution: Literal["auto", "hour", "day", "week", "month"] = Query(
+        "day", description="Bucket size; auto picks one from the range length"
+    ),
+    output: Literal["json", "ndjson"] = Query(
+        "json", alias="format", description="ndjson streams one point per line"
+    ),
+    db: AsyncSession = Depends(get_async_db),
+    etag: str = Depends(conditional_get),
 ):
     start = _parse_date(start_date)
     end = _parse_date(end_date)
     if start > end:
         raise HTTPException(400, detail="start_date must be <= end_date.")
-    return get_timeline(db, start, end, user_id=user_id)
+    try:
+        period = resolve_resolution(start, end, resolution)
+    except ValueError as exc:
+        raise HTTPException(400, detail=str(exc))
+    if output == "ndjson":
+        return StreamingResponse(
+            stream_timeline(db, start, end, user_id=user_id, max_points=max_points, resolution=period),
+            media_type="application/x-ndjson",
+            headers={"ETag": etag, "Cache-Control": "private, no-cache"},
+        )
+    return await get_timeline_async(
+        db, start, end, user_id=user_id, max_points=max_points, resolution=period
+    )
+
+
+@router.post("/metrics", response_model=IngestResponse)
+async def ingest_metrics(
+    request: Request,
+    on_conflict: OnConflict = Query(
+        "update",
+        description="On duplicate (user_id, source, metric_name, ts): overwrite value or keep existing",
+    ),
+    db: Session = Depends(get_db),
+):
+    """Bulk ingest a JSON array or NDJSON body of metric records."""
+    try:
+        return await ingest_stream(db, request.stream(), on_conflict)
+    except MalformedBody as exc:
+        raise HTTPException(400, detail=str(exc))
@@ -1,14 +1,16 @@
 from datetime import date, datetime
 
 from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from db.deps import get_db
-from schemas.insight_summary import InsightSummaryResponse
+from db.deps import ConditionalGet, conditional_get, get_async_db
+from schemas.insight_summary import InsightCacheStats, InsightSummaryResponse
 from schemas.insights import AnomalyOut, CorrelationOut
-from services.anomalies import detect_anomalies
-from services.correlations import compute_correlations
+from services.anomalies import DetectionMode, detect_anomalies_async
+from services.correlations import DEFAULT_MAX_LAG, MAX_LAG_LIMIT, compute_correlations_async
+from services.insight_cache import insight_cache_stats
 from services.insight_summary import generate_insight_summary
+from services.snapshots import load_snapshot
 
 router = APIRouter()
 
@@ -23,43 +25,78 @@ def _parse_date(value: str) -> date:
         raise HTTPException(400, detail="Invalid date format. Use YYYY-MM-DD.")
 
 
-@router.get("/correlations", response_model=list[CorrelationOut])
-def get_correlations(
+@router.get(
+    "/correlations", response_model=list[CorrelationOut], dependencies=[Depends(conditional_get)]
+)
+async def get_correlations(
     start_date: str = Query(..., description="Start date (YYYY-MM-DD)"),
     end_date: str = Query(..., description="End date (YYYY-MM-DD)"),
     user_id: str | None = Query(None, description="Filter by user ID (optional)"),
-    db: Session = Depends(get_db),
+    max_lag: int = Query(
+        DEFAULT_MAX_LAG, ge=0, le=MAX_LAG_LIMIT, description="Search lags -max_lag..max_lag days"
+    ),
+    db: AsyncSession = Depends(get_async_db),
 ):
     start = _parse_date(start_date)
     end = _parse_date(end_date)
     if start > end:
         raise HTTPException(400, detail="start_date must be <= end_date.")
-    return compute_correlations(db, start, end, user_id=user_id)
+    if max_lag == DEFAULT_MAX_LAG:
+        snapshot = await db.run_sync(load_snapshot, "correlations", user_id, start, end)
+        if snapshot is not None:
+            return snapshot
+    return await compute_correlations_async(db, start, end, user_id=user_id, max_lag=max_lag)
 
 
-@router.get("/anomalies", response_model=list[AnomalyOut])
-def get_anomalies(
+@router.get(
+    "/anomalies",
+    response_model=list[AnomalyOut],
+    # mode=stored scans through yesterday, so the response also changes with the date.
+    dependencies=[Depends(ConditionalGet(daily=True))],
+)
+async def get_anomalies(
     start_date: str = Query(..., description="Start date (YYYY-MM-DD)"),
     end_date: str = Query(..., description="End date (YYYY-MM-DD)"),
     user_id: str | None = Query(None, description="Filter by user ID (optional)"),
-    db: Session = Depends(get_db),
+    mode: DetectionMode = Query(
+        "python",
+        description=(
+            "python: compute in app; sql: rolling statistics in Postgres; "
+            "stored: persisted windows overlapping the range (requires user_id)"
+        ),
+    ),
+    db: AsyncSession = Depends(get_async_db),
 ):
     start = _parse_date(start_date)
     end = _parse_date(end_date)
     if start > end:
         raise HTTPException(400, detail="start_date must be <= end_date.")
-    return detect_anomalies(db, start, end, user_id=user_id)
+    if mode == "stored" and user_id is None:
+        raise HTTPException(400, detail="mode=stored requires user_id.")
+    if mode == "python":
+        snapshot = await db.run_sync(load_snapshot, "anomalies", user_id, start, end)
+        if snapshot is not None:
+            return snapshot
+    return await detect_anomalies_async(db, start, end, user_id=user_id, mode=mode)
 
 
-@router.get("/summary", response_model=InsightSummaryResponse)
-def get_summary(
+@router.get(
+    "/summary", response_model=InsightSummaryResponse, dependencies=[Depends(conditional_get)]
+)
+async def get_summary(
     start_date: str = Query(..., description="Start date (YYYY-MM-DD)"),
     end_date: str = Query(..., description="End date (YYYY-MM-DD)"),
     user_id: str | None = Query(None, description="Filter by user ID (optional)"),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     start = _parse_date(start_date)
     end = _parse_date(end_date)
     if start > end:
         raise HTTPException(400, detail="start_date must be <= end_date.")
-    return generate_insight_summary(db, start, end, user_id=user_id)
+    return await generate_insight_summary(db, start, end, user_id=user_id)
+
+
+@router.get("/summary/cache", response_model=InsightCacheStats)
+def get_summary_cache_stats():
+    """Hit/miss counters of the insight text cache in this process."""
+    return insight_cache_stats()
@@ -1,4 +1,5 @@
 from schemas.analytics import WellnessScoreResponse
+from schemas.dashboard import DashboardResponse
 from schemas.health import TimelinePoint, TimelineResponse
 from schemas.insights import AnomalyOut, AnomaliesResponse, CorrelationOut, CorrelationsResponse
 
@@ -10,4 +11,5 @@ __all__ = [
     "AnomalyOut",
     "AnomaliesResponse",
     "WellnessScoreResponse",
+    "DashboardResponse",
 ]
@@ -1,6 +1,7 @@
+from datetime import date, datetime
 from typing import Literal
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 
 class WellnessScoreResponse(BaseModel):
@@ -8,3 +9,45 @@ class WellnessScoreResponse(BaseModel):
     components: dict[str, int]
     trend: Literal["up", "down", "flat"]
     top_driver: str | None
+
+
+class WellnessHistoryPoint(WellnessScoreResponse):
+    day: date  # window end
+
+
+class WellnessHistoryResponse(BaseModel):
+    points: list[WellnessHistoryPoint]
+
+
+class PrecomputeStats(BaseModel):
+    interval_s: float
+    concurrency: int
+    runs_started: int
+    runs_finished: int
+    last_run_users: int
+    in_flight: int
+    jobs_ok: int
+    jobs_failed: int
+    jobs_skipped: int
+    job_ms_avg: float
+    job_ms_max: float
+    last_run_started_at: datetime | None
+    last_run_duration_s: float | None
+
+
+class CohortWellnessRequest(BaseModel):
+    end_date: date
+    user_ids: list[str] | None = Field(None, max_length=10_000, description="Score these users (sorted by id)")
+    user_prefix: str | None = Field(None, description="Otherwise: users with data whose id starts with this")
+    limit: int = Field(100, ge=1, le=1000)
+    after: str | None = Field(None, description="next_cursor of the previous page")
+
+
+class CohortMemberScore(WellnessScoreResponse):
+    user_id: str
+
+
+class CohortWellnessResponse(BaseModel):
+    end_date: date
+    users: list[CohortMemberScore]
+    next_cursor: str | None  # pass as `after` for the next page; None on the last page
@@ -0,0 +1,14 @@
+from pydantic import BaseModel
+
+from schemas.analytics import WellnessScoreResponse
+from schemas.health import TimelineResponse
+from schemas.insight_summary import InsightSummaryResponse
+from schemas.insights import AnomalyOut, CorrelationOut
+
+
+class DashboardResponse(BaseModel):
+    timeline: TimelineResponse
+    wellness: WellnessScoreResponse
+    anomalies: list[AnomalyOut]
+    correlations: list[CorrelationOut]
+    summary: InsightSummaryResponse
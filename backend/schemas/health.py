@@ -1,4 +1,7 @@
-from pydantic import BaseModel
+from datetime import datetime, timezone
+from typing import Any
+
+from pydantic import BaseModel, Field, field_validator
 
 
 class TimelinePoint(BaseModel):
@@ -8,3 +11,35 @@ class TimelinePoint(BaseModel):
 
 class TimelineResponse(BaseModel):
     points: list[TimelinePoint]
+
+
+class MetricIn(BaseModel):
+    user_id: str = Field(min_length=1, max_length=255)
+    source: str = Field(min_length=1, max_length=255)
+    metric_name: str = Field(min_length=1, max_length=255)
+    value: float = Field(allow_inf_nan=False)
+    unit: str = Field(max_length=64)
+    ts: datetime  # naive timestamps are taken as UTC
+    metadata: dict[str, Any] | None = None
+
+    @field_validator("ts")
+    @classmethod
+    def _ts_utc(cls, v: datetime) -> datetime:
+        if v.tzinfo is None:
+            return v.replace(tzinfo=timezone.utc)
+        return v.astimezone(timezone.utc)
+
+
+class IngestError(BaseModel):
+    record: int  # 0-based position in the request body
+    detail: str
+
+
+class IngestResponse(BaseModel):
+    received: int
+    inserted: int
+    updated: int
+    rejected: int
+    errors: list[IngestError]
+    elapsed_ms: float
+    rows_per_sec: float
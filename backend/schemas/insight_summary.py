@@ -7,3 +7,13 @@ class InsightSummaryResponse(BaseModel):
     text: str
     confidence: float
     signals_used: dict[str, Any]
+
+
+class InsightCacheStats(BaseModel):
+    memory_hits: int
+    persistent_hits: int
+    misses: int
+    evictions: int
+    size: int
+    max_entries: int
+    hit_ratio: float
@@ -0,0 +1,105 @@
+"""
+Compare daily-bucket fetches on the Postgres rollup and the DuckDB backend.
+
+    uv run python -m scripts.bench_backends --start 2024-01-01 --end 2024-12-30 \\
+        --user-id bench-medium-00000 [--parquet data/health_metric.parquet] [--output backends.json]
+
+Times services.buckets.fetch_rollup_buckets against DuckDBStore.daily_buckets, both in
+process and over Parquet when --parquet is given. Each runs for the given users and for
+all users (the multi-user aggregate). Also checks that every backend returns the same
+buckets, allowing float rounding only. Prints or writes JSON; exits 1 on a mismatch.
+"""
+import argparse
+import json
+import sys
+import time
+from collections.abc import Callable
+from datetime import date
+from typing import Any
+
+from db.session import SessionLocal
+from scripts.bench_services import _summary
+from services.buckets import DailyBuckets, fetch_rollup_buckets
+from services.duckdb_store import DuckDBStore
+
+TOLERANCE = 1e-9
+
+
+def _same(a: DailyBuckets, b: DailyBuckets) -> bool:
+    if a.keys() != b.keys():
+        return False
+    for metric_name, series in a.items():
+        other = b[metric_name]
+        if series.keys() != other.keys():
+            return False
+        if any(abs(v - other[d]) > TOLERANCE * max(1.0, abs(v)) for d, v in series.items()):
+            return False
+    return True
+
+
+def _time(fn: Callable[[], DailyBuckets], repeat: int) -> tuple[dict[str, float], DailyBuckets]:
+    result = fn()  # warm-up
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return _summary(samples), result
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--start", type=date.fromisoformat, required=True)
+    parser.add_argument("--end", type=date.fromisoformat, required=True)
+    parser.add_argument("--user-id", action="append", default=[], help="repeatable")
+    parser.add_argument("--parquet", help="also time a DuckDB view over this Parquet path")
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        started = time.perf_counter()
+        in_process = DuckDBStore()
+        rows = in_process.load_from_postgres(db)
+        report: dict[str, Any] = {
+            "start": str(args.start),
+            "end": str(args.end),
+            "health_metric_rows": rows,
+            "duckdb_load_s": round(time.perf_counter() - started, 3),
+            "targets": {},
+        }
+        backends: dict[str, Callable[[str | None], DailyBuckets]] = {
+            "postgres_rollup": lambda u: fetch_rollup_buckets(db, args.start, args.end, u),
+            "duckdb_memory": lambda u: in_process.daily_buckets(args.start, args.end, u),
+        }
+        if args.parquet:
+            parquet = DuckDBStore(args.parquet)
+            backends["duckdb_parquet"] = lambda u: parquet.daily_buckets(args.start, args.end, u)
+
+        mismatches = []
+        for user_id in [*args.user_id, None]:
+            label = user_id or "<all users>"
+            baseline = None
+            for name, fetch in backends.items():
+                stats, result = _time(lambda: fetch(user_id), args.repeat)
+                report["targets"][f"{name} ({label})"] = stats
+                if baseline is None:
+                    baseline = result
+                elif not _same(baseline, result):
+                    mismatches.append(f"{name} differs from postgres_rollup for {label}")
+    finally:
+        db.close()
+
+    report["mismatches"] = mismatches
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
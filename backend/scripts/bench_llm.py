@@ -0,0 +1,66 @@
+"""
+Concurrency benchmark for core.llm.generate_insight_text against any
+OpenAI-compatible endpoint (typically scripts.fake_openai_server).
+
+    OPENAI_BASE_URL=http://localhost:8001/v1 OPENAI_API_KEY=fake \\
+        uv run python -m scripts.bench_llm --requests 200 --concurrency 50
+
+Prints throughput and latency percentiles as JSON.
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+from core.llm import FALLBACK_INSIGHT, aclose_llm, generate_insight_text
+
+PAYLOAD = {
+    "window": {"start_date": "2024-01-01", "end_date": "2024-03-30"},
+    "wellness": {"score": 54, "trend": "flat", "top_driver": "resting_hr"},
+    "anomalies": [{"metric_name": "resting_hr", "severity": "high", "score": 5.66}],
+    "correlations": [{"metric_a": "calories", "metric_b": "sleep_hours", "lag_days": -1}],
+}
+
+
+async def _run(n_requests: int, concurrency: int) -> dict:
+    sem = asyncio.Semaphore(concurrency)
+    latencies: list[float] = []
+    fallbacks = 0
+
+    async def one() -> None:
+        nonlocal fallbacks
+        async with sem:
+            t0 = time.perf_counter()
+            text = await generate_insight_text(PAYLOAD)
+            latencies.append(time.perf_counter() - t0)
+            fallbacks += text == FALLBACK_INSIGHT
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(n_requests)))
+    elapsed = time.perf_counter() - started
+    await aclose_llm()
+
+    quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+    return {
+        "requests": n_requests,
+        "concurrency": concurrency,
+        "elapsed_s": round(elapsed, 3),
+        "requests_per_sec": round(n_requests / elapsed, 1),
+        "p50_ms": round(quantiles[49] * 1000, 1),
+        "p95_ms": round(quantiles[94] * 1000, 1),
+        "p99_ms": round(quantiles[98] * 1000, 1),
+        "fallbacks": fallbacks,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark generate_insight_text concurrency")
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=20)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(_run(args.requests, args.concurrency)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
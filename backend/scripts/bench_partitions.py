@@ -0,0 +1,188 @@
+"""
+Before/after measurements for health_metric partitioning.
+
+    uv run python -m scripts.bench_partitions --output heap.json
+    uv run python -m scripts.partitions migrate
+    uv run python -m scripts.bench_partitions --compare heap.json
+
+Runs the raw-row range queries the services issue (hourly timeline buckets, rollup
+rebuild and refresh) under EXPLAIN (ANALYZE, BUFFERS), and reports execution and
+planning time (median over --repeat), shared buffers touched and how many
+health_metric relations the plan scans. It also reports table and index size and how long
+VACUUM takes. The queries use the date range and user of a --scale dataset from
+scripts.bench_services, which must already be loaded.
+"""
+import argparse
+import json
+import statistics
+import sys
+import time
+from collections.abc import Callable
+from datetime import date, timedelta
+from typing import Any
+
+from sqlalchemy import Connection, Select, text
+
+from db.session import engine
+from models.health_metric import HealthMetric
+from scripts.bench_services import SCALES, _date_range
+from services.buckets import day_bounds, period_avg_select
+from services.rollup import _aggregate_select, _utc_day_expr
+
+
+def _rollup_rebuild(start: date, end: date) -> Select:
+    start_dt, end_dt = day_bounds(start, end)
+    return _aggregate_select(_utc_day_expr()).where(HealthMetric.ts >= start_dt, HealthMetric.ts < end_dt)
+
+
+def _rollup_refresh(user_id: str, metric_name: str, day: date) -> Select:
+    start_dt, end_dt = day_bounds(day, day)
+    return _aggregate_select(_utc_day_expr()).where(
+        HealthMetric.user_id == user_id,
+        HealthMetric.metric_name == metric_name,
+        HealthMetric.ts >= start_dt,
+        HealthMetric.ts < end_dt,
+    )
+
+
+def queries(start: date, end: date, user_id: str) -> dict[str, Select]:
+    """Representative raw-row statements for a dataset spanning [start, end]."""
+    mid = start + (end - start) // 2
+    return {
+        "timeline hour, user, 7 days": period_avg_select(mid, mid + timedelta(days=6), user_id, "hour"),
+        "timeline hour, all users, 1 day": period_avg_select(mid, mid, None, "hour"),
+        "rollup rebuild, 1 month": _rollup_rebuild(mid, mid + timedelta(days=30)),
+        "rollup refresh, user/metric/day": _rollup_refresh(user_id, "steps", mid),
+        "rollup rebuild, full range": _rollup_rebuild(start, end),
+    }
+
+
+def _scanned_relations(plan: dict[str, Any]) -> set[str]:
+    found = set()
+    relation = plan.get("Relation Name", "")
+    if relation.startswith("health_metric") and relation != "health_metric_daily":
+        found.add(relation)
+    for child in plan.get("Plans", []):
+        found |= _scanned_relations(child)
+    return found
+
+
+def explain(conn: Connection, stmt: Select, repeat: int) -> dict[str, Any]:
+    compiled = stmt.compile(bind=conn)
+    sql = "EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + str(compiled)
+    runs = []
+    for _ in range(repeat + 1):  # first run warms the cache
+        runs.append(conn.exec_driver_sql(sql, compiled.params).scalar()[0])
+    runs = runs[1:]
+    plan = runs[-1]["Plan"]
+    return {
+        "execution_ms": round(statistics.median(r["Execution Time"] for r in runs), 3),
+        "planning_ms": round(statistics.median(r["Planning Time"] for r in runs), 3),
+        "shared_buffers": plan.get("Shared Hit Blocks", 0) + plan.get("Shared Read Blocks", 0),
+        "relations_scanned": len(_scanned_relations(plan)),
+    }
+
+
+def _timed(fn: Callable[[], Any]) -> float:
+    started = time.perf_counter()
+    fn()
+    return round(time.perf_counter() - started, 3)
+
+
+# pg_partition_tree is empty for a plain table; fall back to the table itself.
+_RELATIONS = (
+    "SELECT relid, isleaf FROM pg_partition_tree('health_metric') "
+    "UNION ALL SELECT 'health_metric'::regclass, true "
+    "WHERE NOT EXISTS (SELECT 1 FROM pg_partition_tree('health_metric'))"
+)
+
+
+def storage(conn: Connection) -> dict[str, Any]:
+    row = conn.execute(
+        text(
+            "SELECT count(*) FILTER (WHERE isleaf), sum(pg_table_size(relid)), sum(pg_indexes_size(relid)) "
+            f"FROM ({_RELATIONS}) rels"
+        )
+    ).one()
+    return {
+        "leaf_relations": row[0],
+        "table_mb": round(int(row[1]) / 2**20, 1),
+        "index_mb": round(int(row[2]) / 2**20, 1),
+    }
+
+
+def vacuum(autocommit: Connection, partition: str | None) -> dict[str, float]:
+    out = {"vacuum_table_s": _timed(lambda: autocommit.exec_driver_sql("VACUUM (ANALYZE) health_metric"))}
+    if partition is not None:
+        out["vacuum_largest_partition_s"] = _timed(
+            lambda: autocommit.exec_driver_sql(f"VACUUM (ANALYZE) {partition}")
+        )
+    return out
+
+
+def _largest_partition(conn: Connection) -> str | None:
+    return conn.execute(
+        text(
+            "SELECT relid::regclass::text FROM pg_partition_tree('health_metric') "
+            "WHERE isleaf AND level > 0 ORDER BY pg_table_size(relid) DESC LIMIT 1"
+        )
+    ).scalar()
+
+
+def run(scale: str, repeat: int) -> dict[str, Any]:
+    spec = SCALES[scale]
+    start, end = _date_range(spec)
+    with engine.connect() as conn:
+        report: dict[str, Any] = {
+            "scale": scale,
+            "partitioned": conn.execute(
+                text("SELECT relkind = 'p' FROM pg_class WHERE oid = 'health_metric'::regclass")
+            ).scalar(),
+            "rows": conn.execute(text("SELECT count(*) FROM health_metric")).scalar(),
+            "storage": storage(conn),
+            "queries": {
+                name: explain(conn, stmt, repeat) for name, stmt in queries(start, end, spec.user_id(0)).items()
+            },
+        }
+        largest = _largest_partition(conn)
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as autocommit:
+        report["maintenance"] = vacuum(autocommit, largest)
+    return report
+
+
+def _print_comparison(before: dict[str, Any], after: dict[str, Any]) -> None:
+    print(f"{'':40} {'before':>14} {'after':>14}")
+    for key in ("leaf_relations", "table_mb", "index_mb"):
+        print(f"{key:40} {before['storage'][key]:>14} {after['storage'][key]:>14}")
+    for key, value in after["maintenance"].items():
+        print(f"{key:40} {before['maintenance'].get(key, '-'):>14} {value:>14}")
+    for name, stats in after["queries"].items():
+        base = before["queries"].get(name, {})
+        print(name)
+        for key, value in stats.items():
+            print(f"  {key:38} {base.get(key, '-'):>14} {value:>14}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scale", choices=sorted(SCALES), default="medium")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="write JSON here instead of stdout")
+    parser.add_argument("--compare", help="JSON from an earlier run to print side by side")
+    args = parser.parse_args()
+
+    report = run(args.scale, args.repeat)
+    text_out = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text_out + "\n")
+    elif not args.compare:
+        print(text_out)
+    if args.compare:
+        with open(args.compare) as f:
+            _print_comparison(json.load(f), report)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
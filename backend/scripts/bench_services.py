@@ -0,0 +1,213 @@
+"""
+Latency benchmark for the analytics services and read endpoints across data scales.
+
+    uv run python -m scripts.bench_services --scale small --scale medium --output bench.json
+    uv run python -m scripts.bench_services --scale small --compare bench.json
+
+Each scale is a core.mock_data.SyntheticSpec dataset under its own user prefix. It is
+bulk-loaded with core.mock_data.seed_synthetic_data unless its last user already has
+rollup rows. Every service then runs on a sync Session, and every read endpoint through the
+ASGI app, for one user and for all users. Results (ms min/p50/p95/mean per target)
+are printed or written as JSON. --compare exits 1 when any p50 is slower than the
+baseline by more than --tolerance. Use a dedicated database: all-user targets read
+every user in it.
+"""
+import argparse
+import asyncio
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from collections.abc import Callable
+from datetime import date, datetime, timedelta, timezone
+from typing import Any
+
+import httpx
+from sqlalchemy import select
+
+from core.mock_data import SyntheticSpec, seed_synthetic_data
+from db.session import SessionLocal, async_engine
+from models.health_metric_daily import HealthMetricDaily
+from services.anomalies import detect_anomalies
+from services.correlations import compute_correlations
+from services.timeline import get_timeline
+from services.wellness import compute_wellness_score
+
+SCALES = {
+    "small": SyntheticSpec(users=10, days=90, user_prefix="bench-small"),
+    "medium": SyntheticSpec(users=100, days=365, samples_per_day=4, user_prefix="bench-medium"),
+    "large": SyntheticSpec(
+        users=1000, days=365, samples_per_day=4, extra_metrics=5, user_prefix="bench-large"
+    ),
+    "minute": SyntheticSpec(users=5, days=30, samples_per_day=1440, user_prefix="bench-minute"),
+}
+
+SERVICES: dict[str, Callable[..., Any]] = {
+    "get_timeline": get_timeline,
+    "compute_wellness_score": compute_wellness_score,
+    "compute_correlations": compute_correlations,
+    "detect_anomalies[python]": lambda db, s, e, u: detect_anomalies(db, s, e, u, mode="python"),
+    "detect_anomalies[sql]": lambda db, s, e, u: detect_anomalies(db, s, e, u, mode="sql"),
+}
+
+ENDPOINTS = {
+    "GET /health/timeline": "/health/timeline",
+    "GET /analytics/wellness-score": "/analytics/wellness-score",
+    "GET /insights/correlations": "/insights/correlations",
+    "GET /insights/anomalies": "/insights/anomalies",
+    "GET /insights/summary": "/insights/summary",
+    "GET /dashboard": "/dashboard",
+}
+
+
+def _date_range(spec: SyntheticSpec) -> tuple[date, date]:
+    start = spec.start.astimezone(timezone.utc).date()
+    return start, start + timedelta(days=spec.days - 1)
+
+
+def _summary(samples_ms: list[float]) -> dict[str, float]:
+    ordered = sorted(samples_ms)
+    return {
+        "runs": len(ordered),
+        "min_ms": round(ordered[0], 3),
+        "p50_ms": round(statistics.median(ordered), 3),
+        "p95_ms": round(ordered[min(len(ordered) - 1, round(0.95 * (len(ordered) - 1)))], 3),
+        "mean_ms": round(statistics.fmean(ordered), 3),
+    }
+
+
+def load_scale(spec: SyntheticSpec) -> dict[str, Any] | None:
+    """Bulk-load the dataset unless already present; returns load timings or None if skipped."""
+    db = SessionLocal()
+    try:
+        present = db.scalar(
+            select(HealthMetricDaily.day).where(HealthMetricDaily.user_id == spec.user_id(spec.users - 1)).limit(1)
+        )
+        if present is not None:
+            return None
+        started = time.perf_counter()
+        inserted = seed_synthetic_data(db, spec)
+        elapsed = time.perf_counter() - started
+        return {"rows": inserted, "elapsed_s": round(elapsed, 3), "rows_per_sec": round(inserted / elapsed)}
+    finally:
+        db.close()
+
+
+def bench_services(spec: SyntheticSpec, repeat: int) -> dict[str, Any]:
+    start, end = _date_range(spec)
+    results: dict[str, Any] = {}
+    db = SessionLocal()
+    try:
+        for scope, user_id in (("user", spec.user_id(0)), ("all", None)):
+            for name, fn in SERVICES.items():
+                fn(db, start, end, user_id)  # warm-up
+                samples = []
+                for _ in range(repeat):
+                    t0 = time.perf_counter()
+                    fn(db, start, end, user_id)
+                    samples.append((time.perf_counter() - t0) * 1000)
+                results[f"{name} ({scope})"] = _summary(samples)
+    finally:
+        db.close()
+    return results
+
+
+async def bench_endpoints(spec: SyntheticSpec, repeat: int) -> dict[str, Any]:
+    from main import app
+
+    start, end = _date_range(spec)
+    results: dict[str, Any] = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for scope, user_id in (("user", spec.user_id(0)), ("all", None)):
+            params = {"start_date": str(start), "end_date": str(end)}
+            if user_id is not None:
+                params["user_id"] = user_id
+            for name, path in ENDPOINTS.items():
+                (await client.get(path, params=params)).raise_for_status()  # warm-up
+                samples = []
+                for _ in range(repeat):
+                    t0 = time.perf_counter()
+                    (await client.get(path, params=params)).raise_for_status()
+                    samples.append((time.perf_counter() - t0) * 1000)
+                results[f"{name} ({scope})"] = _summary(samples)
+    await async_engine.dispose()
+    return results
+
+
+def _git_commit() -> str | None:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return out.stdout.strip()
+
+
+def compare(current: dict[str, Any], baseline: dict[str, Any], tolerance: float) -> list[str]:
+    """Targets whose p50 regressed beyond tolerance (fraction) against the baseline run."""
+    problems = []
+    for scale, groups in current["scales"].items():
+        base_groups = baseline.get("scales", {}).get(scale, {})
+        for group in ("services", "endpoints"):
+            for target, stats in groups.get(group, {}).items():
+                base = base_groups.get(group, {}).get(target)
+                if base and stats["p50_ms"] > base["p50_ms"] * (1 + tolerance):
+                    problems.append(
+                        f"{scale} {target}: p50 {stats['p50_ms']} ms vs baseline {base['p50_ms']} ms"
+                    )
+    return problems
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scale", action="append", choices=sorted(SCALES), help="repeatable; default small")
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--skip-endpoints", action="store_true")
+    parser.add_argument("--output", help="write JSON here instead of stdout")
+    parser.add_argument("--compare", help="baseline JSON from an earlier run")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed p50 slowdown (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    report: dict[str, Any] = {
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "repeat": args.repeat,
+        "scales": {},
+    }
+    for name in args.scale or ["small"]:
+        spec = SCALES[name]
+        entry: dict[str, Any] = {
+            "users": spec.users,
+            "metrics": len(spec.metric_names),
+            "days": spec.days,
+            "samples_per_day": spec.samples_per_day,
+            "rows": spec.rows,
+            "load": load_scale(spec),
+            "services": bench_services(spec, args.repeat),
+        }
+        if not args.skip_endpoints:
+            entry["endpoints"] = asyncio.run(bench_endpoints(spec, args.repeat))
+        report["scales"][name] = entry
+        print(f"{name}: done", file=sys.stderr)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare) as f:
+            problems = compare(report, json.load(f), args.tolerance)
+        for problem in problems:
+            print(f"REGRESSION {problem}", file=sys.stderr)
+        return 1 if problems else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
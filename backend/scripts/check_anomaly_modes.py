@@ -0,0 +1,71 @@
+"""
+Check that SQL-side anomaly detection (mode="sql") matches the Python path.
+
+    uv run python -m scripts.check_anomaly_modes --start 2024-01-01 --end 2024-03-30 [--user-id demo-user]
+
+Without --user-id every user in the rollup is checked, plus the all-users aggregate.
+Windows must match exactly; scores may differ by float rounding only. Exits 1 on mismatch.
+"""
+import argparse
+import sys
+from datetime import date
+
+from sqlalchemy import select
+
+from db.session import SessionLocal
+from models.health_metric_daily import HealthMetricDaily
+from schemas.insights import AnomalyOut
+from services.anomalies import detect_anomalies
+
+SCORE_TOLERANCE = 1e-3
+
+
+def _key(a: AnomalyOut) -> tuple[str, str, str, str]:
+    return a.metric_name, a.start_ts, a.end_ts, a.severity
+
+
+def compare(python_out: list[AnomalyOut], sql_out: list[AnomalyOut]) -> list[str]:
+    """Return human-readable differences between the two result sets."""
+    py = {_key(a): a for a in python_out}
+    sq = {_key(a): a for a in sql_out}
+    problems = [f"only in python: {k}" for k in sorted(py.keys() - sq.keys())]
+    problems += [f"only in sql: {k}" for k in sorted(sq.keys() - py.keys())]
+    for k in sorted(py.keys() & sq.keys()):
+        if abs(py[k].score - sq[k].score) > SCORE_TOLERANCE:
+            problems.append(f"score differs for {k}: python={py[k].score} sql={sq[k].score}")
+    return problems
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--start", type=date.fromisoformat, required=True)
+    parser.add_argument("--end", type=date.fromisoformat, required=True)
+    parser.add_argument("--user-id")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        if args.user_id:
+            user_ids: list[str | None] = [args.user_id]
+        else:
+            user_ids = [None, *db.scalars(select(HealthMetricDaily.user_id).distinct())]
+        failed = 0
+        for user_id in user_ids:
+            python_out = detect_anomalies(db, args.start, args.end, user_id=user_id, mode="python")
+            sql_out = detect_anomalies(db, args.start, args.end, user_id=user_id, mode="sql")
+            problems = compare(python_out, sql_out)
+            label = user_id or "<all users>"
+            if problems:
+                failed += 1
+                print(f"MISMATCH {label}:")
+                for p in problems:
+                    print(f"  {p}")
+            else:
+                print(f"ok {label}: {len(python_out)} window(s)")
+    finally:
+        db.close()
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
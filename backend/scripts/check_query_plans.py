@@ -0,0 +1,152 @@
+"""
+Query-plan regression check for the service queries.
+
+    uv run python -m scripts.check_query_plans --output plans.json        # record a baseline
+    uv run python -m scripts.check_query_plans --baseline plans.json      # exit 1 on regressions
+
+Every statement the services send for a --scale dataset from scripts.bench_services
+(daily/period/cohort buckets, series-cache loads, raw hourly buckets, SQL anomaly
+detection, precompute's active users, rollup refresh) runs under EXPLAIN (ANALYZE, BUFFERS). For each one
+the check records shared buffers touched (hit + read, so cache state does not
+matter), heap fetches of index-only scans, the relations read by sequential scan,
+and the median execution time over --repeat runs. Against a baseline, a query
+fails when it sequentially scans a relation it did not scan before, or when its
+buffers grow by more than --tolerance (and at least --min-blocks). Timings are
+reported only, never checked. Run VACUUM ANALYZE after loading so plans and
+visibility maps are settled.
+"""
+import argparse
+import json
+import statistics
+import sys
+from datetime import date, timedelta
+from typing import Any
+
+from sqlalchemy import Connection, Select
+
+from db.session import engine
+from scripts.bench_partitions import _rollup_refresh
+from scripts.bench_services import SCALES, _date_range
+from services.anomalies import anomaly_z_select
+from services.buckets import _buckets_select, cohort_daily_select, period_avg_select
+from services.precompute import active_users_select
+from services.series_cache import _user_series_select
+from services.wellness import ALL_METRICS, wellness_query_window
+
+
+def service_queries(start: date, end: date, user_id: str) -> dict[str, Select]:
+    """Statements as the services build them for a dataset spanning [start, end]."""
+    mid = start + (end - start) // 2
+    cohort_window = wellness_query_window(mid, mid)
+    return {
+        "daily buckets (user)": _buckets_select(start, end, user_id),
+        "daily buckets (all)": _buckets_select(mid, mid + timedelta(days=29), None),
+        "user series (cache load)": _user_series_select(user_id),
+        "week buckets (user)": period_avg_select(start, end, user_id, "week"),
+        "month buckets (all)": period_avg_select(start, end, None, "month"),
+        "hour buckets (user, 7 days)": period_avg_select(mid, mid + timedelta(days=6), user_id, "hour"),
+        "hour buckets (all, 1 day)": period_avg_select(mid, mid, None, "hour"),
+        "anomalies sql (user)": anomaly_z_select(start, end, user_id),
+        "anomalies sql (all)": anomaly_z_select(mid, mid + timedelta(days=29), None),
+        "precompute active users": active_users_select(end),
+        "cohort buckets (page of 100)": cohort_daily_select(*cohort_window, ALL_METRICS, limit=101),
+        "rollup refresh (user/metric/day)": _rollup_refresh(user_id, "steps", mid),
+    }
+
+
+def _walk(plan: dict[str, Any]):
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from _walk(child)
+
+
+def plan_stats(conn: Connection, stmt: Select, repeat: int) -> dict[str, Any]:
+    compiled = stmt.compile(bind=conn, compile_kwargs={"render_postcompile": True})
+    sql = "EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + str(compiled)
+    conn.exec_driver_sql(sql, compiled.params)  # warm-up
+    runs = [conn.exec_driver_sql(sql, compiled.params).scalar()[0] for _ in range(repeat)]
+    nodes = list(_walk(runs[-1]["Plan"]))
+    top = nodes[0]
+    return {
+        "execution_ms": round(statistics.median(r["Execution Time"] for r in runs), 3),
+        "shared_buffers": top.get("Shared Hit Blocks", 0) + top.get("Shared Read Blocks", 0),
+        "heap_fetches": sum(n.get("Heap Fetches", 0) for n in nodes),
+        "seq_scans": sorted({n["Relation Name"] for n in nodes if n["Node Type"] == "Seq Scan"}),
+        "scans": sorted(
+            {
+                f"{n['Node Type']} {n.get('Index Name') or n['Relation Name']}"
+                for n in nodes
+                if "Relation Name" in n or "Index Name" in n
+            }
+        ),
+    }
+
+
+def run(scale: str, repeat: int) -> dict[str, Any]:
+    spec = SCALES[scale]
+    start, end = _date_range(spec)
+    with engine.connect() as conn:
+        return {
+            "scale": scale,
+            "queries": {
+                name: plan_stats(conn, stmt, repeat)
+                for name, stmt in service_queries(start, end, spec.user_id(0)).items()
+            },
+        }
+
+
+def regressions(
+    current: dict[str, Any], baseline: dict[str, Any], tolerance: float, min_blocks: int
+) -> list[str]:
+    """Queries with a new sequential scan or a buffer jump beyond tolerance."""
+    problems = []
+    for name, stats in current["queries"].items():
+        base = baseline.get("queries", {}).get(name)
+        if base is None:
+            continue
+        new_seq = sorted(set(stats["seq_scans"]) - set(base["seq_scans"]))
+        if new_seq:
+            problems.append(f"{name}: new sequential scan of {', '.join(new_seq)}")
+        grown = stats["shared_buffers"] - base["shared_buffers"]
+        if grown > min_blocks and stats["shared_buffers"] > base["shared_buffers"] * (1 + tolerance):
+            problems.append(f"{name}: {stats['shared_buffers']} buffers vs baseline {base['shared_buffers']}")
+    return problems
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scale", choices=sorted(SCALES), default="medium")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="write JSON here instead of stdout")
+    parser.add_argument("--baseline", help="plans JSON from an earlier run to check against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed buffer growth (0.25 = 25%%)")
+    parser.add_argument("--min-blocks", type=int, default=32, help="ignore buffer growth up to this many blocks")
+    args = parser.parse_args()
+
+    report = run(args.scale, args.repeat)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    elif not args.baseline:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        for name, stats in report["queries"].items():
+            base = baseline["queries"].get(name, {})
+            print(
+                f"{name:36} buffers {base.get('shared_buffers', '-'):>7} -> {stats['shared_buffers']:<7} "
+                f"heap fetches {base.get('heap_fetches', '-'):>7} -> {stats['heap_fetches']:<7} "
+                f"{base.get('execution_ms', '-'):>9} -> {stats['execution_ms']} ms"
+            )
+        problems = regressions(report, baseline, args.tolerance, args.min_blocks)
+        for problem in problems:
+            print(f"REGRESSION {problem}", file=sys.stderr)
+        return 1 if problems else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,34 @@
+"""
+Export health_metric to Parquet for the DuckDB analytics backend.
+
+    uv run python -m scripts.export_parquet --output data/health_metric.parquet
+    ANALYTICS_BACKEND=duckdb DUCKDB_PARQUET=data/health_metric.parquet uv run uvicorn main:app
+
+Rows are copied from Postgres into an in-process DuckDB table and written as one file
+ordered by (user_id, ts), so per-user queries skip most row groups. Re-run to refresh.
+"""
+import argparse
+import time
+
+from db.session import SessionLocal
+from services.duckdb_store import DuckDBStore
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--output", required=True)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    store = DuckDBStore()
+    db = SessionLocal()
+    try:
+        rows = store.load_from_postgres(db)
+    finally:
+        db.close()
+    store.export_parquet(args.output)
+    print(f"exported {rows} rows to {args.output} in {time.perf_counter() - started:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
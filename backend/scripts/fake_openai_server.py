@@ -0,0 +1,69 @@
+"""
+Local OpenAI-compatible stand-in for offline latency and concurrency benchmarks.
+
+    uv run uvicorn scripts.fake_openai_server:app --port 8001
+    OPENAI_BASE_URL=http://localhost:8001/v1 OPENAI_API_KEY=fake uv run python main.py
+
+Implements POST /v1/chat/completions (non-streaming) with a canned, rule-abiding reply.
+FAKE_LLM_LATENCY_MS and FAKE_LLM_JITTER_MS shape the simulated response time;
+FAKE_LLM_ERROR_RATE (0-1) returns 500s to exercise retries.
+"""
+import asyncio
+import os
+import random
+import time
+import uuid
+
+from fastapi import FastAPI, HTTPException, Request
+
+LATENCY_MS = float(os.getenv("FAKE_LLM_LATENCY_MS", "400"))
+JITTER_MS = float(os.getenv("FAKE_LLM_JITTER_MS", "100"))
+ERROR_RATE = float(os.getenv("FAKE_LLM_ERROR_RATE", "0"))
+
+REPLY = (
+    "Your recent data may suggest a shift from your usual baseline; "
+    "it could be worth keeping an eye on these patterns."
+)
+
+app = FastAPI(title="Fake OpenAI")
+_stats = {"requests": 0, "in_flight": 0, "max_in_flight": 0}
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    _stats["requests"] += 1
+    _stats["in_flight"] += 1
+    _stats["max_in_flight"] = max(_stats["max_in_flight"], _stats["in_flight"])
+    try:
+        delay = max(0.0, LATENCY_MS + random.uniform(-JITTER_MS, JITTER_MS)) / 1000
+        await asyncio.sleep(delay)
+        if ERROR_RATE and random.random() < ERROR_RATE:
+            raise HTTPException(500, detail="simulated upstream error")
+        prompt_tokens = sum(len(str(m.get("content", "")).split()) for m in body.get("messages", []))
+        completion_tokens = len(REPLY.split())
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "fake"),
+            "choices": [
+                {
+                    "index": 0,
+                    "message": {"role": "assistant", "content": REPLY},
+                    "finish_reason": "stop",
+                }
+            ],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        }
+    finally:
+        _stats["in_flight"] -= 1
+
+
+@app.get("/stats")
+def stats():
+    return _stats
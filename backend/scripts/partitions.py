@@ -0,0 +1,132 @@
+"""
+Manage monthly health_metric partitions (see db.partitions).
+
+    uv run python -m scripts.partitions list
+    uv run python -m scripts.partitions ensure [--months-ahead 6]  # default PARTITION_MONTHS_AHEAD
+    uv run python -m scripts.partitions migrate [--keep-heap]
+
+ensure creates partitions for the current month and the months ahead; run it from cron
+when the API does not restart at least monthly. migrate converts an existing
+unpartitioned health_metric in one transaction: the heap is renamed, the partitioned
+table is created with partitions covering its rows, rows are copied month by month, and
+the heap is dropped (or kept as health_metric_heap). Writes block while it runs.
+"""
+import argparse
+import sys
+import time
+from datetime import datetime, timezone
+
+from sqlalchemy import Connection, text
+
+from core.config import PARTITION_MONTHS_AHEAD
+from db.partitions import (
+    PARENT,
+    add_months,
+    ensure_partitions,
+    ensure_upcoming_partitions,
+    existing_partitions,
+    forget_partitions,
+    is_partitioned,
+    month_start,
+)
+from db.session import engine
+from models.health_metric import HealthMetric
+
+HEAP = f"{PARENT}_heap"
+_COLUMNS = ", ".join(c.name for c in HealthMetric.__table__.columns)
+
+
+def list_partitions(conn: Connection) -> None:
+    if not is_partitioned(conn):
+        print(f"{PARENT} is not partitioned")
+        return
+    for month in sorted(existing_partitions(conn)):
+        print(month.strftime("%Y-%m"))
+
+
+def ensure(conn: Connection, months_ahead: int) -> None:
+    first = month_start(datetime.now(timezone.utc))
+    created = ensure_partitions(conn, (add_months(first, n) for n in range(months_ahead + 1)))
+    print(f"created {len(created)} partition(s)")
+
+
+def _rename_heap(conn: Connection) -> None:
+    """Move the heap, its indexes and id sequence out of the way of the new table's names."""
+    conn.execute(text(f"ALTER TABLE {PARENT} RENAME TO {HEAP}"))
+    for name in conn.execute(text("SELECT indexname FROM pg_indexes WHERE tablename = :t"), {"t": HEAP}).scalars():
+        conn.execute(text(f'ALTER INDEX "{name}" RENAME TO "{name}_heap"'))
+    seq = conn.execute(text("SELECT pg_get_serial_sequence(:t, 'id')"), {"t": HEAP}).scalar()
+    if seq is not None:
+        conn.execute(text(f"ALTER SEQUENCE {seq} RENAME TO {HEAP}_id_seq"))
+
+
+def migrate(conn: Connection, keep_heap: bool) -> None:
+    if is_partitioned(conn):
+        print(f"{PARENT} is already partitioned")
+        return
+    lo, hi = conn.execute(text(f"SELECT min(ts), max(ts) FROM {PARENT}")).one()
+    _rename_heap(conn)
+    HealthMetric.__table__.create(conn)
+    forget_partitions()
+
+    now = month_start(datetime.now(timezone.utc))
+    first = month_start(lo) if lo is not None else now
+    last = max(month_start(hi) if hi is not None else now, now)
+    months = []
+    while first <= last:
+        months.append(first)
+        first = add_months(first, 1)
+    ensure_partitions(conn, months)
+    ensure_upcoming_partitions(conn)
+
+    total = 0
+    for month in months:
+        started = time.perf_counter()
+        copied = conn.execute(
+            text(
+                f"INSERT INTO {PARENT} ({_COLUMNS}) SELECT {_COLUMNS} FROM {HEAP} "
+                "WHERE ts >= :lo AND ts < :hi"
+            ),
+            {
+                "lo": datetime.combine(month, datetime.min.time(), timezone.utc),
+                "hi": datetime.combine(add_months(month, 1), datetime.min.time(), timezone.utc),
+            },
+        ).rowcount
+        total += copied
+        if copied:
+            print(f"{month:%Y-%m}: {copied} rows in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+    expected = conn.execute(text(f"SELECT count(*) FROM {HEAP}")).scalar()
+    if total != expected:
+        raise RuntimeError(f"copied {total} of {expected} rows; rolling back")
+    next_id = conn.execute(text(f"SELECT coalesce(max(id), 0) + 1 FROM {HEAP}")).scalar()
+    conn.execute(text(f"SELECT setval(pg_get_serial_sequence('{PARENT}', 'id'), {next_id}, false)"))
+    if not keep_heap:
+        conn.execute(text(f"DROP TABLE {HEAP}"))
+    print(f"migrated {total} rows into {len(months)} monthly partitions")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("list")
+    ensure_cmd = sub.add_parser("ensure")
+    ensure_cmd.add_argument("--months-ahead", type=int, default=PARTITION_MONTHS_AHEAD)
+    migrate_cmd = sub.add_parser("migrate")
+    migrate_cmd.add_argument("--keep-heap", action="store_true", help=f"keep the old table as {HEAP}")
+    args = parser.parse_args()
+
+    with engine.begin() as conn:
+        if args.command == "list":
+            list_partitions(conn)
+        elif args.command == "ensure":
+            ensure(conn, args.months_ahead)
+        else:
+            migrate(conn, args.keep_heap)
+    if args.command == "migrate":
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.execute(text(f"ANALYZE {PARENT}"))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,48 @@
+"""
+Maintain the health_metric_daily rollup (see services.rollup).
+
+    uv run python -m scripts.rollup rebuild [--start 2024-01-01] [--end 2024-12-31] [--user-id demo-user]
+    uv run python -m scripts.rollup backfill
+
+Every analytics endpoint reads the rollup, so a database whose health_metric rows
+predate it must be rebuilt once when upgrading: run `rebuild` without arguments
+(the API also runs `backfill` on startup, which rebuilds only an empty rollup).
+A bounded rebuild recomputes just the given UTC days, e.g. after editing raw rows by
+hand. Both create missing tables first and commit at the end.
+"""
+import argparse
+import sys
+from datetime import date
+
+from db.schema import create_schema
+from db.session import SessionLocal, engine
+from services.rollup import backfill_empty_rollup, rebuild_rollup
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    sub = parser.add_subparsers(dest="command", required=True)
+    rebuild_cmd = sub.add_parser("rebuild")
+    rebuild_cmd.add_argument("--start", type=date.fromisoformat, help="First UTC day (default: unbounded)")
+    rebuild_cmd.add_argument("--end", type=date.fromisoformat, help="Last UTC day (default: unbounded)")
+    rebuild_cmd.add_argument("--user-id")
+    sub.add_parser("backfill")
+    args = parser.parse_args()
+
+    create_schema(engine)
+    db = SessionLocal()
+    try:
+        if args.command == "backfill":
+            ran = backfill_empty_rollup(db)
+            print("rollup backfilled" if ran else "rollup already populated (or no metrics); nothing to do")
+        else:
+            rebuild_rollup(db, args.start, args.end, args.user_id)
+            db.commit()
+            print("rollup rebuilt")
+    finally:
+        db.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,69 @@
+"""
+Bulk-seed synthetic fixture users (core.mock_data.SyntheticSpec) with COPY.
+
+    uv run python -m scripts.seed --users 1000 --days 365 --samples-per-day 3
+    uv run python -m scripts.seed --users 5 --days 30 --samples-per-day 1440 --user-prefix minute --append
+
+Like demo mode, seeding only runs on an empty health_metric table; --append seeds
+into a non-empty database as long as the prefix's users have no rows yet.
+"""
+import argparse
+import sys
+import time
+
+from sqlalchemy import select
+
+from core.mock_data import NUM_DAYS, SyntheticSpec, seed_demo_data, seed_synthetic_data
+from db.schema import create_schema
+from db.session import SessionLocal, engine
+from models import HealthMetric
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--days", type=int, default=NUM_DAYS)
+    parser.add_argument("--samples-per-day", type=int, default=1)
+    parser.add_argument("--metrics", help="comma-separated subset of the demo metrics (default: all)")
+    parser.add_argument("--extra-metrics", type=int, default=0)
+    parser.add_argument("--noise", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--user-prefix", default="synthetic-user")
+    parser.add_argument("--with-demo", action="store_true", help="also load the demo-user dataset")
+    parser.add_argument("--append", action="store_true", help="allow a non-empty database")
+    args = parser.parse_args()
+
+    spec = SyntheticSpec(
+        users=args.users,
+        days=args.days,
+        samples_per_day=args.samples_per_day,
+        extra_metrics=args.extra_metrics,
+        noise=args.noise,
+        seed=args.seed,
+        user_prefix=args.user_prefix,
+        **({"metrics": tuple(m.strip() for m in args.metrics.split(","))} if args.metrics else {}),
+    )
+    create_schema(engine)
+    db = SessionLocal()
+    try:
+        if args.append:
+            taken = db.scalar(select(HealthMetric.id).where(HealthMetric.user_id == spec.user_id(0)).limit(1))
+            if taken is not None:
+                print(f"users with prefix {spec.user_prefix!r} already exist", file=sys.stderr)
+                return 1
+        elif db.scalar(select(HealthMetric.id).limit(1)) is not None:
+            print("health_metric is not empty; pass --append to add new users", file=sys.stderr)
+            return 1
+        started = time.perf_counter()
+        if args.with_demo:
+            seed_demo_data(db)
+        rows = seed_synthetic_data(db, spec)
+        elapsed = time.perf_counter() - started
+    finally:
+        db.close()
+    print(f"seeded {rows} rows for {spec.users} users in {elapsed:.1f} s ({rows / elapsed:,.0f} rows/s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
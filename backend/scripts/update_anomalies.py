@@ -0,0 +1,39 @@
+"""
+Bring stored anomaly windows up to date for every user in the rollup (or one user).
+
+    uv run python -m scripts.update_anomalies [--user-id demo-user] [--through 2024-03-30]
+
+Only days after each (user, metric) watermark are scanned, so repeated runs are cheap.
+"""
+import argparse
+from datetime import date
+
+from sqlalchemy import select
+
+from db.session import SessionLocal
+from models.health_metric_daily import HealthMetricDaily
+from services.anomaly_store import update_stored_anomalies
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--user-id")
+    parser.add_argument("--through", type=date.fromisoformat, help="Last day to scan (default: yesterday UTC)")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        if args.user_id:
+            user_ids = [args.user_id]
+        else:
+            user_ids = list(db.scalars(select(HealthMetricDaily.user_id).distinct()))
+        for user_id in user_ids:
+            written = update_stored_anomalies(db, user_id, through=args.through)
+            db.commit()
+            print(f"{user_id}: {written} window(s) written or extended")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
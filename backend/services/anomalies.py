@@ -1,53 +1,43 @@
 """
 Rolling-baseline anomaly detection on HealthMetric daily buckets.
-No DB writes; compute on read. Deterministic.
+Array-backed: each metric lives on a dense day grid with a missing-value mask.
+The python and sql modes compute on read, are deterministic and write nothing.
+mode="stored" serves persisted windows maintained incrementally by
+services.anomaly_store, which steps a RollingBaseline per (user, metric) through each
+closed day; it writes anomaly rows and watermarks and commits.
 """
+import math
 import statistics
-from collections import defaultdict
-from datetime import date, datetime, time, timedelta, timezone
+from collections import defaultdict, deque
+from collections.abc import Sequence
+from datetime import date, timedelta
+from typing import Any, Literal
 
-from sqlalchemy import func, select
+import numpy as np
+from anyio import to_thread
+from sqlalchemy import Select, func, literal, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from models.health_metric import HealthMetric
+from core.metrics import timed
 from schemas.insights import AnomalyOut
+from services.buckets import (
+    DailyBuckets,
+    daily_avg_select,
+    dense_grid,
+    fetch_daily_buckets,
+    fetch_daily_buckets_async,
+)
 
 MIN_BASELINE_DAYS = 7
 Z_THRESHOLD = 2.5
 ROLLING_DAYS = 30
+_SCREEN_TOLERANCE = 1e-6  # relative slack for the vectorized screen before exact confirmation
+# A baseline std at or below this times max(|mean|, 1) is float noise around a constant
+# series (Postgres' stddev_samp of 30 equal values is ~1e-14, not 0): no z is scored.
+CONSTANT_STD_TOLERANCE = 1e-9
 
-
-def _daily_buckets(
-    db: Session,
-    start_dt: datetime,
-    end_dt: datetime,
-    user_id: str | None,
-) -> dict[str, dict[date, float]]:
-    """Return metric_name -> {date -> avg_value} for [start_dt, end_dt)."""
-    day_col = func.date_trunc("day", HealthMetric.ts).label("day")
-    stmt = (
-        select(
-            day_col,
-            HealthMetric.metric_name,
-            func.avg(HealthMetric.value).label("avg_value"),
-        )
-        .where(HealthMetric.ts >= start_dt, HealthMetric.ts < end_dt)
-        .group_by(day_col, HealthMetric.metric_name)
-        .order_by(day_col)
-    )
-    if user_id is not None:
-        stmt = stmt.where(HealthMetric.user_id == user_id)
-    rows = db.execute(stmt).all()
-
-    by_metric: dict[str, dict[date, float]] = defaultdict(dict)
-    for row in rows:
-        day_ts = row.day
-        if hasattr(day_ts, "date"):
-            d = day_ts.date()
-        else:
-            d = day_ts if isinstance(day_ts, date) else datetime.combine(day_ts, time.min, tzinfo=timezone.utc).date()
-        by_metric[row.metric_name][d] = float(row.avg_value)
-    return dict(by_metric)
+DetectionMode = Literal["python", "sql", "stored"]
 
 
 def _z_severity(z: float) -> str:
@@ -105,48 +95,291 @@ def _merge_consecutive(
     return out
 
 
-def detect_anomalies(
-    db: Session,
+def anomaly_query_window(start_date: date, end_date: date) -> tuple[date, date]:
+    """Inclusive day range needed to detect anomalies in [start_date, end_date]."""
+    return start_date - timedelta(days=ROLLING_DAYS), end_date
+
+
+def _rolling_baseline(
+    values: np.ndarray,
+    mask: np.ndarray,
+    window: int = ROLLING_DAYS,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Count, mean and sample std over the previous `window` days (excluding the day itself)
+    for every grid cell, via prefix sums. Values are shifted by each row's mean first
+    to limit cancellation in the sum-of-squares variance; std is NaN where count < 2.
+    """
+    n_metrics, n_days = values.shape
+    counts_per_row = np.maximum(mask.sum(axis=1, keepdims=True), 1)
+    shift = np.where(mask, values, 0.0).sum(axis=1, keepdims=True) / counts_per_row
+    centered = np.where(mask, values - shift, 0.0)
+
+    def prefix(a: np.ndarray) -> np.ndarray:
+        out = np.zeros((n_metrics, n_days + 1))
+        np.cumsum(a, axis=1, out=out[:, 1:])
+        return out
+
+    p_n, p_s, p_ss = prefix(mask.astype(float)), prefix(centered), prefix(centered * centered)
+    hi = np.arange(n_days)  # window is [t - window, t - 1] -> prefix[t] - prefix[t - window]
+    lo = np.maximum(hi - window, 0)
+    count = p_n[:, hi] - p_n[:, lo]
+    s = p_s[:, hi] - p_s[:, lo]
+    ss = p_ss[:, hi] - p_ss[:, lo]
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean_c = s / count
+        var = (ss - s * mean_c) / (count - 1)
+        std = np.sqrt(np.maximum(var, 0.0))
+    std[count < 2] = np.nan
+    return count, mean_c + shift, std
+
+
+def exact_z(baseline_values: list[float], value: float) -> float | None:
+    """
+    z of value against statistics.mean/stdev of the baseline when |z| >= Z_THRESHOLD, else
+    None. A baseline within CONSTANT_STD_TOLERANCE of constant scores nothing.
+    """
+    b_mean = statistics.mean(baseline_values)
+    try:
+        b_std = statistics.stdev(baseline_values)
+    except statistics.StatisticsError:
+        return None
+    if b_std <= CONSTANT_STD_TOLERANCE * max(abs(b_mean), 1.0):
+        return None
+    z = (value - b_mean) / b_std
+    return z if abs(z) >= Z_THRESHOLD else None
+
+
+class RollingBaseline:
+    """
+    The trailing ROLLING_DAYS daily values of one (user, metric) series, with their
+    count, mean and M2 kept current (Welford) as days enter and leave the window.
+    observe() screens each new day on the running moments and confirms the rare
+    candidates with exact_z, so results match detect_anomalies_from_buckets.
+    """
+
+    __slots__ = ("days", "values", "count", "mean", "m2")
+
+    def __init__(self, days: Sequence[date] = (), values: Sequence[float] = ()):
+        self.days: deque[int] = deque()  # ordinals, ascending
+        self.values: deque[float] = deque()
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        for d, value in zip(days, values):
+            self._push(d.toordinal(), value)
+
+    def _push(self, ordinal: int, value: float) -> None:
+        self.days.append(ordinal)
+        self.values.append(value)
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+    def _pop(self) -> None:
+        self.days.popleft()
+        value = self.values.popleft()
+        self.count -= 1
+        if self.count == 0:
+            self.mean = self.m2 = 0.0
+            return
+        delta = value - self.mean
+        self.mean -= delta / self.count
+        self.m2 -= delta * (value - self.mean)
+
+    def _may_exceed(self, value: float) -> bool:
+        std = math.sqrt(max(self.m2 / (self.count - 1), 0.0))
+        if std <= _SCREEN_TOLERANCE * max(abs(self.mean), 1.0):
+            return True  # possibly float noise around a constant baseline: confirm exactly
+        return abs(value - self.mean) >= Z_THRESHOLD * (1 - _SCREEN_TOLERANCE) * std
+
+    def observe(self, day: date, value: float) -> float | None:
+        """
+        Score day's value against the days in [day - ROLLING_DAYS, day - 1] held so far,
+        then add it. Days must arrive in ascending order. Returns z when anomalous.
+        """
+        ordinal = day.toordinal()
+        while self.days and self.days[0] < ordinal - ROLLING_DAYS:
+            self._pop()
+        z = None
+        if self.count >= MIN_BASELINE_DAYS and self._may_exceed(value):
+            z = exact_z(list(self.values), value)
+        self._push(ordinal, value)
+        return z
+
+    def to_state(self) -> dict[str, Any]:
+        """JSON-serializable state: window days (ordinals) and values, count, mean and M2."""
+        return {
+            "days": list(self.days),
+            "values": list(self.values),
+            "count": self.count,
+            "mean": self.mean,
+            "m2": self.m2,
+        }
+
+    @classmethod
+    def from_state(cls, state: dict[str, Any]) -> "RollingBaseline":
+        baseline = cls()
+        baseline.days.extend(state["days"])
+        baseline.values.extend(state["values"])
+        baseline.count, baseline.mean, baseline.m2 = state["count"], state["mean"], state["m2"]
+        return baseline
+
+
+def detect_anomalies_from_buckets(
+    by_metric: DailyBuckets,
     start_date: date,
     end_date: date,
-    user_id: str | None = None,
 ) -> list[AnomalyOut]:
     """
-    Detect anomalies using rolling 30-day baseline (mean, std). Previous days only.
-    Merge consecutive anomalous days into one window. No DB writes.
-    """
-    query_start = start_date - timedelta(days=ROLLING_DAYS)
-    start_dt = datetime.combine(query_start, time.min, tzinfo=timezone.utc)
-    end_dt = datetime.combine(end_date, time.min, tzinfo=timezone.utc)
-    end_dt += timedelta(days=1)
+    Detect anomalies from pre-fetched daily buckets. by_metric must cover
+    anomaly_query_window(start_date, end_date); wider series are fine.
 
-    by_metric = _daily_buckets(db, start_dt, end_dt, user_id)
+    A vectorized prefix-sum pass screens every (metric, day) with a small tolerance;
+    the few candidates are confirmed with statistics.mean/stdev on the exact baseline,
+    so z-scores and thresholds match the per-day computation bit for bit.
+    """
+    grid_start, metric_names, values, mask = dense_grid(by_metric)
     all_anomalies: list[AnomalyOut] = []
+    if not metric_names:
+        return all_anomalies
+
+    count, mean, std = _rolling_baseline(values, mask)
+    start_ord = grid_start.toordinal()
+    in_range = np.zeros(values.shape[1], dtype=bool)
+    lo = max(start_date.toordinal() - start_ord, 0)
+    hi = max(end_date.toordinal() - start_ord + 1, 0)
+    in_range[lo:hi] = True
+
+    eligible = mask & in_range & (count >= MIN_BASELINE_DAYS)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        z = (values - mean) / std
+    scale = np.maximum(np.abs(mean), 1.0)
+    # Near-zero std may be float noise around an exactly constant baseline: confirm exactly.
+    candidates = eligible & (
+        (np.abs(z) >= Z_THRESHOLD * (1 - _SCREEN_TOLERANCE)) | (std <= _SCREEN_TOLERANCE * scale)
+    )
 
-    for metric_name, day_values in by_metric.items():
-        sorted_dates = sorted(day_values.keys())
+    for i, metric_name in enumerate(metric_names):
+        row_values, row_mask = values[i], mask[i]
         anomalous: list[tuple[date, float]] = []
-        for d in sorted_dates:
-            if d < start_date or d > end_date:
-                continue
-            value = day_values.get(d)
-            if value is None:
-                continue
-            baseline_dates = [d - timedelta(days=i) for i in range(1, ROLLING_DAYS + 1)]
-            baseline_values = [day_values.get(bd) for bd in baseline_dates if day_values.get(bd) is not None]
-            if len(baseline_values) < MIN_BASELINE_DAYS:
-                continue
-            mean = statistics.mean(baseline_values)
-            try:
-                std = statistics.stdev(baseline_values)
-            except statistics.StatisticsError:
-                continue
-            if std == 0:
-                continue
-            z = (value - mean) / std
-            if abs(z) >= Z_THRESHOLD:
-                anomalous.append((d, z))
+        for t in np.flatnonzero(candidates[i]):
+            baseline = row_values[max(t - ROLLING_DAYS, 0) : t][row_mask[max(t - ROLLING_DAYS, 0) : t]]
+            z_exact = exact_z(baseline.tolist(), float(row_values[t]))
+            if z_exact is not None:
+                anomalous.append((date.fromordinal(start_ord + int(t)), z_exact))
         all_anomalies.extend(_merge_consecutive(metric_name, anomalous))
 
     all_anomalies.sort(key=lambda a: a.start_ts, reverse=True)
     return all_anomalies
+
+
+def anomaly_z_select(start_date: date, end_date: date, user_id: str | None = None) -> Select:
+    """SELECT day, metric_name, z for anomalous days in range, ordered by metric_name, day."""
+    daily = daily_avg_select(*anomaly_query_window(start_date, end_date), user_id).subquery()
+    day_num = daily.c.day - literal(date(1970, 1, 1))  # date - date -> integer days
+    frame = {
+        "partition_by": daily.c.metric_name,
+        "order_by": day_num,
+        "range_": (-ROLLING_DAYS, -1),
+    }
+    stats = select(
+        daily.c.day,
+        daily.c.metric_name,
+        daily.c.avg_value,
+        func.count(daily.c.avg_value).over(**frame).label("n"),
+        func.avg(daily.c.avg_value).over(**frame).label("mean"),
+        func.stddev_samp(daily.c.avg_value).over(**frame).label("std"),
+    ).subquery()
+    z_col = ((stats.c.avg_value - stats.c.mean) / stats.c.std).label("z")
+    return (
+        select(stats.c.day, stats.c.metric_name, z_col)
+        .where(
+            stats.c.day >= start_date,
+            stats.c.n >= MIN_BASELINE_DAYS,
+            stats.c.std > CONSTANT_STD_TOLERANCE * func.greatest(func.abs(stats.c.mean), 1.0),
+            func.abs(z_col) >= Z_THRESHOLD,
+        )
+        .order_by(stats.c.metric_name, stats.c.day)
+    )
+
+
+def detect_anomalies_sql(
+    db: Session,
+    start_date: date,
+    end_date: date,
+    user_id: str | None = None,
+) -> list[AnomalyOut]:
+    """
+    Same detection pushed down into Postgres: daily averages from the rollup, then the
+    trailing ROLLING_DAYS count/avg/stddev_samp via a RANGE window frame ending the day
+    before. Only days with |z| >= Z_THRESHOLD come back for _merge_consecutive; baselines
+    within CONSTANT_STD_TOLERANCE of constant score nothing, as in exact_z.
+    """
+    by_metric: dict[str, list[tuple[date, float]]] = defaultdict(list)
+    for row in db.execute(anomaly_z_select(start_date, end_date, user_id)):
+        by_metric[row.metric_name].append((row.day, float(row.z)))
+
+    all_anomalies: list[AnomalyOut] = []
+    for metric_name, anomalous in by_metric.items():
+        all_anomalies.extend(_merge_consecutive(metric_name, anomalous))
+    all_anomalies.sort(key=lambda a: a.start_ts, reverse=True)
+    return all_anomalies
+
+
+def detect_anomalies(
+    db: Session,
+    start_date: date,
+    end_date: date,
+    user_id: str | None = None,
+    mode: DetectionMode = "python",
+) -> list[AnomalyOut]:
+    """
+    Detect anomalies using rolling 30-day baseline (mean, std). Previous days only.
+    Merge consecutive anomalous days into one window. The python and sql modes are read-only.
+    mode="sql" runs the rolling statistics in Postgres and transfers only anomalous days.
+    mode="stored" (user_id required) writes: it brings the user's stored windows up to
+    date incrementally (advancing watermarks, inserting or extending anomaly rows),
+    commits, and returns those overlapping the range.
+    """
+    if mode == "sql":
+        with timed("detect_anomalies", "sql"):
+            return detect_anomalies_sql(db, start_date, end_date, user_id)
+    if mode == "stored":
+        from services.anomaly_store import stored_anomalies, update_stored_anomalies
+
+        if user_id is None:
+            raise ValueError("mode='stored' requires a user_id")
+        with timed("detect_anomalies", "stored"):
+            update_stored_anomalies(db, user_id)
+            db.commit()
+            return stored_anomalies(db, start_date, end_date, user_id)
+    query_start, query_end = anomaly_query_window(start_date, end_date)
+    with timed("detect_anomalies", "fetch"):
+        by_metric = fetch_daily_buckets(db, query_start, query_end, user_id)
+    with timed("detect_anomalies", "compute"):
+        return detect_anomalies_from_buckets(by_metric, start_date, end_date)
+
+
+async def detect_anomalies_async(
+    db: AsyncSession,
+    start_date: date,
+    end_date: date,
+    user_id: str | None = None,
+    mode: DetectionMode = "python",
+) -> list[AnomalyOut]:
+    """
+    detect_anomalies on an AsyncSession. The python mode fetches asynchronously and
+    screens in a worker thread; sql and stored modes run their sync code via run_sync.
+    """
+    if mode != "python":
+        return await db.run_sync(detect_anomalies, start_date, end_date, user_id, mode)
+    query_start, query_end = anomaly_query_window(start_date, end_date)
+    with timed("detect_anomalies", "fetch"):
+        by_metric = await fetch_daily_buckets_async(db, query_start, query_end, user_id)
+    with timed("detect_anomalies", "compute"):
+        return await to_thread.run_sync(
+            detect_anomalies_from_buckets, by_metric, start_date, end_date
+        )
@@ -0,0 +1,314 @@
+"""
+Incremental anomaly detection persisted to the anomaly table.
+anomaly_watermark.last_day marks, per (user, metric), the last day already scanned,
+and anomaly_watermark.state holds the detector's trailing window (RollingBaseline)
+as of that day. advance_anomaly_detectors steps each window through the complete
+days after the mark, read from the rollup. It extends the window left open at the
+mark or closes it, and inserts new windows. Ingest runs it for the series each batch
+touched, so anomalies are stored as soon as a day is complete; mode="stored" and
+scripts.update_anomalies run it for all of a user's metrics.
+Writes to already scanned days rewind the mark and drop the state
+(invalidate_stored_anomalies); the window is then rebuilt from the ROLLING_DAYS
+before the mark instead of rescanning the history.
+Writers of one series are serialized: invalidate_stored_anomalies and
+advance_anomaly_detectors first take a transaction-scoped advisory lock per
+(user, metric) (lock_series), so concurrent ingest batches, mode="stored" requests and
+scripts.update_anomalies each see the marks and windows the previous one committed.
+A partial unique index on detector rows (user_id, metric_name, start_ts) backs this up.
+Reads are interval-overlap lookups on the stored windows.
+"""
+from collections import defaultdict
+from collections.abc import Iterable
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Any
+
+from sqlalchemy import Date, Float, String, bindparam, delete, func, select, true, tuple_, type_coerce
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from models.anomaly import Anomaly
+from models.anomaly_watermark import AnomalyWatermark
+from models.health_metric_daily import HealthMetricDaily
+from schemas.insights import AnomalyOut
+from services.anomalies import ROLLING_DAYS, Z_THRESHOLD, RollingBaseline, _merge_consecutive, _summary
+from services.rollup import RollupKey, utc_day
+
+DETECTOR_SIGNALS = {"source": "rolling_z", "rolling_days": ROLLING_DAYS, "z_threshold": Z_THRESHOLD}
+
+Series = tuple[str, str]  # user_id, metric_name
+
+
+def _day_ts(d: date) -> datetime:
+    return datetime.combine(d, time.min, tzinfo=timezone.utc)
+
+
+def _last_complete_day() -> date:
+    return datetime.now(timezone.utc).date() - timedelta(days=1)
+
+
+def lock_series(db: Session, series: Iterable[Series]) -> None:
+    """
+    Take pg_advisory_xact_lock on each (user_id, metric_name), held until the transaction
+    ends. Locks are taken in (hashtext(user_id), hashtext(metric_name)) order so two
+    transactions locking overlapping sets cannot deadlock. Re-locking in the same
+    transaction is a no-op.
+    """
+    keys = sorted(set(series))
+    if not keys:
+        return
+    pairs = func.unnest(
+        bindparam("lock_user_ids", [u for u, _ in keys], type_=ARRAY(String)),
+        bindparam("lock_metric_names", [m for _, m in keys], type_=ARRAY(String)),
+    ).table_valued("user_id", "metric_name").render_derived("pairs")
+    # ORDER BY keeps the subquery from being flattened, so locks follow the sort order
+    ids = (
+        select(
+            func.hashtext(pairs.c.user_id).label("k1"),
+            func.hashtext(pairs.c.metric_name).label("k2"),
+        )
+        .distinct()
+        .order_by("k1", "k2")
+        .subquery("ids")
+    )
+    db.execute(select(func.count(func.pg_advisory_xact_lock(ids.c.k1, ids.c.k2))).select_from(ids))
+
+
+def _set_watermarks(db: Session, marks: list[dict[str, Any]]) -> None:
+    """Upsert watermark rows given as dicts of user_id, metric_name, last_day and optional state."""
+    if not marks:
+        return
+    rows = func.unnest(
+        bindparam("user_ids", [m["user_id"] for m in marks], type_=ARRAY(String)),
+        bindparam("metric_names", [m["metric_name"] for m in marks], type_=ARRAY(String)),
+        bindparam("last_days", [m["last_day"] for m in marks], type_=ARRAY(Date)),
+        bindparam("states", [m.get("state") for m in marks], type_=ARRAY(JSONB)),
+    ).table_valued("user_id", "metric_name", "last_day", "state").render_derived("marks")
+    stmt = pg_insert(AnomalyWatermark).from_select(
+        ["user_id", "metric_name", "last_day", "state", "updated_at"],
+        select(rows.c.user_id, rows.c.metric_name, rows.c.last_day, rows.c.state, func.now()),
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[AnomalyWatermark.user_id, AnomalyWatermark.metric_name],
+        set_={
+            "last_day": stmt.excluded.last_day,
+            "state": stmt.excluded.state,
+            "updated_at": stmt.excluded.updated_at,
+        },
+    )
+    db.execute(stmt)
+
+
+def _daily_values(db: Session, read_from: dict[Series, date], through: date) -> dict[Series, list[tuple[date, float]]]:
+    """Each series' daily averages from its own first day through `through`, in one query."""
+    keys = list(read_from)
+    starts = func.unnest(
+        bindparam("user_ids", [u for u, _ in keys], type_=ARRAY(String)),
+        bindparam("metric_names", [m for _, m in keys], type_=ARRAY(String)),
+        bindparam("first_days", [read_from[k] for k in keys], type_=ARRAY(Date)),
+    ).table_valued("user_id", "metric_name", "first_day").render_derived("starts")
+    rollup = HealthMetricDaily
+    # LATERAL keeps it one index range scan per series; as a join the planner may scan all days
+    daily = (
+        select(
+            rollup.user_id,
+            rollup.metric_name,
+            rollup.day,
+            (rollup.value_sum / type_coerce(rollup.value_count, Float)).label("avg_value"),
+        )
+        .where(
+            rollup.user_id == starts.c.user_id,
+            rollup.metric_name == starts.c.metric_name,
+            rollup.day >= starts.c.first_day,
+            rollup.day <= through,
+        )
+        .order_by(rollup.day)  # also keeps Postgres from flattening the subquery into a join
+        .lateral("daily")
+    )
+    rows = db.execute(
+        select(daily)
+        .select_from(starts)
+        .join(daily, true())
+        .order_by(daily.c.user_id, daily.c.metric_name, daily.c.day)
+    )
+    out: dict[Series, list[tuple[date, float]]] = defaultdict(list)
+    for row in rows:
+        out[(row.user_id, row.metric_name)].append((row.day, float(row.avg_value)))
+    return out
+
+
+def _store_windows(
+    db: Session, user_id: str, metric_name: str, mark: date | None, windows: list[AnomalyOut]
+) -> None:
+    """Insert windows in start order; one starting the day after the mark extends a window ending at it."""
+    open_row = None
+    if mark is not None and windows and windows[0].start_ts[:10] == str(mark + timedelta(days=1)):
+        open_row = db.scalar(
+            select(Anomaly).where(
+                Anomaly.user_id == user_id,
+                Anomaly.metric_name == metric_name,
+                Anomaly.end_ts == _day_ts(mark),
+            )
+        )
+    for i, w in enumerate(windows):
+        end_ts = _day_ts(date.fromisoformat(w.end_ts[:10]))
+        if i == 0 and open_row is not None:
+            open_row.end_ts = end_ts
+            if w.score > open_row.score:
+                open_row.score, open_row.severity = w.score, w.severity
+        else:
+            db.add(
+                Anomaly(
+                    user_id=user_id,
+                    metric_name=metric_name,
+                    start_ts=_day_ts(date.fromisoformat(w.start_ts[:10])),
+                    end_ts=end_ts,
+                    severity=w.severity,
+                    score=w.score,
+                    signals=DETECTOR_SIGNALS,
+                    created_at=datetime.now(timezone.utc),
+                )
+            )
+
+
+def advance_anomaly_detectors(db: Session, series: Iterable[Series], through: date | None = None) -> int:
+    """
+    Step each (user_id, metric_name) detector through the days after its mark up to
+    `through`, default the last complete UTC day, storing anomaly windows and the new
+    mark and state. Locks the series first (lock_series) and reads the marks after, so
+    they are the ones the last writer committed. Returns the number of windows inserted
+    or extended. Does not commit.
+    """
+    series = set(series)
+    if not series:
+        return 0
+    if through is None:
+        through = _last_complete_day()
+    lock_series(db, series)
+    marks: dict[Series, tuple[date, dict[str, Any] | None]] = {
+        (row.user_id, row.metric_name): (row.last_day, row.state)
+        for row in db.execute(
+            select(
+                AnomalyWatermark.user_id,
+                AnomalyWatermark.metric_name,
+                AnomalyWatermark.last_day,
+                AnomalyWatermark.state,
+            ).where(tuple_(AnomalyWatermark.user_id, AnomalyWatermark.metric_name).in_(list(series)))
+        )
+    }
+    read_from: dict[Series, date] = {}
+    for key in series:
+        mark, state = marks.get(key, (None, None))
+        if mark is None:
+            read_from[key] = date.min
+        elif state is None:  # rewound: rebuild the window from the days up to the mark
+            read_from[key] = mark - timedelta(days=ROLLING_DAYS - 1)
+        elif mark < through:
+            read_from[key] = mark + timedelta(days=1)
+    if not read_from:
+        return 0
+
+    written = 0
+    new_marks = []
+    for (user_id, metric_name), days in _daily_values(db, read_from, through).items():
+        mark, state = marks.get((user_id, metric_name), (None, None))
+        scanned = [(d, v) for d, v in days if mark is not None and d <= mark]
+        if state is not None:
+            baseline = RollingBaseline.from_state(state)
+        else:
+            baseline = RollingBaseline([d for d, _ in scanned], [v for _, v in scanned])
+        anomalous: list[tuple[date, float]] = []
+        last_day = mark
+        for day, value in days[len(scanned) :]:
+            z = baseline.observe(day, value)
+            if z is not None:
+                anomalous.append((day, z))
+            last_day = day
+        windows = sorted(_merge_consecutive(metric_name, anomalous), key=lambda a: a.start_ts)
+        _store_windows(db, user_id, metric_name, mark, windows)
+        new_marks.append(
+            {"user_id": user_id, "metric_name": metric_name, "last_day": last_day, "state": baseline.to_state()}
+        )
+        written += len(windows)
+    _set_watermarks(db, new_marks)
+    db.flush()
+    return written
+
+
+def update_stored_anomalies(db: Session, user_id: str, through: date | None = None) -> int:
+    """
+    advance_anomaly_detectors for every metric the user has in the rollup. Returns
+    the number of windows inserted or extended. Does not commit.
+    """
+    metric_names = db.scalars(
+        select(HealthMetricDaily.metric_name).where(HealthMetricDaily.user_id == user_id).distinct()
+    )
+    return advance_anomaly_detectors(db, ((user_id, m) for m in metric_names), through)
+
+
+def invalidate_stored_anomalies(db: Session, keys: Iterable[RollupKey]) -> None:
+    """
+    Rewind marks after rollup days at or before them changed. A changed day d alters
+    z-scores of days d..d+ROLLING_DAYS, so stored windows ending on or after d are
+    dropped and the mark moves to the day before the earliest of d and their starts.
+    Locks the series first (lock_series). Does not commit.
+    """
+    earliest: dict[tuple[str, str], date] = {}
+    for user_id, metric_name, day in keys:
+        pair = (user_id, metric_name)
+        if pair not in earliest or day < earliest[pair]:
+            earliest[pair] = day
+    if not earliest:
+        return
+    lock_series(db, earliest)
+    marks = db.execute(
+        select(AnomalyWatermark.user_id, AnomalyWatermark.metric_name, AnomalyWatermark.last_day).where(
+            tuple_(AnomalyWatermark.user_id, AnomalyWatermark.metric_name).in_(list(earliest))
+        )
+    ).all()
+    rewound = []
+    for user_id, metric_name, last_day in marks:
+        changed = earliest[(user_id, metric_name)]
+        if changed > last_day:
+            continue  # new days only; the next run picks them up
+        stale = (
+            Anomaly.user_id == user_id,
+            Anomaly.metric_name == metric_name,
+            Anomaly.end_ts >= _day_ts(changed),
+        )
+        first_start = db.scalar(select(func.min(Anomaly.start_ts)).where(*stale))
+        if first_start is not None:
+            changed = min(changed, utc_day(first_start))
+            db.execute(delete(Anomaly).where(*stale))
+        rewound.append({"user_id": user_id, "metric_name": metric_name, "last_day": changed - timedelta(days=1)})
+    _set_watermarks(db, rewound)
+
+
+def stored_anomalies(
+    db: Session,
+    start_date: date,
+    end_date: date,
+    user_id: str,
+) -> list[AnomalyOut]:
+    """Stored windows overlapping [start_date, end_date], whole (not clipped). Sorted by start_ts desc."""
+    rows = db.scalars(
+        select(Anomaly)
+        .where(
+            Anomaly.user_id == user_id,
+            Anomaly.start_ts <= _day_ts(end_date),
+            Anomaly.end_ts >= _day_ts(start_date),
+        )
+        .order_by(Anomaly.start_ts.desc(), Anomaly.metric_name)
+    )
+    return [
+        AnomalyOut(
+            metric_name=row.metric_name,
+            start_ts=f"{utc_day(row.start_ts).isoformat()}T00:00:00Z",
+            end_ts=f"{utc_day(row.end_ts).isoformat()}T00:00:00Z",
+            severity=row.severity,
+            score=row.score,
+            confidence=round(min(1.0, row.score / 4.0), 4),
+            summary=_summary(row.metric_name),
+        )
+        for row in rows
+    ]
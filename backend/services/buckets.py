@@ -0,0 +1,333 @@
+"""
+Shared daily-bucket query, served from the health_metric_daily rollup.
+Fetch a window of daily averages once; services slice the in-memory series.
+Cost depends on days in range, not raw sample count.
+fetch_daily_buckets_async is the same query on an AsyncSession (asyncpg).
+With ANALYTICS_BACKEND=duckdb both are answered by services.duckdb_store instead;
+otherwise one user's buckets are sliced from services.series_cache (SERIES_CACHE_BYTES).
+period_avg_select buckets by hour (raw rows) or week/month (rollup sums and counts).
+cohort_daily_select reads a page of users' daily series in one statement.
+"""
+from collections import defaultdict
+from collections.abc import Collection, Sequence
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Literal
+
+import numpy as np
+from anyio import to_thread
+from sqlalchemy import Date, Float, Select, cast, func, literal_column, select, type_coerce
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from core.config import ANALYTICS_BACKEND, SERIES_CACHE_BYTES
+from core.metrics import query_rows
+from models.health_metric import HealthMetric
+from models.health_metric_daily import HealthMetricDaily
+
+DailyBuckets = dict[str, dict[date, float]]
+Resolution = Literal["hour", "day", "week", "month"]
+MAX_HOUR_RANGE_DAYS = 31  # hour buckets read raw rows; keep the range (and payload) bounded
+
+
+def day_bounds(start_date: date, end_date: date) -> tuple[datetime, datetime]:
+    """Return UTC [start, end) datetimes covering the inclusive date range."""
+    start_dt = datetime.combine(start_date, time.min, tzinfo=timezone.utc)
+    end_dt = datetime.combine(end_date, time.min, tzinfo=timezone.utc)
+    end_dt += timedelta(days=1)  # exclusive upper bound
+    return start_dt, end_dt
+
+
+def daily_avg_select(start_date: date, end_date: date, user_id: str | None = None) -> Select:
+    """
+    SELECT day, metric_name, avg_value from the rollup for the inclusive date range.
+    Averages are sum(value_sum) / sum(value_count), equal to avg(value) over raw rows.
+    """
+    rollup = HealthMetricDaily
+    stmt = (
+        select(
+            rollup.day,
+            rollup.metric_name,
+            (func.sum(rollup.value_sum) / func.sum(rollup.value_count)).label("avg_value"),
+        )
+        .where(rollup.day >= start_date, rollup.day <= end_date)
+        .group_by(rollup.day, rollup.metric_name)
+    )
+    if user_id is not None:
+        stmt = stmt.where(rollup.user_id == user_id)
+    return stmt
+
+
+def _buckets_select(start_date: date, end_date: date, user_id: str | None) -> Select:
+    return daily_avg_select(start_date, end_date, user_id).order_by(HealthMetricDaily.day)
+
+
+def _buckets_from_rows(rows) -> DailyBuckets:
+    by_metric: DailyBuckets = defaultdict(dict)
+    for row in rows:
+        by_metric[row.metric_name][row.day] = float(row.avg_value)
+    return dict(by_metric)
+
+
+def fetch_rollup_buckets(
+    db: Session,
+    start_date: date,
+    end_date: date,
+    user_id: str | None = None,
+) -> DailyBuckets:
+    """Return metric_name -> {date -> avg_value} for the inclusive date range from the rollup."""
+    rows = db.execute(_buckets_select(start_date, end_date, user_id)).all()
+    query_rows.observe(len(rows), "daily_buckets")
+    return _buckets_from_rows(rows)
+
+
+def _duckdb_buckets(start_date: date, end_date: date, user_id: str | None) -> DailyBuckets:
+    from services.duckdb_store import get_store
+
+    return get_store().daily_buckets(start_date, end_date, user_id)
+
+
+def fetch_daily_buckets(
+    db: Session,
+    start_date: date,
+    end_date: date,
+    user_id: str | None = None,
+) -> DailyBuckets:
+    """Return metric_name -> {date -> avg_value} for the inclusive date range."""
+    if ANALYTICS_BACKEND == "duckdb":
+        return _duckdb_buckets(start_date, end_date, user_id)
+    if user_id is not None and SERIES_CACHE_BYTES > 0:
+        from services.series_cache import cached_daily_buckets
+
+        return cached_daily_buckets(db, start_date, end_date, user_id)
+    return fetch_rollup_buckets(db, start_date, end_date, user_id)
+
+
+async def fetch_daily_buckets_async(
+    db: AsyncSession,
+    start_date: date,
+    end_date: date,
+    user_id: str | None = None,
+) -> DailyBuckets:
+    """fetch_daily_buckets on an AsyncSession; the DuckDB backend runs in a worker thread."""
+    if ANALYTICS_BACKEND == "duckdb":
+        return await to_thread.run_sync(_duckdb_buckets, start_date, end_date, user_id)
+    if user_id is not None and SERIES_CACHE_BYTES > 0:
+        from services.series_cache import cached_daily_buckets_async
+
+        return await cached_daily_buckets_async(db, start_date, end_date, user_id)
+    rows = (await db.execute(_buckets_select(start_date, end_date, user_id))).all()
+    query_rows.observe(len(rows), "daily_buckets")
+    return _buckets_from_rows(rows)
+
+
+def auto_resolution(start_date: date, end_date: date) -> Resolution:
+    """Coarsest-enough resolution for about 200 points per metric at most."""
+    days = (end_date - start_date).days + 1
+    if days <= 2:
+        return "hour"
+    if days <= 200:
+        return "day"
+    if days <= 200 * 7:
+        return "week"
+    return "month"
+
+
+def period_avg_select(
+    start_date: date,
+    end_date: date,
+    user_id: str | None = None,
+    resolution: Resolution = "day",
+) -> Select:
+    """
+    SELECT period, metric_name, avg_value ordered by period for the inclusive date range.
+    day/week/month periods are dates (week starts Monday) aggregated from the rollup's
+    sums and counts; hour periods are naive UTC datetimes averaged from raw rows.
+    """
+    if resolution == "hour":
+        period = func.date_trunc(literal_column("'hour'"), func.timezone("UTC", HealthMetric.ts))
+        start_dt, end_dt = day_bounds(start_date, end_date)
+        stmt = select(
+            period.label("period"),
+            HealthMetric.metric_name,
+            func.avg(HealthMetric.value).label("avg_value"),
+        ).where(HealthMetric.ts >= start_dt, HealthMetric.ts < end_dt)
+        if user_id is not None:
+            stmt = stmt.where(HealthMetric.user_id == user_id)
+        return stmt.group_by(period, HealthMetric.metric_name).order_by(period)
+
+    if resolution not in ("day", "week", "month"):
+        raise ValueError(f"unknown resolution {resolution!r}")
+    rollup = HealthMetricDaily
+    if resolution == "day":
+        period = rollup.day
+    else:
+        period = cast(func.date_trunc(literal_column(f"'{resolution}'"), rollup.day), Date)
+    stmt = select(
+        period.label("period"),
+        rollup.metric_name,
+        (func.sum(rollup.value_sum) / func.sum(rollup.value_count)).label("avg_value"),
+    ).where(rollup.day >= start_date, rollup.day <= end_date)
+    if user_id is not None:
+        stmt = stmt.where(rollup.user_id == user_id)
+    return stmt.group_by(period, rollup.metric_name).order_by(period)
+
+
+PeriodRow = tuple[date | datetime, str, float]  # period, metric_name, avg_value
+
+
+def _duckdb_period_rows(
+    start_date: date, end_date: date, user_id: str | None, resolution: Resolution
+) -> list[PeriodRow]:
+    from services.duckdb_store import get_store
+
+    return get_store().period_rows(start_date, end_date, user_id, resolution)
+
+
+def fetch_period_rows(
+    db: Session,
+    start_date: date,
+    end_date: date,
+    user_id: str | None = None,
+    resolution: Resolution = "day",
+) -> list[PeriodRow]:
+    """(period, metric_name, avg_value) rows ordered by period; see period_avg_select."""
+    if ANALYTICS_BACKEND == "duckdb":
+        return _duckdb_period_rows(start_date, end_date, user_id, resolution)
+    rows = db.execute(period_avg_select(start_date, end_date, user_id, resolution)).all()
+    query_rows.observe(len(rows), f"period_buckets_{resolution}")
+    return [(r.period, r.metric_name, float(r.avg_value)) for r in rows]
+
+
+async def fetch_period_rows_async(
+    db: AsyncSession,
+    start_date: date,
+    end_date: date,
+    user_id: str | None = None,
+    resolution: Resolution = "day",
+) -> list[PeriodRow]:
+    """fetch_period_rows on an AsyncSession."""
+    if ANALYTICS_BACKEND == "duckdb":
+        return await to_thread.run_sync(_duckdb_period_rows, start_date, end_date, user_id, resolution)
+    rows = (await db.execute(period_avg_select(start_date, end_date, user_id, resolution))).all()
+    query_rows.observe(len(rows), f"period_buckets_{resolution}")
+    return [(r.period, r.metric_name, float(r.avg_value)) for r in rows]
+
+
+UserDayRow = tuple[str, str, date, float]  # user_id, metric_name, day, avg_value
+
+
+def cohort_daily_select(
+    start_date: date,
+    end_date: date,
+    metric_names: Collection[str],
+    user_ids: Sequence[str] | None = None,
+    user_prefix: str | None = None,
+    after: str | None = None,
+    limit: int | None = None,
+) -> Select:
+    """
+    SELECT user_id, metric_name, day, avg_value from the rollup for a page of users,
+    ordered by user_id: each user's rows come together, days in no particular order.
+    The page is user_ids when given; otherwise the first `limit` users by id (after
+    `after`, starting with user_prefix) with rows for metric_names in range, chosen in
+    the same statement.
+    """
+    rollup = HealthMetricDaily
+    in_range = (rollup.day >= start_date, rollup.day <= end_date, rollup.metric_name.in_(metric_names))
+    if user_ids is not None:
+        members = rollup.user_id.in_(user_ids)
+    else:
+        page = select(rollup.user_id).where(*in_range)
+        if user_prefix:
+            page = page.where(rollup.user_id.startswith(user_prefix, autoescape=True))
+        if after is not None:
+            page = page.where(rollup.user_id > after)
+        page = page.group_by(rollup.user_id).order_by(rollup.user_id).limit(limit).cte("page")
+        members = rollup.user_id.in_(select(page.c.user_id))
+    return (
+        select(
+            rollup.user_id,
+            rollup.metric_name,
+            rollup.day,
+            (rollup.value_sum / type_coerce(rollup.value_count, Float)).label("avg_value"),
+        )
+        .where(*in_range, members)
+        .order_by(rollup.user_id)
+    )
+
+
+def _duckdb_cohort_rows(*args) -> list[UserDayRow]:
+    from services.duckdb_store import get_store
+
+    return get_store().cohort_rows(*args)
+
+
+def fetch_cohort_rows(
+    db: Session,
+    start_date: date,
+    end_date: date,
+    metric_names: Collection[str],
+    user_ids: Sequence[str] | None = None,
+    user_prefix: str | None = None,
+    after: str | None = None,
+    limit: int | None = None,
+) -> list[UserDayRow]:
+    """(user_id, metric_name, day, avg_value) rows for a page of users; see cohort_daily_select."""
+    args = (start_date, end_date, metric_names, user_ids, user_prefix, after, limit)
+    if ANALYTICS_BACKEND == "duckdb":
+        return _duckdb_cohort_rows(*args)
+    rows = db.execute(cohort_daily_select(*args)).all()
+    query_rows.observe(len(rows), "cohort_buckets")
+    return [(r.user_id, r.metric_name, r.day, float(r.avg_value)) for r in rows]
+
+
+async def fetch_cohort_rows_async(
+    db: AsyncSession,
+    start_date: date,
+    end_date: date,
+    metric_names: Collection[str],
+    user_ids: Sequence[str] | None = None,
+    user_prefix: str | None = None,
+    after: str | None = None,
+    limit: int | None = None,
+) -> list[UserDayRow]:
+    """fetch_cohort_rows on an AsyncSession."""
+    args = (start_date, end_date, metric_names, user_ids, user_prefix, after, limit)
+    if ANALYTICS_BACKEND == "duckdb":
+        return await to_thread.run_sync(_duckdb_cohort_rows, *args)
+    rows = (await db.execute(cohort_daily_select(*args))).all()
+    query_rows.observe(len(rows), "cohort_buckets")
+    return [(r.user_id, r.metric_name, r.day, float(r.avg_value)) for r in rows]
+
+
+def slice_buckets(by_metric: DailyBuckets, start_date: date, end_date: date) -> DailyBuckets:
+    """Restrict each metric series to the inclusive date range; drops empty metrics."""
+    out: DailyBuckets = {}
+    for metric_name, series in by_metric.items():
+        sliced = {d: v for d, v in series.items() if start_date <= d <= end_date}
+        if sliced:
+            out[metric_name] = sliced
+    return out
+
+
+def dense_grid(by_metric: DailyBuckets) -> tuple[date, list[str], np.ndarray, np.ndarray]:
+    """
+    Lay every metric's series on one dense day grid starting at the earliest date.
+    Returns (grid_start, metric_names, values[m, t], mask[m, t]); missing days are 0 / False.
+    """
+    metric_names = list(by_metric)
+    all_dates = [d for series in by_metric.values() for d in series]
+    if not all_dates:
+        empty = (len(metric_names), 0)
+        return date.min, metric_names, np.zeros(empty), np.zeros(empty, dtype=bool)
+    grid_start = min(all_dates)
+    n_days = (max(all_dates) - grid_start).days + 1
+    values = np.zeros((len(metric_names), n_days))
+    mask = np.zeros((len(metric_names), n_days), dtype=bool)
+    start_ord = grid_start.toordinal()
+    for i, metric_name in enumerate(metric_names):
+        series = by_metric[metric_name]
+        idx = np.fromiter((d.toordinal() - start_ord for d in series), dtype=np.int64, count=len(series))
+        values[i, idx] = np.fromiter(series.values(), dtype=float, count=len(series))
+        mask[i, idx] = True
+    return grid_start, metric_names, values, mask
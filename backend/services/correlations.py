@@ -1,58 +1,34 @@
 """
 Lagged Pearson correlation on HealthMetric daily buckets.
-No DB writes; deterministic math only.
+All metrics are aligned on one dense day grid with masks; pairwise-complete
+sums for every pair and lag come from batched matrix products, or FFT
+cross-correlation for wide lag windows. No DB writes; deterministic math only.
 """
-from collections import defaultdict
-from datetime import date, datetime, time, timedelta, timezone
+from datetime import date, timedelta
 
-from sqlalchemy import func, select
+import numpy as np
+from anyio import to_thread
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from models.health_metric import HealthMetric
+from core.metrics import timed
 from schemas.insights import CorrelationOut
-
-LAGS = [-3, -2, -1, 0, 1, 2, 3]
+from services.buckets import (
+    DailyBuckets,
+    dense_grid,
+    fetch_daily_buckets,
+    fetch_daily_buckets_async,
+    slice_buckets,
+)
+
+DEFAULT_MAX_LAG = 3
+MAX_LAG_LIMIT = 180
 MIN_OVERLAP_DAYS = 14
 MIN_ABS_CORRELATION = 0.4
 TOP_N = 5
-QUERY_PAD_DAYS = 3
-
-
-def _daily_buckets(
-    db: Session,
-    start_dt: datetime,
-    end_dt: datetime,
-    user_id: str | None,
-) -> dict[str, dict[date, float]]:
-    """Return metric_name -> {date -> avg_value} for [start_dt, end_dt)."""
-    day_col = func.date_trunc("day", HealthMetric.ts).label("day")
-    stmt = (
-        select(
-            day_col,
-            HealthMetric.metric_name,
-            func.avg(HealthMetric.value).label("avg_value"),
-        )
-        .where(HealthMetric.ts >= start_dt, HealthMetric.ts < end_dt)
-        .group_by(day_col, HealthMetric.metric_name)
-        .order_by(day_col)
-    )
-    if user_id is not None:
-        stmt = stmt.where(HealthMetric.user_id == user_id)
-    rows = db.execute(stmt).all()
-
-    by_metric: dict[str, dict[date, float]] = defaultdict(dict)
-    for row in rows:
-        day_ts = row.day
-        if hasattr(day_ts, "date"):
-            d = day_ts.date()
-        else:
-            d = (
-                day_ts
-                if isinstance(day_ts, date)
-                else datetime.combine(day_ts, time.min, tzinfo=timezone.utc).date()
-            )
-        by_metric[row.metric_name][d] = float(row.avg_value)
-    return dict(by_metric)
+QUERY_PAD_DAYS = DEFAULT_MAX_LAG
+FFT_MIN_LAGS = 121  # from +/-60 days on, FFT cross-correlation beats one matmul per lag
+_SCREEN_TOLERANCE = 1e-6  # slack for the vectorized screen before exact confirmation
 
 
 def _pearson(x: list[float], y: list[float]) -> float | None:
@@ -73,57 +49,142 @@ def _pearson(x: list[float], y: list[float]) -> float | None:
     return r
 
 
-def compute_correlations(
-    db: Session,
+def correlation_query_window(
     start_date: date,
     end_date: date,
-    user_id: str | None = None,
-) -> list[CorrelationOut]:
+    max_lag: int = DEFAULT_MAX_LAG,
+) -> tuple[date, date]:
+    """Inclusive day range needed to correlate [start_date, end_date] across lags +/-max_lag."""
+    pad = max(QUERY_PAD_DAYS, max_lag)
+    return start_date - timedelta(days=pad), end_date + timedelta(days=pad)
+
+
+def _lagged_sums_direct(values: np.ndarray, mask: np.ndarray, lags: list[int]) -> np.ndarray:
     """
-    Compute lagged Pearson correlation for metric pairs from daily-bucketed data.
-    Returns top 5 by |correlation|, only |r| >= 0.4 and >= 14 overlapping days.
+    Pairwise-complete sums for every (lag, a, b): overlap n, sum x, sum y, sum x^2,
+    sum y^2, sum xy, where x = a[t] and y = b[t + lag]. One matmul per sum and lag.
+    Returns array [6, n_lags, m, m].
+    """
+    n_days = values.shape[1]
+    x2 = values * values
+    out = np.zeros((6, len(lags), values.shape[0], values.shape[0]))
+    for k, lag in enumerate(lags):
+        if abs(lag) >= n_days:
+            continue
+        a = slice(max(0, -lag), n_days - max(0, lag))
+        b = slice(max(0, lag), n_days + min(0, lag))
+        ma, mb = mask[:, a], mask[:, b]
+        out[0, k] = ma @ mb.T
+        out[1, k] = values[:, a] @ mb.T
+        out[2, k] = ma @ values[:, b].T
+        out[3, k] = x2[:, a] @ mb.T
+        out[4, k] = ma @ x2[:, b].T
+        out[5, k] = values[:, a] @ values[:, b].T
+    return out
+
+
+def _lagged_sums_fft(values: np.ndarray, mask: np.ndarray, lags: list[int]) -> np.ndarray:
+    """
+    Same sums as _lagged_sums_direct for all lags at once via FFT cross-correlation:
+    sum_t a[t] * b[t + lag] = irfft(conj(rfft(a)) * rfft(b))[lag], zero-padded so
+    lags up to +/-max(|lag|) never wrap. Returns array [6, n_lags, m, m].
+    """
+    m, n_days = values.shape
+    n_fft = 1 << int(np.ceil(np.log2(n_days + max(abs(l) for l in lags) + 1)))
+    idx = np.array([lag % n_fft for lag in lags])
+    f_m, f_x, f_x2 = (np.fft.rfft(a, n=n_fft) for a in (mask, values, values * values))
+    out = np.zeros((6, len(lags), m, m))
+    pairs = ((f_m, f_m), (f_x, f_m), (f_m, f_x), (f_x2, f_m), (f_m, f_x2), (f_x, f_x))
+    for s, (fa, fb) in enumerate(pairs):
+        cross = np.fft.irfft(np.conj(fa)[:, None, :] * fb[None, :, :], n=n_fft)  # [a, b, lag]
+        out[s] = np.moveaxis(cross[:, :, idx], 2, 0)
+    out[0] = np.rint(out[0])  # overlap counts are integers
+    return out
+
+
+def _screen_r(sums: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Approximate r from lagged sums, plus a flag for near-zero variance (needs exact check)."""
+    n, sx, sy, sxx, syy, sxy = sums
+    with np.errstate(invalid="ignore", divide="ignore"):
+        var_x = sxx - sx * sx / n
+        var_y = syy - sy * sy / n
+        cov = sxy - sx * sy / n
+        near_flat = (var_x <= _SCREEN_TOLERANCE * sxx) | (var_y <= _SCREEN_TOLERANCE * syy)
+        r = cov / np.sqrt(var_x * var_y)
+    r[near_flat | (n < MIN_OVERLAP_DAYS)] = np.nan
+    return r, near_flat & (n >= MIN_OVERLAP_DAYS)
+
+
+def _exact_r(
+    values: np.ndarray, mask: np.ndarray, a: int, b: int, lag: int
+) -> float | None:
+    """_pearson on the chronological overlap of a[t] and b[t + lag]."""
+    n_days = values.shape[1]
+    ta = slice(max(0, -lag), n_days - max(0, lag))
+    tb = slice(max(0, lag), n_days + min(0, lag))
+    both = mask[a, ta] & mask[b, tb]
+    return _pearson(values[a, ta][both].tolist(), values[b, tb][both].tolist())
+
+
+def compute_correlations_from_buckets(
+    by_metric: DailyBuckets,
+    start_date: date,
+    end_date: date,
+    max_lag: int = DEFAULT_MAX_LAG,
+) -> list[CorrelationOut]:
     """
-    query_start = start_date - timedelta(days=QUERY_PAD_DAYS)
-    query_end = end_date + timedelta(days=QUERY_PAD_DAYS)
-    start_dt = datetime.combine(query_start, time.min, tzinfo=timezone.utc)
-    end_dt = datetime.combine(query_end, time.min, tzinfo=timezone.utc)
-    end_dt += timedelta(days=1)
+    Compute lagged correlations from pre-fetched daily buckets. Series are
+    sliced to correlation_query_window so a wider shared fetch gives the same result.
 
-    by_metric = _daily_buckets(db, start_dt, end_dt, user_id)
+    Every pair and lag is screened in batched array operations on values centered
+    per metric; only the lags that can win for a pair are recomputed with _pearson,
+    so the reported r, best lag (first lag wins ties) and thresholds are exact.
+    """
+    by_metric = slice_buckets(by_metric, *correlation_query_window(start_date, end_date, max_lag))
     metric_names = sorted(by_metric.keys())
     results: list[CorrelationOut] = []
+    if len(metric_names) < 2:
+        return results
+
+    lags = list(range(-max_lag, max_lag + 1))
+    _, _, values, mask = dense_grid({name: by_metric[name] for name in metric_names})
+    # Pearson r is shift-invariant; centering keeps the sum-of-squares screen accurate.
+    counts = np.maximum(mask.sum(axis=1, keepdims=True), 1)
+    centered = np.where(mask, values - values.sum(axis=1, keepdims=True) / counts, 0.0)
+    mask_f = mask.astype(float)
+    if len(lags) >= FFT_MIN_LAGS:
+        sums = _lagged_sums_fft(centered, mask_f, lags)
+    else:
+        sums = _lagged_sums_direct(centered, mask_f, lags)
+    r_screen, needs_exact = _screen_r(sums)
+    # A series constant over the whole window is flat in every overlap: r is undefined.
+    constant = np.array([len(set(by_metric[name].values())) == 1 for name in metric_names])
+    needs_exact[:, constant, :] = False
+    needs_exact[:, :, constant] = False
+    abs_r = np.abs(r_screen)
+    best_screen = np.where(np.isnan(abs_r), -1.0, abs_r).max(axis=0)
 
     for i, metric_a in enumerate(metric_names):
-        for metric_b in metric_names[i + 1 :]:  # no self, no duplicate pair
-            series_a = by_metric[metric_a]
-            series_b = by_metric[metric_b]
+        for j in range(i + 1, len(metric_names)):  # no self, no duplicate pair
+            flat_lags = needs_exact[:, i, j]
+            if best_screen[i, j] < MIN_ABS_CORRELATION - _SCREEN_TOLERANCE and not flat_lags.any():
+                continue
+            contenders = flat_lags | (abs_r[:, i, j] >= best_screen[i, j] - _SCREEN_TOLERANCE)
             best_r: float | None = None
             best_lag: int | None = None
-
-            for lag in LAGS:
-                # Align: days d where we have metric_a[d] and metric_b[d + lag]
-                overlap_dates = [
-                    d
-                    for d in series_a
-                    if (d + timedelta(days=lag)) in series_b
-                ]
-                if len(overlap_dates) < MIN_OVERLAP_DAYS:
-                    continue
-                x = [series_a[d] for d in overlap_dates]
-                y = [series_b[d + timedelta(days=lag)] for d in overlap_dates]
-                r = _pearson(x, y)
+            for k in np.flatnonzero(contenders):  # lag order, as before
+                r = _exact_r(values, mask, i, j, lags[k])
                 if r is None:
                     continue
                 if best_r is None or abs(r) > abs(best_r):
                     best_r = r
-                    best_lag = lag
-
+                    best_lag = lags[k]
 
             if best_r is not None and best_lag is not None and abs(best_r) >= MIN_ABS_CORRELATION:
                 results.append(
                     CorrelationOut(
                         metric_a=metric_a,
-                        metric_b=metric_b,
+                        metric_b=metric_names[j],
                         lag_days=best_lag,
                         correlation=round(best_r, 3),
                         p_value=None,
@@ -132,4 +193,40 @@ def compute_correlations(
                 )
 
     results.sort(key=lambda c: abs(c.correlation), reverse=True)
-    return results[:TOP_N]
\ No newline at end of file
+    return results[:TOP_N]
+
+
+def compute_correlations(
+    db: Session,
+    start_date: date,
+    end_date: date,
+    user_id: str | None = None,
+    max_lag: int = DEFAULT_MAX_LAG,
+) -> list[CorrelationOut]:
+    """
+    Compute lagged Pearson correlation for metric pairs from daily-bucketed data.
+    Returns top 5 by |correlation|, only |r| >= 0.4 and >= 14 overlapping days,
+    searching lags -max_lag..max_lag.
+    """
+    query_start, query_end = correlation_query_window(start_date, end_date, max_lag)
+    with timed("compute_correlations", "fetch"):
+        by_metric = fetch_daily_buckets(db, query_start, query_end, user_id)
+    with timed("compute_correlations", "compute"):
+        return compute_correlations_from_buckets(by_metric, start_date, end_date, max_lag)
+
+
+async def compute_correlations_async(
+    db: AsyncSession,
+    start_date: date,
+    end_date: date,
+    user_id: str | None = None,
+    max_lag: int = DEFAULT_MAX_LAG,
+) -> list[CorrelationOut]:
+    """compute_correlations on an AsyncSession; the lag search runs in a worker thread."""
+    query_start, query_end = correlation_query_window(start_date, end_date, max_lag)
+    with timed("compute_correlations", "fetch"):
+        by_metric = await fetch_daily_buckets_async(db, query_start, query_end, user_id)
+    with timed("compute_correlations", "compute"):
+        return await to_thread.run_sync(
+            compute_correlations_from_buckets, by_metric, start_date, end_date, max_lag
+        )
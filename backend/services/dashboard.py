@@ -0,0 +1,65 @@
+"""
+Single-fetch dashboard: one daily-bucket query feeds timeline, wellness,
+anomalies, correlations and the insight summary. The only DB writes are
+insight text cache rows.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+from anyio import to_thread
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from schemas.analytics import WellnessScoreResponse
+from schemas.dashboard import DashboardResponse
+from schemas.health import TimelineResponse
+from schemas.insights import AnomalyOut, CorrelationOut
+from services.anomalies import detect_anomalies_from_buckets
+from services.buckets import DailyBuckets, fetch_daily_buckets_async
+from services.correlations import compute_correlations_from_buckets
+from services.insight_summary import signals_query_window, summarize_signals
+from services.timeline import timeline_from_buckets
+from services.wellness import compute_wellness_from_buckets
+
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="dashboard")
+
+
+def _compute_payloads(
+    by_metric: DailyBuckets,
+    start_date: date,
+    end_date: date,
+) -> tuple[TimelineResponse, WellnessScoreResponse, list[AnomalyOut], list[CorrelationOut]]:
+    """The four independent computations over one set of buckets, concurrently."""
+    timeline_f = _executor.submit(timeline_from_buckets, by_metric, start_date, end_date)
+    wellness_f = _executor.submit(compute_wellness_from_buckets, by_metric, end_date)
+    anomalies_f = _executor.submit(detect_anomalies_from_buckets, by_metric, start_date, end_date)
+    correlations_f = _executor.submit(
+        compute_correlations_from_buckets, by_metric, start_date, end_date
+    )
+    return timeline_f.result(), wellness_f.result(), anomalies_f.result(), correlations_f.result()
+
+
+async def build_dashboard(
+    db: AsyncSession,
+    start_date: date,
+    end_date: date,
+    user_id: str | None = None,
+) -> DashboardResponse:
+    """
+    Fetch buckets for the widest window once, compute the four independent
+    payloads concurrently, then synthesize the summary from their results.
+    """
+    # The signals window already contains [start_date, end_date] for the timeline.
+    by_metric = await fetch_daily_buckets_async(
+        db, *signals_query_window(start_date, end_date), user_id
+    )
+    timeline, wellness, anomalies, correlations = await to_thread.run_sync(
+        _compute_payloads, by_metric, start_date, end_date
+    )
+    summary = await summarize_signals(start_date, end_date, anomalies, correlations, wellness, db)
+    return DashboardResponse(
+        timeline=timeline,
+        wellness=wellness,
+        anomalies=anomalies,
+        correlations=correlations,
+        summary=summary,
+    )
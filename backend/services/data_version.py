@@ -0,0 +1,82 @@
+"""
+Per-user data versions for conditional GETs.
+user_data_version holds a counter per user that every writer of health_metric bumps
+in its own transaction (ingest, bulk loads, rollup rebuilds). Read endpoints hash
+(path, query params, version) into an ETag, so an unchanged response costs one
+primary-key lookup. The all-users version is the single data_version_total row,
+bumped by one in the same statement as the users' counters: it grows with every
+commit regardless of commit order, and reading it is one primary-key lookup too.
+"""
+import hashlib
+import json
+from collections.abc import Iterable
+from datetime import datetime, timezone
+
+from sqlalchemy import BigInteger, DateTime, Select, String, bindparam, func, literal, select
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from models.data_version_total import DataVersionTotal
+from models.user_data_version import UserDataVersion
+
+
+def bump_data_versions(db: Session, user_ids: Iterable[str]) -> None:
+    """
+    Increment the version of each user (created at 1) and the all-users version by one,
+    in one statement. Does not commit. The all-users row stays locked until commit, so
+    writers bump as their last statement before committing.
+    """
+    users = sorted(set(user_ids))
+    if not users:
+        return
+    now = datetime.now(timezone.utc)
+    ids = (
+        func.unnest(bindparam("user_ids", users, type_=ARRAY(String)))
+        .table_valued("user_id")
+        .render_derived("ids")
+    )
+    per_user = pg_insert(UserDataVersion).from_select(
+        ["user_id", "version", "updated_at"],
+        select(ids.c.user_id, literal(1, BigInteger), literal(now, DateTime(timezone=True))),
+    )
+    per_user = per_user.on_conflict_do_update(
+        index_elements=[UserDataVersion.user_id],
+        set_={"version": UserDataVersion.version + 1, "updated_at": per_user.excluded.updated_at},
+    ).returning(UserDataVersion.user_id)
+    total = pg_insert(DataVersionTotal).values(id=1, version=1, updated_at=now)
+    total = total.on_conflict_do_update(
+        index_elements=[DataVersionTotal.id],
+        set_={"version": DataVersionTotal.version + 1, "updated_at": total.excluded.updated_at},
+    )
+    db.execute(total.add_cte(per_user.cte("bumped")))
+
+
+def data_version_select(user_id: str | None) -> Select:
+    if user_id is None:
+        return select(DataVersionTotal.version).where(DataVersionTotal.id == 1)
+    return select(UserDataVersion.version).where(UserDataVersion.user_id == user_id)
+
+
+def data_version(db: Session, user_id: str | None) -> int:
+    """Current version of one user (0 before their first write), or of all users."""
+    return int(db.scalar(data_version_select(user_id)) or 0)
+
+
+async def data_version_async(db: AsyncSession, user_id: str | None) -> int:
+    return int(await db.scalar(data_version_select(user_id)) or 0)
+
+
+def data_etag(path: str, params: Iterable[tuple[str, str]], version: int, *extra: str) -> str:
+    """Strong ETag over the endpoint, its query params (order-insensitive) and the data version."""
+    key = json.dumps([path, sorted(params), version, *extra], separators=(",", ":"))
+    return '"' + hashlib.sha256(key.encode()).hexdigest()[:32] + '"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """If-None-Match semantics: "*" or any listed tag, weak or strong, equal to etag."""
+    if not if_none_match:
+        return False
+    tags = [t.strip() for t in if_none_match.split(",")]
+    return "*" in tags or any(t.removeprefix("W/") == etag for t in tags)
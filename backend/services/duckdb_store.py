@@ -0,0 +1,257 @@
+"""
+Optional DuckDB analytics backend (ANALYTICS_BACKEND=duckdb, needs the duckdb extra).
+Daily buckets are aggregated from raw health_metric rows held in DuckDB's columnar
+engine instead of the Postgres rollup, either:
+
+- in process: copied from Postgres at startup (COPY ... TO STDOUT into DuckDB) and
+  kept current by ingest via apply_rows, or
+- over Parquet: a read-only view on DUCKDB_PARQUET files written by
+  scripts/export_parquet.py; new writes show up after the next export.
+
+Timestamps are stored as naive UTC, so CAST(ts AS DATE) is the UTC day.
+"""
+import os
+import tempfile
+import threading
+from collections import defaultdict
+from collections.abc import Collection, Sequence
+from datetime import date, datetime, timedelta, timezone
+from typing import Any
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from core.config import DUCKDB_PARQUET
+from core.metrics import query_rows
+from services.buckets import DailyBuckets, Resolution
+
+_COLUMNS = "user_id VARCHAR, source VARCHAR, metric_name VARCHAR, value DOUBLE, unit VARCHAR, ts TIMESTAMP"
+_KEY = ("user_id", "source", "metric_name", "ts")
+_EXPORT_SQL = (
+    "COPY (SELECT user_id, source, metric_name, value, unit, ts AT TIME ZONE 'UTC' FROM health_metric) "
+    "TO STDOUT WITH (FORMAT csv)"
+)
+_PERIOD_EXPR = {
+    "hour": "date_trunc('hour', ts)",
+    "day": "CAST(ts AS DATE)",
+    "week": "CAST(date_trunc('week', ts) AS DATE)",
+    "month": "CAST(date_trunc('month', ts) AS DATE)",
+}
+_BUCKETS_SQL = """
+SELECT {period} AS period, metric_name, avg(value) AS avg_value
+FROM health_metric
+WHERE ts >= ? AND ts < ? {user_filter}
+GROUP BY period, metric_name
+ORDER BY period
+"""
+_COHORT_SQL = """
+WITH page AS (
+    SELECT user_id FROM health_metric
+    WHERE ts >= ? AND ts < ? AND list_contains(?, metric_name) {page_filter}
+    GROUP BY user_id ORDER BY user_id {limit}
+)
+SELECT user_id, metric_name, CAST(ts AS DATE) AS day, avg(value) AS avg_value
+FROM health_metric
+WHERE ts >= ? AND ts < ? AND list_contains(?, metric_name) AND user_id IN (SELECT user_id FROM page)
+GROUP BY user_id, metric_name, day
+ORDER BY user_id
+"""
+
+
+def _naive_utc(ts: datetime) -> datetime:
+    return ts.astimezone(timezone.utc).replace(tzinfo=None) if ts.tzinfo else ts
+
+
+def _sql_str(value: str) -> str:
+    return "'" + value.replace("'", "''") + "'"
+
+
+def _import_duckdb():
+    try:
+        import duckdb
+    except ImportError as exc:
+        raise RuntimeError(
+            "ANALYTICS_BACKEND=duckdb requires the duckdb package (install the backend[duckdb] extra)"
+        ) from exc
+    return duckdb
+
+
+class DuckDBStore:
+    """One DuckDB connection; each query runs on its own cursor, writes are serialized."""
+
+    def __init__(self, parquet: str | None = None):
+        duckdb = _import_duckdb()
+        self.parquet = parquet
+        self._con = duckdb.connect(":memory:")
+        self._write_lock = threading.Lock()
+        if parquet:
+            self._con.execute(f"CREATE VIEW health_metric AS SELECT * FROM read_parquet({_sql_str(parquet)})")
+        else:
+            self._con.execute(f"CREATE TABLE health_metric ({_COLUMNS})")
+
+    @property
+    def read_only(self) -> bool:
+        return self.parquet is not None
+
+    def load_from_postgres(self, db: Session) -> int:
+        """Replace the in-process table with every health_metric row, clustered by (user_id, ts); returns the row count."""
+        if self.read_only:
+            raise RuntimeError("DuckDB store reads Parquet; re-export instead of loading")
+        with tempfile.NamedTemporaryFile("w+b", suffix=".csv") as tmp:
+            cursor = db.connection().connection.cursor()
+            try:
+                cursor.copy_expert(_EXPORT_SQL, tmp)
+            finally:
+                cursor.close()
+            tmp.flush()
+            with self._write_lock:
+                self._con.execute("DELETE FROM health_metric")
+                self._con.execute(
+                    "INSERT INTO health_metric SELECT * FROM read_csv(?, header = false, "
+                    "columns = {'user_id': 'VARCHAR', 'source': 'VARCHAR', 'metric_name': 'VARCHAR', "
+                    "'value': 'DOUBLE', 'unit': 'VARCHAR', 'ts': 'TIMESTAMP'}) "
+                    "ORDER BY user_id, ts",  # clustered so zone maps prune per-user scans
+                    [tmp.name],
+                )
+        return self.row_count()
+
+    def apply_rows(self, rows: Sequence[dict[str, Any]], replace: bool = True) -> None:
+        """
+        Mirror an ingest batch (row dicts as in services.ingest). replace=True overwrites
+        rows with the same (user_id, source, metric_name, ts); False keeps existing ones.
+        """
+        if self.read_only or not rows:
+            return
+        chunk = {
+            "user_id": np.array([r["user_id"] for r in rows], dtype=object),
+            "source": np.array([r["source"] for r in rows], dtype=object),
+            "metric_name": np.array([r["metric_name"] for r in rows], dtype=object),
+            "value": np.array([float(r["value"]) for r in rows]),
+            "unit": np.array([r["unit"] for r in rows], dtype=object),
+            "ts": np.array([_naive_utc(r["ts"]) for r in rows], dtype="datetime64[us]"),
+        }
+        match = " AND ".join(f"t.{c} = c.{c}" for c in _KEY)
+        with self._write_lock:
+            cur = self._con.cursor()
+            try:
+                cur.register("chunk", chunk)
+                if replace:
+                    cur.execute(f"DELETE FROM health_metric t USING chunk c WHERE {match}")
+                    cur.execute("INSERT INTO health_metric SELECT * FROM chunk")
+                else:
+                    cur.execute(
+                        "INSERT INTO health_metric SELECT c.* FROM chunk c "
+                        f"WHERE NOT EXISTS (SELECT 1 FROM health_metric t WHERE {match})"
+                    )
+            finally:
+                cur.close()
+
+    def row_count(self) -> int:
+        cur = self._con.cursor()
+        try:
+            return cur.execute("SELECT count(*) FROM health_metric").fetchone()[0]
+        finally:
+            cur.close()
+
+    def period_rows(
+        self,
+        start_date: date,
+        end_date: date,
+        user_id: str | None = None,
+        resolution: Resolution = "day",
+    ) -> list[tuple[date | datetime, str, float]]:
+        """(period, metric_name, avg_value) ordered by period, as services.buckets.period_avg_select."""
+        params: list[Any] = [start_date, end_date + timedelta(days=1)]
+        user_filter = ""
+        if user_id is not None:
+            user_filter = "AND user_id = ?"
+            params.append(user_id)
+        sql = _BUCKETS_SQL.format(period=_PERIOD_EXPR[resolution], user_filter=user_filter)
+        cur = self._con.cursor()
+        try:
+            cols = cur.execute(sql, params).fetchnumpy()
+        finally:
+            cur.close()
+        query_rows.observe(len(cols["period"]), "daily_buckets_duckdb")
+        unit = "datetime64[us]" if resolution == "hour" else "datetime64[D]"
+        periods = cols["period"].astype(unit).tolist()
+        return list(zip(periods, cols["metric_name"].tolist(), cols["avg_value"].tolist()))
+
+    def cohort_rows(
+        self,
+        start_date: date,
+        end_date: date,
+        metric_names: Collection[str],
+        user_ids: Sequence[str] | None = None,
+        user_prefix: str | None = None,
+        after: str | None = None,
+        limit: int | None = None,
+    ) -> list[tuple[str, str, date, float]]:
+        """(user_id, metric_name, day, avg_value) for a page of users, as services.buckets.cohort_daily_select."""
+        window = [start_date, end_date + timedelta(days=1), sorted(metric_names)]
+        params: list[Any] = list(window)
+        page_filter, limit_sql = "", ""
+        if user_ids is not None:
+            page_filter = "AND list_contains(?, user_id)"
+            params.append(list(user_ids))
+        else:
+            if user_prefix:
+                page_filter += " AND starts_with(user_id, ?)"
+                params.append(user_prefix)
+            if after is not None:
+                page_filter += " AND user_id > ?"
+                params.append(after)
+            if limit is not None:
+                limit_sql = f"LIMIT {int(limit)}"
+        sql = _COHORT_SQL.format(page_filter=page_filter, limit=limit_sql)
+        cur = self._con.cursor()
+        try:
+            cols = cur.execute(sql, params + window).fetchnumpy()
+        finally:
+            cur.close()
+        query_rows.observe(len(cols["day"]), "cohort_buckets_duckdb")
+        return list(
+            zip(
+                cols["user_id"].tolist(),
+                cols["metric_name"].tolist(),
+                cols["day"].astype("datetime64[D]").tolist(),
+                cols["avg_value"].tolist(),
+            )
+        )
+
+    def daily_buckets(
+        self,
+        start_date: date,
+        end_date: date,
+        user_id: str | None = None,
+    ) -> DailyBuckets:
+        """Same result as services.buckets.fetch_rollup_buckets, aggregated from raw rows."""
+        by_metric: DailyBuckets = defaultdict(dict)
+        for d, metric_name, value in self.period_rows(start_date, end_date, user_id):
+            by_metric[metric_name][d] = value
+        return dict(by_metric)
+
+    def export_parquet(self, path: str) -> None:
+        """Write the table as one Parquet file ordered by (user_id, ts) for row-group pruning."""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        cur = self._con.cursor()
+        try:
+            cur.execute(
+                f"COPY (SELECT * FROM health_metric ORDER BY user_id, ts) TO {_sql_str(path)} (FORMAT parquet)"
+            )
+        finally:
+            cur.close()
+
+
+_store: DuckDBStore | None = None
+_store_lock = threading.Lock()
+
+
+def get_store() -> DuckDBStore:
+    """Process-wide store, created on first use (empty until load_from_postgres unless Parquet)."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = DuckDBStore(DUCKDB_PARQUET)
+    return _store
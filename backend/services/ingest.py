@@ -0,0 +1,308 @@
+"""
+Bulk ingestion of HealthMetric rows from JSON arrays or NDJSON.
+Records are parsed and validated as the body streams in, then each batch is
+COPYed into a temp staging table and upserted with one INSERT ... SELECT
+on (user_id, source, metric_name, ts), so device retries are idempotent.
+The daily rollup is maintained in the same transaction as each batch, stored
+anomaly windows covering rewritten days and precomputed snapshots of the
+affected users are invalidated, the anomaly detectors of the touched series
+advance through days that are complete, and the users' data versions are bumped.
+After the commit the written days are patched into cached series (services.series_cache).
+"""
+import codecs
+import csv
+import io
+import json
+import time
+from collections.abc import AsyncIterator
+from typing import Any, Literal
+
+from anyio import to_thread
+from pydantic import ValidationError
+from sqlalchemy import and_, column, func, select, table
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from core.config import ANALYTICS_BACKEND
+from db.partitions import ensure_partitions_for
+from models.health_metric import HealthMetric
+from schemas.health import IngestError, IngestResponse, MetricIn
+from services.anomaly_store import advance_anomaly_detectors, invalidate_stored_anomalies
+from services.data_version import bump_data_versions
+from services.rollup import RollupKey, lock_rollup_days, record_metrics, refresh_rollup_days, utc_day
+from services.series_cache import apply_written_days
+from services.snapshots import invalidate_snapshots
+
+BATCH_SIZE = 5000  # rows per transaction
+MAX_REPORTED_ERRORS = 100
+
+OnConflict = Literal["update", "ignore"]
+_CONFLICT_COLS = ("user_id", "source", "metric_name", "ts")
+_STAGE_COLS = ("user_id", "source", "metric_name", "value", "unit", "ts", "metadata")
+_STAGE_DDL = """
+CREATE TEMP TABLE IF NOT EXISTS _ingest_stage (
+    user_id varchar(255), source varchar(255), metric_name varchar(255),
+    value double precision, unit varchar(64), ts timestamptz, metadata jsonb
+) ON COMMIT DELETE ROWS
+"""
+_stage = table(
+    "_ingest_stage",
+    column("user_id"),
+    column("source"),
+    column("metric_name"),
+    column("value"),
+    column("unit"),
+    column("ts"),
+    column("metadata"),
+)
+
+
+class MalformedBody(ValueError):
+    """Body is not a JSON array of objects or NDJSON."""
+
+
+async def iter_json_records(chunks: AsyncIterator[bytes]) -> AsyncIterator[Any]:
+    """
+    Yield decoded records from a JSON array or NDJSON byte stream without buffering
+    the whole body. Format is sniffed from the first non-whitespace character.
+    """
+    decoder = json.JSONDecoder()
+    text = codecs.getincrementaldecoder("utf-8")()
+    buf = ""
+    pos = 0
+    is_array: bool | None = None
+    closed = False
+    done = False
+
+    async def more() -> bool:
+        nonlocal buf, pos, done
+        if done:
+            return False
+        try:
+            chunk = await chunks.__anext__()
+        except StopAsyncIteration:
+            done = True
+            return False
+        try:
+            buf = buf[pos:] + text.decode(chunk)
+        except UnicodeDecodeError:
+            raise MalformedBody("Body is not valid UTF-8") from None
+        pos = 0
+        return True
+
+    while True:
+        # Skip whitespace and, inside an array, element separators.
+        while True:
+            while pos < len(buf) and (buf[pos].isspace() or (is_array and buf[pos] == ",")):
+                pos += 1
+            if pos < len(buf) or not await more():
+                break
+        if pos >= len(buf):
+            if is_array and not closed:
+                raise MalformedBody("JSON array is not terminated")
+            return
+        if is_array is None:
+            is_array = buf[pos] == "["
+            if is_array:
+                pos += 1
+                continue
+        if closed:
+            raise MalformedBody("Unexpected data after JSON array")
+        if is_array and buf[pos] == "]":
+            closed = True
+            pos += 1
+            continue
+        while True:
+            try:
+                record, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError as exc:
+                # Possibly a record split across chunks: read more and retry.
+                if await more():
+                    continue
+                raise MalformedBody(f"Invalid JSON: {exc.msg}") from None
+            break
+        pos = end
+        yield record
+
+
+def validate_record(index: int, record: Any) -> tuple[dict[str, Any] | None, IngestError | None]:
+    """Return (row for health_metric, None) or (None, error)."""
+    try:
+        m = MetricIn.model_validate(record)
+    except ValidationError as exc:
+        first = exc.errors()[0]
+        loc = ".".join(str(p) for p in first["loc"])
+        return None, IngestError(record=index, detail=f"{loc}: {first['msg']}" if loc else first["msg"])
+    row = m.model_dump()
+    row["metadata_"] = row.pop("metadata")
+    return row, None
+
+
+def _copy_to_stage(db: Session, rows: list[dict[str, Any]]) -> None:
+    """COPY rows into a per-connection temp table emptied at commit."""
+    buf = io.StringIO()
+    writer = csv.writer(buf, quoting=csv.QUOTE_NONNUMERIC)
+    for r in rows:
+        writer.writerow(
+            (
+                r["user_id"],
+                r["source"],
+                r["metric_name"],
+                r["value"],
+                r["unit"],
+                r["ts"].isoformat(),
+                None if r["metadata_"] is None else json.dumps(r["metadata_"]),
+            )
+        )
+    buf.seek(0)
+    cursor = db.connection().connection.cursor()
+    try:
+        cursor.execute(_STAGE_DDL)
+        cursor.copy_expert(
+            f"COPY _ingest_stage ({', '.join(_STAGE_COLS)}) FROM STDIN WITH (FORMAT csv, FORCE_NULL (metadata))",
+            buf,
+        )
+    finally:
+        cursor.close()
+
+
+def write_batch(
+    db: Session,
+    rows: list[dict[str, Any]],
+    on_conflict: OnConflict = "update",
+) -> tuple[int, int]:
+    """
+    Upsert one batch and maintain the daily rollup; commits. Returns (inserted, updated).
+    Duplicate keys within the batch keep the last occurrence.
+    """
+    deduped: dict[tuple, dict[str, Any]] = {}
+    for row in rows:
+        deduped[tuple(row[c] for c in _CONFLICT_COLS)] = row
+    values = list(deduped.values())
+    if not values:
+        return 0, 0
+
+    ensure_partitions_for(db.connection(), (r["ts"] for r in values))
+    lock_rollup_days(db, {(r["user_id"], r["metric_name"], utc_day(r["ts"])) for r in values})
+    _copy_to_stage(db, values)
+    table = HealthMetric.__table__
+    stmt = pg_insert(table).from_select(
+        list(_STAGE_COLS), select(*(_stage.c[c] for c in _STAGE_COLS))
+    )
+    if on_conflict == "ignore":
+        stmt = stmt.on_conflict_do_nothing(index_elements=list(_CONFLICT_COLS))
+    else:
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(_CONFLICT_COLS),
+            set_={
+                "value": stmt.excluded.value,
+                "unit": stmt.excluded.unit,
+                "metadata": stmt.excluded.metadata,
+            },
+        )
+    # xmax cannot be returned from a partitioned table, so keys that already existed are
+    # read in the same statement: every CTE sees the snapshot taken before the upsert.
+    # The day locks above make that snapshot complete: a concurrent batch writing the same
+    # key (a device retry) has committed or not started, so it is never counted twice.
+    key_match = [table.c[c] == _stage.c[c] for c in _CONFLICT_COLS]
+    existing = (
+        select(*(_stage.c[c] for c in _CONFLICT_COLS))
+        .join(table, and_(*key_match))
+        .where(
+            table.c.ts >= select(func.min(_stage.c.ts)).scalar_subquery(),
+            table.c.ts <= select(func.max(_stage.c.ts)).scalar_subquery(),
+        )
+        .cte("existing")
+    )
+    upserted = stmt.returning(*(table.c[c] for c in _CONFLICT_COLS), table.c.value).cte("upserted")
+    written = db.execute(
+        select(
+            upserted.c.user_id,
+            upserted.c.metric_name,
+            upserted.c.value,
+            upserted.c.ts,
+            existing.c.ts.is_(None).label("inserted"),
+        ).select_from(
+            upserted.outerjoin(existing, and_(*(upserted.c[c] == existing.c[c] for c in _CONFLICT_COLS)))
+        )
+    ).all()
+
+    inserted_rows = []
+    updated_keys: set[RollupKey] = set()
+    for r in written:
+        if r.inserted:
+            inserted_rows.append(r)
+        else:
+            updated_keys.add((r.user_id, r.metric_name, utc_day(r.ts)))
+    if updated_keys:
+        # Days with a replaced value are recomputed from raw rows instead.
+        inserted_rows = [
+            r for r in inserted_rows
+            if (r.user_id, r.metric_name, utc_day(r.ts)) not in updated_keys
+        ]
+        refresh_rollup_days(db, updated_keys)
+    inserted_keys = record_metrics(db, (r._mapping for r in inserted_rows))
+    touched = updated_keys | inserted_keys
+    invalidate_stored_anomalies(db, touched)
+    advance_anomaly_detectors(db, {(user_id, metric_name) for user_id, metric_name, _ in touched})
+    touched_users = {user_id for user_id, _, _ in touched}
+    invalidate_snapshots(db, touched_users)
+    bump_data_versions(db, touched_users)
+    db.commit()
+    apply_written_days(db, touched)
+    if ANALYTICS_BACKEND == "duckdb":
+        from services.duckdb_store import get_store
+
+        get_store().apply_rows(values, replace=on_conflict == "update")
+
+    updated = sum(1 for r in written if not r.inserted)
+    return len(written) - updated, updated
+
+
+async def ingest_stream(
+    db: Session,
+    chunks: AsyncIterator[bytes],
+    on_conflict: OnConflict = "update",
+) -> IngestResponse:
+    """
+    Validate records as they stream in and write them in BATCH_SIZE batches.
+    Batches already written stay committed if the body turns out malformed
+    (MalformedBody is raised); re-sending is safe because writes are idempotent.
+    """
+    started = time.perf_counter()
+    received = inserted = updated = rejected = 0
+    errors: list[IngestError] = []
+    batch: list[dict[str, Any]] = []
+
+    async def flush() -> None:
+        nonlocal inserted, updated
+        ins, upd = await to_thread.run_sync(write_batch, db, batch, on_conflict)
+        inserted += ins
+        updated += upd
+        batch.clear()
+
+    async for record in iter_json_records(chunks):
+        row, error = validate_record(received, record)
+        received += 1
+        if error is not None:
+            rejected += 1
+            if len(errors) < MAX_REPORTED_ERRORS:
+                errors.append(error)
+            continue
+        batch.append(row)
+        if len(batch) >= BATCH_SIZE:
+            await flush()
+    if batch:
+        await flush()
+
+    elapsed = time.perf_counter() - started
+    written = received - rejected
+    return IngestResponse(
+        received=received,
+        inserted=inserted,
+        updated=updated,
+        rejected=rejected,
+        errors=errors,
+        elapsed_ms=round(elapsed * 1000, 2),
+        rows_per_sec=round(written / elapsed, 1) if elapsed > 0 else 0.0,
+    )
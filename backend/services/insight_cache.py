@@ -0,0 +1,223 @@
+"""
+Content-addressed cache for generated insight text.
+Key = sha256 of the canonical JSON payload plus prompt version and model, so an
+identical structured payload never triggers a second LLM call. A bounded in-process
+LRU with TTL sits in front of a persistent tier: Insight rows of type
+CACHE_INSIGHT_TYPE, looked up by type + created_at (ix_insight_type_created) and
+signals->>'cache_key'.
+"""
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable
+from datetime import date, datetime, timedelta, timezone
+from typing import Any
+
+from anyio import to_thread
+from sqlalchemy import select
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from core.config import (
+    INSIGHT_CACHE_PERSIST_TTL_S,
+    INSIGHT_CACHE_SIZE,
+    INSIGHT_CACHE_TTL_S,
+    LLM_MODEL,
+)
+from core.llm import FALLBACK_INSIGHT, PROMPT_VERSION
+from core.metrics import register_collector, timed
+from db.session import AsyncSessionLocal, SessionLocal
+from models.insight import Insight
+from services.buckets import day_bounds
+
+CACHE_INSIGHT_TYPE = "summary_text"
+
+
+def insight_cache_key(payload: dict[str, Any]) -> str:
+    """Stable hash of the payload: sorted keys, no whitespace, prompt version and model included."""
+    canonical = json.dumps(
+        {"prompt_version": PROMPT_VERSION, "model": LLM_MODEL, "payload": payload},
+        sort_keys=True,
+        separators=(",", ":"),
+        ensure_ascii=False,
+        default=str,
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class InsightTextCache:
+    """Bounded LRU of key -> text with per-entry TTL, plus hit/miss counters."""
+
+    def __init__(self, max_entries: int = INSIGHT_CACHE_SIZE, ttl_s: float = INSIGHT_CACHE_TTL_S):
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self._entries: OrderedDict[str, tuple[float, str]] = OrderedDict()
+        self.memory_hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> str | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, text = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return text
+
+    def put(self, key: str, text: str) -> None:
+        if self.max_entries <= 0:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl_s, text)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> dict[str, Any]:
+        lookups = self.memory_hits + self.persistent_hits + self.misses
+        hits = self.memory_hits + self.persistent_hits
+        return {
+            "memory_hits": self.memory_hits,
+            "persistent_hits": self.persistent_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+_cache = InsightTextCache()
+
+
+def insight_cache_stats() -> dict[str, Any]:
+    return _cache.stats()
+
+
+def _collect_metrics():
+    yield "# TYPE insight_cache_lookups_total counter"
+    for result, value in (
+        ("memory_hit", _cache.memory_hits),
+        ("persistent_hit", _cache.persistent_hits),
+        ("miss", _cache.misses),
+    ):
+        yield f'insight_cache_lookups_total{{result="{result}"}} {value}'
+
+
+register_collector(_collect_metrics)
+
+
+def load_cached_text(db: Session, key: str) -> str | None:
+    """Newest persisted text for key within INSIGHT_CACHE_PERSIST_TTL_S, or None."""
+    since = datetime.now(timezone.utc) - timedelta(seconds=INSIGHT_CACHE_PERSIST_TTL_S)
+    stmt = (
+        select(Insight.summary)
+        .where(
+            Insight.type == CACHE_INSIGHT_TYPE,
+            Insight.created_at >= since,
+            Insight.signals["cache_key"].astext == key,
+        )
+        .order_by(Insight.created_at.desc())
+        .limit(1)
+    )
+    return db.scalar(stmt)
+
+
+def store_cached_text(
+    db: Session,
+    key: str,
+    payload: dict[str, Any],
+    text: str,
+    confidence: float,
+    start_date: date,
+    end_date: date,
+) -> None:
+    """Add one generated text as an Insight row. Does not commit."""
+    start_ts, end_ts = day_bounds(start_date, end_date)
+    db.add(
+        Insight(
+            type=CACHE_INSIGHT_TYPE,
+            title=f"Insight summary {start_date} to {end_date}",
+            summary=text,
+            confidence=confidence,
+            start_ts=start_ts,
+            end_ts=end_ts,
+            signals={"cache_key": key, "prompt_version": PROMPT_VERSION, "payload": payload},
+            created_at=datetime.now(timezone.utc),
+        )
+    )
+
+
+def _store_in_own_session(*args: Any) -> None:
+    with SessionLocal() as db:
+        store_cached_text(db, *args)
+        db.commit()
+
+
+async def _persist_cached_text(db: Session | AsyncSession, *args: Any) -> None:
+    """
+    Write a cache row through a short-lived session of the same kind as db, so the
+    caller's session is never committed. A failed write is ignored.
+    """
+    try:
+        if isinstance(db, AsyncSession):
+            async with AsyncSessionLocal() as own:
+                await own.run_sync(store_cached_text, *args)
+                await own.commit()
+        else:
+            await to_thread.run_sync(_store_in_own_session, *args)
+    except SQLAlchemyError:
+        pass
+
+
+async def _run_db(db: Session | AsyncSession, fn: Callable[..., Any], *args: Any) -> Any:
+    """Run a sync DB helper on an AsyncSession's connection, or on a Session in a worker thread."""
+    if isinstance(db, AsyncSession):
+        return await db.run_sync(fn, *args)
+    return await to_thread.run_sync(fn, db, *args)
+
+
+async def cached_insight_text(
+    db: Session | AsyncSession | None,
+    payload: dict[str, Any],
+    generate: Callable[[dict[str, Any]], Awaitable[str]],
+    confidence: float,
+    start_date: date,
+    end_date: date,
+) -> str:
+    """
+    Return text for payload from memory, then the Insight table, then generate().
+    Only real LLM output is cached; FALLBACK_INSIGHT is returned uncached so a
+    later call with an API key still reaches the model. db=None skips the persistent tier.
+    """
+    key = insight_cache_key(payload)
+    text = _cache.get(key)
+    if text is not None:
+        _cache.memory_hits += 1
+        return text
+
+    if db is not None:
+        text = await _run_db(db, load_cached_text, key)
+        if text is not None:
+            _cache.persistent_hits += 1
+            _cache.put(key, text)
+            return text
+
+    _cache.misses += 1
+    with timed("insight_summary", "llm"):
+        text = await generate(payload)
+    if text.strip() == FALLBACK_INSIGHT.strip():
+        return text
+    _cache.put(key, text)
+    if db is not None:
+        await _persist_cached_text(db, key, payload, text, confidence, start_date, end_date)
+    return text
@@ -1,21 +1,39 @@
 """
 AI insight synthesis from computed signals only. Deterministic fallback when no API key.
-No DB writes; no writes to Insight table.
+Generated text is cached by payload hash (services.insight_cache); the only DB writes
+are those cache rows in the Insight table.
 """
 from datetime import date
 
+from anyio import to_thread
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from core.llm import FALLBACK_INSIGHT, generate_insight_text
+from core.metrics import timed
+from schemas.analytics import WellnessScoreResponse
 from schemas.insight_summary import InsightSummaryResponse
-from services.anomalies import detect_anomalies
-from services.correlations import compute_correlations
-from services.wellness import compute_wellness_score
+from schemas.insights import AnomalyOut, CorrelationOut
+from services.anomalies import anomaly_query_window, detect_anomalies_from_buckets
+from services.buckets import DailyBuckets, fetch_daily_buckets, fetch_daily_buckets_async
+from services.correlations import compute_correlations_from_buckets, correlation_query_window
+from services.insight_cache import cached_insight_text
+from services.wellness import compute_wellness_from_buckets, wellness_query_window
 
 TOP_ANOMALIES = 3
 TOP_CORRELATIONS = 3
 
 
+def signals_query_window(start_date: date, end_date: date) -> tuple[date, date]:
+    """Widest inclusive day range needed by anomalies, correlations and wellness together."""
+    windows = [
+        anomaly_query_window(start_date, end_date),
+        correlation_query_window(start_date, end_date),
+        wellness_query_window(start_date, end_date),
+    ]
+    return min(w[0] for w in windows), max(w[1] for w in windows)
+
+
 def _deterministic_summary(
     wellness_score: int,
     trend: str,
@@ -38,20 +56,19 @@ def _deterministic_summary(
     return " ".join(parts)
 
 
-def generate_insight_summary(
-    db: Session,
+async def summarize_signals(
     start_date: date,
     end_date: date,
-    user_id: str | None = None,
+    anomalies: list[AnomalyOut],
+    correlations: list[CorrelationOut],
+    wellness: WellnessScoreResponse,
+    db: Session | AsyncSession | None = None,
 ) -> InsightSummaryResponse:
     """
-    Synthesize insight text from anomalies, correlations, and wellness score.
+    Synthesize insight text from already computed anomalies, correlations, and wellness score.
     Uses core.llm.generate_insight_text when API key is set; otherwise deterministic text.
+    Identical payloads are served from the insight text cache; db enables its persistent tier.
     """
-    anomalies = detect_anomalies(db, start_date, end_date, user_id=user_id)
-    correlations = compute_correlations(db, start_date, end_date, user_id=user_id)
-    wellness = compute_wellness_score(db, start_date, end_date, user_id=user_id)
-
     top_anomalies = sorted(anomalies, key=lambda a: a.score, reverse=True)[:TOP_ANOMALIES]
     top_correlations = correlations[:TOP_CORRELATIONS]
 
@@ -83,8 +100,21 @@ def generate_insight_summary(
         ],
     }
 
+    # Confidence: 0.0 if no signals; else average of max anomaly conf, max correlation conf, score/100
+    has_wellness = bool(wellness.components)
+    max_anom_conf = max((a.confidence for a in anomalies), default=0.0)
+    max_corr_conf = max((c.confidence for c in correlations), default=0.0)
+    wellness_norm = wellness.score / 100.0 if has_wellness else 0.0
+    if not anomalies and not correlations and not has_wellness:
+        confidence = 0.0
+    else:
+        confidence = (max_anom_conf + max_corr_conf + wellness_norm) / 3.0
+    confidence = round(min(1.0, max(0.0, confidence)), 4)
+
     try:
-        text = generate_insight_text(payload)
+        text = await cached_insight_text(
+            db, payload, generate_insight_text, confidence, start_date, end_date
+        )
         if text.strip() == FALLBACK_INSIGHT.strip():
             text = _deterministic_summary(
                 wellness.score,
@@ -102,17 +132,6 @@ def generate_insight_summary(
             len(correlations),
         )
 
-    # Confidence: 0.0 if no signals; else average of max anomaly conf, max correlation conf, score/100
-    has_wellness = bool(wellness.components)
-    max_anom_conf = max((a.confidence for a in anomalies), default=0.0)
-    max_corr_conf = max((c.confidence for c in correlations), default=0.0)
-    wellness_norm = wellness.score / 100.0 if has_wellness else 0.0
-    if not anomalies and not correlations and not has_wellness:
-        confidence = 0.0
-    else:
-        confidence = (max_anom_conf + max_corr_conf + wellness_norm) / 3.0
-    confidence = round(min(1.0, max(0.0, confidence)), 4)
-
     signals_used = {
         "wellness": {
             "score": wellness.score,
@@ -147,3 +166,49 @@ def generate_insight_summary(
         confidence=confidence,
         signals_used=signals_used,
     )
+
+
+def signals_from_buckets(
+    by_metric: DailyBuckets,
+    start_date: date,
+    end_date: date,
+) -> tuple[list[AnomalyOut], list[CorrelationOut], WellnessScoreResponse]:
+    """Anomalies, correlations and wellness from buckets covering signals_query_window."""
+    anomalies = detect_anomalies_from_buckets(by_metric, start_date, end_date)
+    correlations = compute_correlations_from_buckets(by_metric, start_date, end_date)
+    wellness = compute_wellness_from_buckets(by_metric, end_date)
+    return anomalies, correlations, wellness
+
+
+def compute_signals(
+    db: Session,
+    start_date: date,
+    end_date: date,
+    user_id: str | None = None,
+) -> tuple[list[AnomalyOut], list[CorrelationOut], WellnessScoreResponse]:
+    """Anomalies, correlations and wellness from one bucket fetch of signals_query_window."""
+    by_metric = fetch_daily_buckets(db, *signals_query_window(start_date, end_date), user_id)
+    return signals_from_buckets(by_metric, start_date, end_date)
+
+
+async def generate_insight_summary(
+    db: AsyncSession,
+    start_date: date,
+    end_date: date,
+    user_id: str | None = None,
+) -> InsightSummaryResponse:
+    """
+    Synthesize insight text from anomalies, correlations, and wellness score.
+    Buckets are fetched asynchronously, the math runs in a worker thread and the
+    LLM call is awaited, so no step holds a threadpool slot while waiting on I/O.
+    """
+    with timed("insight_summary", "fetch"):
+        by_metric = await fetch_daily_buckets_async(
+            db, *signals_query_window(start_date, end_date), user_id
+        )
+    with timed("insight_summary", "compute"):
+        anomalies, correlations, wellness = await to_thread.run_sync(
+            signals_from_buckets, by_metric, start_date, end_date
+        )
+    with timed("insight_summary", "summarize"):
+        return await summarize_signals(start_date, end_date, anomalies, correlations, wellness, db)
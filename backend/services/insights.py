@@ -1,11 +1,11 @@
 """
 Small usage example of core.llm for insight text generation.
-Builds a structured payload and calls generate_insight_text.
+Builds a structured payload and awaits generate_insight_text.
 """
 from core.llm import generate_insight_text
 
 
-def example_insight_from_structured_data(
+async def example_insight_from_structured_data(
     baseline_deviations: dict[str, float] | None = None,
     anomaly_summaries: list[str] | None = None,
     correlation_summaries: list[str] | None = None,
@@ -23,4 +23,4 @@ def example_insight_from_structured_data(
         payload["correlation_summaries"] = correlation_summaries
     if not payload:
         payload["note"] = "No structured data provided."
-    return generate_insight_text(payload)
+    return await generate_insight_text(payload)
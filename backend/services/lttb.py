@@ -0,0 +1,85 @@
+"""
+Largest-Triangle-Three-Buckets downsampling for series that arrive in x order.
+The x domain is split into equal-width buckets up front, so each point's bucket is
+known on arrival and only the current and next bucket are buffered. Memory depends
+on bucket width, not series length. The first and last points are always kept.
+From each bucket, the point kept is the one forming the largest triangle with the
+previously kept point and the next bucket's average.
+"""
+import math
+
+Point = tuple[float, float]
+
+
+def _mean(points: list[Point]) -> Point:
+    n = len(points)
+    return sum(p[0] for p in points) / n, sum(p[1] for p in points) / n
+
+
+class StreamingLTTB:
+    """One series; push() and finish() return the points selected so far, in x order."""
+
+    __slots__ = ("x_min", "n_buckets", "width", "_anchor", "_last", "_cur", "_nxt")
+
+    def __init__(self, x_min: float, x_max: float, max_points: int):
+        if max_points < 3:
+            raise ValueError("max_points must be at least 3")
+        self.x_min = x_min
+        self.n_buckets = max_points - 2
+        self.width = max(x_max - x_min, 1) / self.n_buckets
+        self._anchor: Point | None = None  # last selected point
+        self._last: Point | None = None
+        self._cur: tuple[int, list[Point]] | None = None
+        self._nxt: tuple[int, list[Point]] | None = None
+
+    @property
+    def frontier(self) -> float:
+        """Smallest x that may still be emitted; earlier output is final."""
+        return self._cur[1][0][0] if self._cur is not None else math.inf
+
+    def _select(self, bucket: list[Point], target: Point) -> Point:
+        ax, ay = self._anchor
+        cx, cy = target
+        best = max(bucket, key=lambda p: abs((ax - cx) * (p[1] - ay) - (ax - p[0]) * (cy - ay)))
+        self._anchor = best
+        return best
+
+    def push(self, x: float, y: float) -> list[Point]:
+        point = (x, y)
+        if self._last is None:
+            self._anchor = self._last = point
+            return [point]
+        self._last = point
+        b = min(int((x - self.x_min) / self.width), self.n_buckets - 1)
+        if self._cur is None:
+            self._cur = (b, [point])
+        elif b == self._cur[0]:
+            self._cur[1].append(point)
+        elif self._nxt is None:
+            self._nxt = (b, [point])
+        elif b == self._nxt[0]:
+            self._nxt[1].append(point)
+        else:
+            selected = self._select(self._cur[1], _mean(self._nxt[1]))
+            self._cur, self._nxt = self._nxt, (b, [point])
+            return [selected]
+        return []
+
+    def finish(self) -> list[Point]:
+        last = self._last
+        if last is None or self._cur is None:
+            return []  # empty or a single point, already emitted
+        (self._nxt or self._cur)[1].pop()  # the last point is kept as is
+        if self._nxt is not None and not self._nxt[1]:
+            self._nxt = None
+        if self._nxt is None and not self._cur[1]:
+            self._cur = None
+        out = []
+        if self._nxt is not None:
+            out.append(self._select(self._cur[1], _mean(self._nxt[1])))
+            out.append(self._select(self._nxt[1], last))
+        elif self._cur is not None:
+            out.append(self._select(self._cur[1], last))
+        out.append(last)
+        self._cur = self._nxt = None
+        return out
@@ -0,0 +1,190 @@
+"""
+Background precompute of wellness, correlations and anomalies for active users.
+Each user job does one bucket fetch covering the widest standard window and
+stores a snapshot per (kind, window) via services.snapshots, tagged with the data
+version read before the fetch. PrecomputeScheduler
+runs jobs in worker threads with its own concurrency limit, skips users whose
+job is still in flight, and keeps progress counters. It runs inside the API
+process (PRECOMPUTE_ENABLED) or standalone via worker.py.
+"""
+import logging
+import time
+from datetime import date, datetime, timedelta, timezone
+from typing import Any
+
+import anyio
+from anyio import to_thread
+from sqlalchemy import Select, func, select
+from sqlalchemy.orm import Session
+
+from core.config import PRECOMPUTE_ACTIVE_DAYS, PRECOMPUTE_CONCURRENCY, PRECOMPUTE_INTERVAL_S
+from db.session import SessionLocal
+from models.health_metric_daily import HealthMetricDaily
+from services.anomalies import detect_anomalies_from_buckets
+from services.buckets import fetch_daily_buckets
+from services.correlations import compute_correlations_from_buckets
+from services.data_version import data_version
+from services.insight_summary import signals_query_window
+from services.snapshots import STANDARD_WINDOWS, save_snapshot
+from services.wellness import compute_wellness_from_buckets
+
+logger = logging.getLogger(__name__)
+
+
+def active_users_select(end_date: date, active_days: int = PRECOMPUTE_ACTIVE_DAYS) -> Select:
+    since = end_date - timedelta(days=active_days - 1)
+    return (
+        select(HealthMetricDaily.user_id)
+        .where(HealthMetricDaily.day >= since, HealthMetricDaily.day <= end_date)
+        .group_by(HealthMetricDaily.user_id)
+        .order_by(func.max(HealthMetricDaily.day).desc())
+    )
+
+
+def active_users(db: Session, end_date: date, active_days: int = PRECOMPUTE_ACTIVE_DAYS) -> list[str]:
+    """Users with rollup data in the active_days ending at end_date."""
+    return list(db.scalars(active_users_select(end_date, active_days)))
+
+
+def precompute_user(db: Session, user_id: str, end_date: date) -> None:
+    """Compute and store every kind for each standard window ending at end_date; commits."""
+    widest_start = end_date - timedelta(days=max(STANDARD_WINDOWS) - 1)
+    # Read before the buckets: a write landing in between leaves the snapshots unservable.
+    version = data_version(db, user_id)
+    started = time.perf_counter()
+    by_metric = fetch_daily_buckets(db, *signals_query_window(widest_start, end_date), user_id)
+    fetch_ms = (time.perf_counter() - started) * 1000
+
+    # Wellness only depends on end_date; compute once and store it under every window.
+    started = time.perf_counter()
+    wellness = compute_wellness_from_buckets(by_metric, end_date).model_dump()
+    wellness_ms = fetch_ms + (time.perf_counter() - started) * 1000
+    for days in STANDARD_WINDOWS:
+        start_date = end_date - timedelta(days=days - 1)
+        save_snapshot(db, user_id, "wellness", start_date, end_date, wellness, wellness_ms, version)
+
+        started = time.perf_counter()
+        correlations = compute_correlations_from_buckets(by_metric, start_date, end_date)
+        elapsed_ms = fetch_ms + (time.perf_counter() - started) * 1000
+        save_snapshot(
+            db, user_id, "correlations", start_date, end_date,
+            [c.model_dump() for c in correlations], elapsed_ms, version,
+        )
+
+        started = time.perf_counter()
+        anomalies = detect_anomalies_from_buckets(by_metric, start_date, end_date)
+        elapsed_ms = fetch_ms + (time.perf_counter() - started) * 1000
+        save_snapshot(
+            db, user_id, "anomalies", start_date, end_date,
+            [a.model_dump() for a in anomalies], elapsed_ms, version,
+        )
+    db.commit()
+
+
+def _run_job(user_id: str, end_date: date) -> None:
+    db = SessionLocal()
+    try:
+        precompute_user(db, user_id, end_date)
+    finally:
+        db.close()
+
+
+def _list_active_users(end_date: date) -> list[str]:
+    db = SessionLocal()
+    try:
+        return active_users(db, end_date)
+    finally:
+        db.close()
+
+
+class PrecomputeScheduler:
+    """Periodic per-user precompute with a concurrency limit and in-flight deduplication."""
+
+    def __init__(
+        self,
+        interval_s: float = PRECOMPUTE_INTERVAL_S,
+        concurrency: int = PRECOMPUTE_CONCURRENCY,
+    ):
+        self.interval_s = interval_s
+        self.concurrency = concurrency
+        self._limiter: anyio.CapacityLimiter | None = None
+        self._in_flight: set[str] = set()
+        self.runs_started = 0
+        self.runs_finished = 0
+        self.last_run_users = 0  # users queued by the latest run
+        self.jobs_ok = 0
+        self.jobs_failed = 0
+        self.jobs_skipped = 0  # already in flight from an earlier run
+        self.job_ms_total = 0.0
+        self.job_ms_max = 0.0
+        self.last_run_started_at: datetime | None = None
+        self.last_run_duration_s: float | None = None
+
+    def stats(self) -> dict[str, Any]:
+        jobs = self.jobs_ok + self.jobs_failed
+        return {
+            "interval_s": self.interval_s,
+            "concurrency": self.concurrency,
+            "runs_started": self.runs_started,
+            "runs_finished": self.runs_finished,
+            "last_run_users": self.last_run_users,
+            "in_flight": len(self._in_flight),
+            "jobs_ok": self.jobs_ok,
+            "jobs_failed": self.jobs_failed,
+            "jobs_skipped": self.jobs_skipped,
+            "job_ms_avg": round(self.job_ms_total / jobs, 2) if jobs else 0.0,
+            "job_ms_max": round(self.job_ms_max, 2),
+            "last_run_started_at": self.last_run_started_at,
+            "last_run_duration_s": self.last_run_duration_s,
+        }
+
+    async def _job(self, user_id: str, end_date: date) -> None:
+        started = time.perf_counter()
+        try:
+            await to_thread.run_sync(_run_job, user_id, end_date, limiter=self._limiter)
+            self.jobs_ok += 1
+        except Exception:
+            self.jobs_failed += 1
+            logger.exception("precompute failed for user %s", user_id)
+        finally:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            self.job_ms_total += elapsed_ms
+            self.job_ms_max = max(self.job_ms_max, elapsed_ms)
+            self._in_flight.discard(user_id)
+
+    async def run_once(self, end_date: date | None = None) -> None:
+        """Precompute every active user for windows ending at end_date (default: today UTC)."""
+        if self._limiter is None:
+            self._limiter = anyio.CapacityLimiter(self.concurrency)
+        end_date = end_date or datetime.now(timezone.utc).date()
+        self.runs_started += 1
+        self.last_run_started_at = datetime.now(timezone.utc)
+        started = time.perf_counter()
+        user_ids = await to_thread.run_sync(_list_active_users, end_date, limiter=self._limiter)
+        queued = skipped = 0
+        async with anyio.create_task_group() as tg:
+            for user_id in user_ids:
+                if user_id in self._in_flight:
+                    skipped += 1
+                    continue
+                self._in_flight.add(user_id)
+                queued += 1
+                tg.start_soon(self._job, user_id, end_date)
+            self.last_run_users = queued
+            self.jobs_skipped += skipped
+        self.runs_finished += 1
+        self.last_run_duration_s = round(time.perf_counter() - started, 3)
+        logger.info(
+            "precompute run: %d user(s), %d skipped as in flight, %.1f s",
+            queued, skipped, self.last_run_duration_s,
+        )
+
+    async def run_forever(self, end_date: date | None = None) -> None:
+        """Start a run every interval_s; a slow run overlaps the next, which skips its in-flight users."""
+        async with anyio.create_task_group() as tg:
+            while True:
+                tg.start_soon(self.run_once, end_date)
+                await anyio.sleep(self.interval_s)
+
+
+scheduler = PrecomputeScheduler()
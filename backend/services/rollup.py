@@ -0,0 +1,209 @@
+"""
+Incrementally maintained daily rollup (health_metric_daily) of HealthMetric.
+Writers call record_metrics in the same transaction as their inserts, holding
+lock_rollup_days on the days they write so concurrent upserts of one key are ordered;
+rebuild_rollup recomputes a day range from raw rows, and backfill_empty_rollup fills
+a rollup that is empty while health_metric has rows (databases from before the rollup).
+Days are UTC calendar days, whatever the session time zone.
+"""
+from collections.abc import Iterable, Mapping
+from datetime import date, datetime, timezone
+from typing import Any
+
+from sqlalchemy import Date, String, bindparam, cast, delete, func, select
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from models.health_metric import HealthMetric
+from models.health_metric_daily import HealthMetricDaily
+from services.buckets import day_bounds
+from services.data_version import bump_data_versions
+
+RollupKey = tuple[str, str, date]  # user_id, metric_name, day
+
+
+def utc_day(ts: datetime) -> date:
+    """UTC calendar day of a timestamp; naive timestamps are taken as UTC."""
+    if ts.tzinfo is None:
+        return ts.date()
+    return ts.astimezone(timezone.utc).date()
+
+
+def _utc_day_expr():
+    return cast(func.timezone("UTC", HealthMetric.ts), Date)
+
+
+def lock_rollup_days(db: Session, keys: Iterable[RollupKey]) -> None:
+    """
+    Take pg_advisory_xact_lock on each (user_id, metric_name, day), held until the
+    transaction ends, in hash order so overlapping sets cannot deadlock. A writer that
+    holds the days of its rows before upserting them sees every committed row of those
+    days, so its inserted/updated split (and the rollup delta) cannot go stale.
+    """
+    ordered = sorted(set(keys))
+    if not ordered:
+        return
+    triples = func.unnest(
+        bindparam("lock_user_ids", [u for u, _, _ in ordered], type_=ARRAY(String)),
+        bindparam("lock_series_days", [f"{m}|{d.isoformat()}" for _, m, d in ordered], type_=ARRAY(String)),
+    ).table_valued("user_id", "series_day").render_derived("triples")
+    # ORDER BY keeps the subquery from being flattened, so locks follow the sort order
+    ids = (
+        select(
+            func.hashtext(triples.c.user_id).label("k1"),
+            func.hashtext(triples.c.series_day).label("k2"),
+        )
+        .distinct()
+        .order_by("k1", "k2")
+        .subquery("ids")
+    )
+    db.execute(select(func.count(func.pg_advisory_xact_lock(ids.c.k1, ids.c.k2))).select_from(ids))
+
+
+def record_metrics(db: Session, rows: Iterable[Mapping[str, Any]]) -> set[RollupKey]:
+    """
+    Add newly inserted rows (user_id, metric_name, value, ts) to the rollup.
+    Only for rows that did not replace an existing value; use refresh_rollup_days otherwise.
+    Does not commit. Returns the touched keys.
+    """
+    acc: dict[RollupKey, list[float]] = {}
+    for row in rows:
+        key = (row["user_id"], row["metric_name"], utc_day(row["ts"]))
+        value = float(row["value"])
+        cur = acc.get(key)
+        if cur is None:
+            acc[key] = [value, 1, value, value]
+        else:
+            cur[0] += value
+            cur[1] += 1
+            cur[2] = min(cur[2], value)
+            cur[3] = max(cur[3], value)
+    values = [
+        {
+            "user_id": user_id,
+            "metric_name": metric_name,
+            "day": day,
+            "value_sum": s,
+            "value_count": n,
+            "value_min": lo,
+            "value_max": hi,
+        }
+        for (user_id, metric_name, day), (s, n, lo, hi) in acc.items()
+    ]
+    t = HealthMetricDaily.__table__.c
+    stmt = pg_insert(HealthMetricDaily)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[t.user_id, t.metric_name, t.day],
+        set_={
+            "value_sum": t.value_sum + stmt.excluded.value_sum,
+            "value_count": t.value_count + stmt.excluded.value_count,
+            "value_min": func.least(t.value_min, stmt.excluded.value_min),
+            "value_max": func.greatest(t.value_max, stmt.excluded.value_max),
+        },
+    )
+    if values:
+        db.execute(stmt, values)  # executemany, batched into multi-row VALUES
+    return set(acc)
+
+
+def _aggregate_select(day_col):
+    return select(
+        HealthMetric.user_id,
+        HealthMetric.metric_name,
+        day_col,
+        func.sum(HealthMetric.value),
+        func.count(),
+        func.min(HealthMetric.value),
+        func.max(HealthMetric.value),
+    ).group_by(HealthMetric.user_id, HealthMetric.metric_name, day_col)
+
+
+def _insert_from_select(db: Session, agg) -> None:
+    db.execute(
+        pg_insert(HealthMetricDaily).from_select(
+            [
+                "user_id",
+                "metric_name",
+                "day",
+                "value_sum",
+                "value_count",
+                "value_min",
+                "value_max",
+            ],
+            agg,
+        )
+    )
+
+
+def rebuild_rollup(
+    db: Session,
+    start_date: date | None = None,
+    end_date: date | None = None,
+    user_id: str | None = None,
+) -> None:
+    """
+    Recompute rollup rows for the inclusive day range (unbounded when None) from raw rows
+    and bump the data version of every user in it. Does not commit.
+    """
+    day_col = _utc_day_expr()
+    scope = []
+    agg = _aggregate_select(day_col)
+    if start_date is not None:
+        scope.append(HealthMetricDaily.day >= start_date)
+        agg = agg.where(HealthMetric.ts >= day_bounds(start_date, start_date)[0])
+    if end_date is not None:
+        scope.append(HealthMetricDaily.day <= end_date)
+        agg = agg.where(HealthMetric.ts < day_bounds(end_date, end_date)[1])
+    if user_id is not None:
+        scope.append(HealthMetricDaily.user_id == user_id)
+        agg = agg.where(HealthMetric.user_id == user_id)
+    users_in_scope = select(HealthMetricDaily.user_id).where(*scope).distinct()
+    users = set(db.scalars(users_in_scope))
+    db.execute(delete(HealthMetricDaily).where(*scope))
+    _insert_from_select(db, agg)
+    users.update(db.scalars(users_in_scope))
+    bump_data_versions(db, users)
+
+
+def backfill_empty_rollup(db: Session) -> bool:
+    """
+    Rebuild the whole rollup when it has no rows but health_metric does; commits.
+    Returns whether it ran. A no-op once the rollup has any row.
+    """
+    if db.scalar(select(HealthMetricDaily.day).limit(1)) is not None:
+        return False
+    if db.scalar(select(HealthMetric.id).limit(1)) is None:
+        return False
+    rebuild_rollup(db)
+    db.commit()
+    return True
+
+
+def refresh_rollup_days(db: Session, keys: Iterable[RollupKey]) -> None:
+    """
+    Recompute exactly the given (user_id, metric_name, day) rollup rows from raw rows,
+    e.g. after an upsert replaced existing values. Does not commit.
+    """
+    by_user_metric: dict[tuple[str, str], set[date]] = {}
+    for user_id, metric_name, day in keys:
+        by_user_metric.setdefault((user_id, metric_name), set()).add(day)
+
+    day_col = _utc_day_expr()
+    for (user_id, metric_name), days in by_user_metric.items():
+        db.execute(
+            delete(HealthMetricDaily).where(
+                HealthMetricDaily.user_id == user_id,
+                HealthMetricDaily.metric_name == metric_name,
+                HealthMetricDaily.day.in_(days),
+            )
+        )
+        start_dt, end_dt = day_bounds(min(days), max(days))
+        agg = _aggregate_select(day_col).where(
+            HealthMetric.user_id == user_id,
+            HealthMetric.metric_name == metric_name,
+            HealthMetric.ts >= start_dt,
+            HealthMetric.ts < end_dt,
+            day_col.in_(days),
+        )
+        _insert_from_select(db, agg)
@@ -0,0 +1,337 @@
+"""
+In-process cache of each user's daily series, in front of the rollup.
+A user's entry holds, per metric, every daily average as one float64 array indexed by
+day ordinal (NaN where the day has no data): 8 bytes a day instead of a date/float
+dict entry. fetch_daily_buckets serves user-scoped ranges by slicing it, so timeline
+and the analytics services share one load per user. Entries are evicted least
+recently used once their total size passes SERIES_CACHE_BYTES.
+
+Each entry remembers the user's data version (services.data_version) it reflects.
+A lookup reads the current version first and reloads on a mismatch, so writes from
+any process, bulk loads and rollup rebuilds are never served stale. Ingest patches
+the exact days it wrote into cached entries after its commit (apply_written_days),
+which keeps them current without a reload.
+"""
+import sys
+import threading
+from collections import OrderedDict, defaultdict
+from collections.abc import Iterable
+from datetime import date
+from typing import Any
+
+import numpy as np
+from sqlalchemy import Date, Float, Select, String, and_, bindparam, func, select, type_coerce
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from core.config import SERIES_CACHE_BYTES
+from core.metrics import query_rows, register_collector
+from models.health_metric_daily import HealthMetricDaily
+from models.user_data_version import UserDataVersion
+from services.buckets import DailyBuckets
+from services.data_version import data_version, data_version_async
+from services.rollup import RollupKey
+
+_ENTRY_OVERHEAD = 256  # UserSeries object, its metrics dict and the LRU slot, roughly
+
+
+class MetricSeries:
+    """Daily averages of one metric: values[i] is day ordinal first + i, NaN when missing."""
+
+    __slots__ = ("first", "values")
+
+    def __init__(self, first: int, values: np.ndarray):
+        self.first = first
+        self.values = values
+
+    @classmethod
+    def from_days(cls, ordinals: list[int], values: list[float]) -> "MetricSeries":
+        first = min(ordinals)
+        out = np.full(max(ordinals) - first + 1, np.nan)
+        out[np.array(ordinals) - first] = values
+        return cls(first, out)
+
+    @property
+    def nbytes(self) -> int:
+        return sys.getsizeof(self.values)
+
+    def with_days(self, days: dict[int, float]) -> "MetricSeries":
+        """Copy with the given days set, grown at either end as needed (new days are NaN)."""
+        first = min(self.first, min(days))
+        last = max(self.first + len(self.values) - 1, max(days))
+        out = np.full(last - first + 1, np.nan)
+        offset = self.first - first
+        out[offset : offset + len(self.values)] = self.values
+        for ordinal, value in days.items():
+            out[ordinal - first] = value
+        return MetricSeries(first, out)
+
+    def window(self, start: int, end: int) -> dict[date, float]:
+        """{day -> value} for days with data in the inclusive ordinal range."""
+        lo = max(start - self.first, 0)
+        hi = min(end - self.first + 1, len(self.values))
+        if lo >= hi:
+            return {}
+        segment = self.values[lo:hi]
+        present = np.flatnonzero(~np.isnan(segment))
+        days = (present + (self.first + lo)).tolist()
+        return dict(zip(map(date.fromordinal, days), segment[present].tolist()))
+
+
+class UserSeries:
+    """All of one user's metric series as of data version `version`."""
+
+    __slots__ = ("version", "metrics", "nbytes")
+
+    def __init__(self, version: int, metrics: dict[str, MetricSeries]):
+        self.version = version
+        self.metrics = metrics
+        self.nbytes = _ENTRY_OVERHEAD + sum(s.nbytes + sys.getsizeof(m) for m, s in metrics.items())
+
+    @classmethod
+    def from_rows(cls, version: int, rows: Iterable[Any]) -> "UserSeries":
+        """Build from (metric_name, day, avg_value) rows in any order."""
+        by_metric: dict[str, tuple[list[int], list[float]]] = defaultdict(lambda: ([], []))
+        for metric_name, day, value in rows:
+            ordinals, values = by_metric[metric_name]
+            ordinals.append(day.toordinal())
+            values.append(float(value))
+        return cls(version, {m: MetricSeries.from_days(*by_metric[m]) for m in sorted(by_metric)})
+
+    def with_days(self, version: int, days: dict[str, dict[int, float]]) -> "UserSeries":
+        """Copy at `version` with the given metric -> {ordinal -> value} days set."""
+        metrics = dict(self.metrics)
+        for metric_name, values in days.items():
+            series = metrics.get(metric_name)
+            metrics[metric_name] = (
+                series.with_days(values)
+                if series is not None
+                else MetricSeries.from_days(list(values), list(values.values()))
+            )
+        return UserSeries(version, metrics)
+
+    def buckets(self, start_date: date, end_date: date) -> DailyBuckets:
+        """metric_name -> {date -> avg_value} for the inclusive range, as fetch_rollup_buckets."""
+        start, end = start_date.toordinal(), end_date.toordinal()
+        out: DailyBuckets = {}
+        for metric_name, series in self.metrics.items():
+            window = series.window(start, end)
+            if window:
+                out[metric_name] = window
+        return out
+
+
+class SeriesCache:
+    """
+    Byte-budgeted LRU of user_id -> UserSeries, plus counters. Entries are never
+    mutated: patches swap in a copy, so readers slice a consistent entry without the lock.
+    """
+
+    def __init__(self, max_bytes: int = SERIES_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[str, UserSeries] = OrderedDict()
+        self._lock = threading.Lock()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.patches = 0
+        self.evictions = 0
+
+    def _remove(self, user_id: str) -> UserSeries | None:
+        entry = self._entries.pop(user_id, None)
+        if entry is not None:
+            self.nbytes -= entry.nbytes
+        return entry
+
+    def _insert(self, user_id: str, entry: UserSeries) -> None:
+        self._remove(user_id)
+        self._entries[user_id] = entry
+        self.nbytes += entry.nbytes
+        while self.nbytes > self.max_bytes and self._entries:
+            _, evicted = self._entries.popitem(last=False)
+            self.nbytes -= evicted.nbytes
+            self.evictions += 1
+
+    def get(self, user_id: str, version: int) -> UserSeries | None:
+        """The entry if it reflects `version`; an entry at any other version is dropped."""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry.version != version:
+                self._remove(user_id)
+                self.stale += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return entry
+
+    def put(self, user_id: str, entry: UserSeries) -> None:
+        """Cache entry unless it is over budget on its own or older than the cached one."""
+        if entry.nbytes > self.max_bytes:
+            return
+        with self._lock:
+            current = self._entries.get(user_id)
+            if current is not None and current.version > entry.version:
+                return
+            self._insert(user_id, entry)
+
+    def patch(self, user_id: str, version: int, days: dict[str, dict[int, float]]) -> None:
+        """
+        Apply one commit's days to the entry, which moves it to `version`. Only an entry at
+        version - 1 can take them; one further behind missed another writer and is dropped.
+        """
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry.version >= version:
+                return
+            if entry.version != version - 1:
+                self._remove(user_id)
+                return
+            self.patches += 1
+            self._insert(user_id, entry.with_days(version, days))
+
+    def cached(self, user_ids: Iterable[str]) -> set[str]:
+        with self._lock:
+            return {u for u in user_ids if u in self._entries}
+
+    def invalidate(self, user_ids: Iterable[str]) -> None:
+        with self._lock:
+            for user_id in user_ids:
+                self._remove(user_id)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+    def stats(self) -> dict[str, Any]:
+        lookups = self.hits + self.misses + self.stale
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale": self.stale,
+            "patches": self.patches,
+            "evictions": self.evictions,
+            "users": len(self._entries),
+            "bytes": self.nbytes,
+            "max_bytes": self.max_bytes,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+series_cache = SeriesCache()
+
+
+def _collect_metrics():
+    yield "# TYPE series_cache_lookups_total counter"
+    for result, value in (
+        ("hit", series_cache.hits),
+        ("miss", series_cache.misses),
+        ("stale", series_cache.stale),
+    ):
+        yield f'series_cache_lookups_total{{result="{result}"}} {value}'
+    yield "# TYPE series_cache_evictions_total counter"
+    yield f"series_cache_evictions_total {series_cache.evictions}"
+    yield "# TYPE series_cache_bytes gauge"
+    yield f"series_cache_bytes {series_cache.nbytes}"
+
+
+register_collector(_collect_metrics)
+
+
+def _user_series_select(user_id: str) -> Select:
+    """Every (metric_name, day, avg_value) of one user; index-only on ix_health_metric_daily_user_day_incl."""
+    rollup = HealthMetricDaily
+    return select(
+        rollup.metric_name,
+        rollup.day,
+        (rollup.value_sum / type_coerce(rollup.value_count, Float)).label("avg_value"),
+    ).where(rollup.user_id == user_id)
+
+
+def cached_daily_buckets(db: Session, start_date: date, end_date: date, user_id: str) -> DailyBuckets:
+    """fetch_rollup_buckets for one user, sliced from the cache; a miss loads the user's whole history."""
+    version = data_version(db, user_id)
+    entry = series_cache.get(user_id, version)
+    if entry is None:
+        rows = db.execute(_user_series_select(user_id)).all()
+        query_rows.observe(len(rows), "user_series")
+        entry = UserSeries.from_rows(version, rows)
+        series_cache.put(user_id, entry)
+    return entry.buckets(start_date, end_date)
+
+
+async def cached_daily_buckets_async(
+    db: AsyncSession, start_date: date, end_date: date, user_id: str
+) -> DailyBuckets:
+    """cached_daily_buckets on an AsyncSession."""
+    version = await data_version_async(db, user_id)
+    entry = series_cache.get(user_id, version)
+    if entry is None:
+        rows = (await db.execute(_user_series_select(user_id))).all()
+        query_rows.observe(len(rows), "user_series")
+        entry = UserSeries.from_rows(version, rows)
+        series_cache.put(user_id, entry)
+    return entry.buckets(start_date, end_date)
+
+
+def _written_days_select(keys: list[RollupKey]) -> Select:
+    """(user_id, metric_name, day, avg_value) of the given rollup keys; one primary-key probe each."""
+    written = func.unnest(
+        bindparam("user_ids", [u for u, _, _ in keys], type_=ARRAY(String)),
+        bindparam("metric_names", [m for _, m, _ in keys], type_=ARRAY(String)),
+        bindparam("days", [d for _, _, d in keys], type_=ARRAY(Date)),
+    ).table_valued("user_id", "metric_name", "day").render_derived("written")
+    rollup = HealthMetricDaily
+    return select(
+        rollup.user_id,
+        rollup.metric_name,
+        rollup.day,
+        (rollup.value_sum / type_coerce(rollup.value_count, Float)).label("avg_value"),
+    ).join(
+        written,
+        and_(
+            rollup.user_id == written.c.user_id,
+            rollup.metric_name == written.c.metric_name,
+            rollup.day == written.c.day,
+        ),
+    )
+
+
+def apply_written_days(db: Session, keys: Iterable[RollupKey]) -> None:
+    """
+    After a commit that wrote the given rollup days, patch them into cached users' entries
+    with two queries for the whole batch: versions first, then the days' averages. Read in
+    that order, a concurrent writer can only make the data newer than the version, which
+    the next lookup catches. On a database error the users' entries are dropped instead.
+    """
+    keys = list(keys)
+    users = series_cache.cached({user_id for user_id, _, _ in keys})
+    if not users:
+        return
+    keys = [k for k in keys if k[0] in users]
+    try:
+        versions = dict(
+            db.execute(
+                select(UserDataVersion.user_id, UserDataVersion.version).where(
+                    UserDataVersion.user_id.in_(users)
+                )
+            ).all()
+        )
+        rows = db.execute(_written_days_select(keys)).all()
+    except SQLAlchemyError:
+        db.rollback()
+        series_cache.invalidate(users)
+        return
+    days: dict[str, dict[str, dict[int, float]]] = {u: defaultdict(dict) for u in users}
+    for user_id, metric_name, day in keys:  # a key without a row has no data left
+        days[user_id][metric_name][day.toordinal()] = np.nan
+    for r in rows:
+        days[r.user_id][r.metric_name][r.day.toordinal()] = float(r.avg_value)
+    for user_id in users:
+        series_cache.patch(user_id, versions.get(user_id, 0), days[user_id])
@@ -0,0 +1,98 @@
+"""
+Storage for precomputed analytics responses (analytics_snapshot).
+One row per (user, kind, standard window), replaced by each precompute run and
+dropped when the user's data changes. Each row records the user's data version read
+before its buckets were fetched. Routers serve a row only if it matches the requested
+range exactly, is younger than the freshness bound and its version is still current,
+so a snapshot computed from data that changed meanwhile is never served.
+"""
+from collections.abc import Iterable
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Literal
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from core.config import PRECOMPUTE_MAX_AGE_S
+from models.analytics_snapshot import AnalyticsSnapshot
+from models.user_data_version import UserDataVersion
+
+SnapshotKind = Literal["wellness", "correlations", "anomalies"]
+STANDARD_WINDOWS = (7, 30, 90)  # days, ending at the run's end date
+
+
+def standard_window_days(start_date: date, end_date: date) -> int | None:
+    """Window length if [start_date, end_date] is a standard window, else None."""
+    days = (end_date - start_date).days + 1
+    return days if days in STANDARD_WINDOWS else None
+
+
+def save_snapshot(
+    db: Session,
+    user_id: str,
+    kind: SnapshotKind,
+    start_date: date,
+    end_date: date,
+    payload: Any,
+    elapsed_ms: float,
+    data_version: int,
+) -> None:
+    """Upsert one snapshot row computed from the user's data at data_version. Does not commit."""
+    values = {
+        "user_id": user_id,
+        "kind": kind,
+        "window_days": (end_date - start_date).days + 1,
+        "start_date": start_date,
+        "end_date": end_date,
+        "payload": payload,
+        "computed_at": datetime.now(timezone.utc),
+        "elapsed_ms": elapsed_ms,
+        "data_version": data_version,
+    }
+    stmt = pg_insert(AnalyticsSnapshot).values(**values)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[AnalyticsSnapshot.user_id, AnalyticsSnapshot.kind, AnalyticsSnapshot.window_days],
+        set_={
+            k: stmt.excluded[k]
+            for k in ("start_date", "end_date", "payload", "computed_at", "elapsed_ms", "data_version")
+        },
+    )
+    db.execute(stmt)
+
+
+def load_snapshot(
+    db: Session,
+    kind: SnapshotKind,
+    user_id: str | None,
+    start_date: date,
+    end_date: date,
+    max_age_s: float = PRECOMPUTE_MAX_AGE_S,
+) -> Any | None:
+    """Stored payload for exactly this user and range if fresh enough and current, else None."""
+    window_days = standard_window_days(start_date, end_date)
+    if user_id is None or window_days is None:
+        return None
+    since = datetime.now(timezone.utc) - timedelta(seconds=max_age_s)
+    current = (
+        select(func.coalesce(func.max(UserDataVersion.version), 0))
+        .where(UserDataVersion.user_id == user_id)
+        .scalar_subquery()
+    )
+    return db.scalar(
+        select(AnalyticsSnapshot.payload).where(
+            AnalyticsSnapshot.user_id == user_id,
+            AnalyticsSnapshot.kind == kind,
+            AnalyticsSnapshot.window_days == window_days,
+            AnalyticsSnapshot.end_date == end_date,
+            AnalyticsSnapshot.computed_at >= since,
+            AnalyticsSnapshot.data_version == current,
+        )
+    )
+
+
+def invalidate_snapshots(db: Session, user_ids: Iterable[str]) -> None:
+    """Drop snapshots of users whose data changed. Does not commit."""
+    user_ids = set(user_ids)
+    if user_ids:
+        db.execute(delete(AnalyticsSnapshot).where(AnalyticsSnapshot.user_id.in_(user_ids)))
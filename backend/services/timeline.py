@@ -1,57 +1,271 @@
+import json
+import math
 from collections import defaultdict
-from datetime import date, datetime, timedelta, time, timezone
+from collections.abc import AsyncIterator, Iterable, Sequence
+from datetime import date, datetime, timedelta
 
-from sqlalchemy import func, select
+from anyio import to_thread
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from models.health_metric import HealthMetric
+from core.config import ANALYTICS_BACKEND
+from core.metrics import query_rows, timed
 from schemas.health import TimelinePoint, TimelineResponse
+from services.buckets import (
+    MAX_HOUR_RANGE_DAYS,
+    DailyBuckets,
+    PeriodRow,
+    Resolution,
+    auto_resolution,
+    fetch_daily_buckets,
+    fetch_daily_buckets_async,
+    fetch_period_rows,
+    fetch_period_rows_async,
+    period_avg_select,
+)
+from services.lttb import StreamingLTTB
 
+STREAM_BATCH_ROWS = 2000  # rows per server-side cursor fetch when streaming
 
-def get_timeline(
-    db: Session,
+TimelineRow = tuple[int, dict[str, float]]  # slot, metrics
+
+
+def resolve_resolution(start_date: date, end_date: date, requested: Resolution | str) -> Resolution:
+    """Map "auto" to a resolution by range length; ValueError for hour ranges over MAX_HOUR_RANGE_DAYS."""
+    resolution = auto_resolution(start_date, end_date) if requested == "auto" else requested
+    if resolution == "hour" and (end_date - start_date).days + 1 > MAX_HOUR_RANGE_DAYS:
+        raise ValueError(f"resolution=hour supports at most {MAX_HOUR_RANGE_DAYS} days.")
+    return resolution
+
+
+def _slot(period: date | datetime, resolution: Resolution) -> int:
+    """Integer x of a period: day ordinal, or hours since day 1 for hour buckets."""
+    if resolution == "hour":
+        return period.toordinal() * 24 + period.hour
+    return period.toordinal()
+
+
+def _slot_ts(x: int, resolution: Resolution) -> str:
+    if resolution == "hour":
+        return f"{date.fromordinal(x // 24)}T{x % 24:02d}:00:00Z"
+    return f"{date.fromordinal(x)}T00:00:00Z"
+
+
+def _slot_range(start_date: date, end_date: date, resolution: Resolution) -> tuple[int, int, int]:
+    """(first slot, last slot, number of periods) covering the inclusive date range."""
+    if resolution == "hour":
+        lo, hi = start_date.toordinal() * 24, end_date.toordinal() * 24 + 23
+        return lo, hi, hi - lo + 1
+    if resolution == "week":
+        lo = (start_date - timedelta(days=start_date.weekday())).toordinal()
+        hi = (end_date - timedelta(days=end_date.weekday())).toordinal()
+        return lo, hi, (hi - lo) // 7 + 1
+    if resolution == "month":
+        lo, hi = start_date.replace(day=1).toordinal(), end_date.replace(day=1).toordinal()
+        return lo, hi, (end_date.year - start_date.year) * 12 + end_date.month - start_date.month + 1
+    lo, hi = start_date.toordinal(), end_date.toordinal()
+    return lo, hi, hi - lo + 1
+
+
+class TimelineRowBuilder:
+    """
+    Regroup (slot, metric_name, value) rows arriving in slot order into timeline rows.
+    With max_points, each metric goes through StreamingLTTB over the slot range and a
+    slot only carries the metrics kept on it; a slot is released once no sampler can
+    still emit onto it, so memory is bounded by the LTTB bucket width.
+    Ranges of at most max_points periods are passed through unchanged.
+    """
+
+    def __init__(self, x_min: int, x_max: int, n_periods: int, max_points: int | None = None):
+        self.x_min = x_min
+        self.x_max = x_max
+        self.downsample = max_points is not None and n_periods > max_points
+        self.max_points = max_points
+        self._samplers: dict[str, StreamingLTTB] = {}
+        self._pending: dict[int, dict[str, float]] = {}
+        self._current: int | None = None
+
+    @classmethod
+    def for_range(
+        cls, start_date: date, end_date: date, resolution: Resolution, max_points: int | None = None
+    ) -> "TimelineRowBuilder":
+        return cls(*_slot_range(start_date, end_date, resolution), max_points)
+
+    def _release(self, before: float) -> list[TimelineRow]:
+        ready = sorted(x for x in self._pending if x < before)
+        return [(x, self._pending.pop(x)) for x in ready]
+
+    def push(self, x: int, metric_name: str, value: float) -> list[TimelineRow]:
+        out: list[TimelineRow] = []
+        if x != self._current:
+            frontiers = (s.frontier for s in self._samplers.values())
+            out = self._release(min(x, *frontiers) if self._samplers else x)
+            self._current = x
+        if not self.downsample:
+            self._pending.setdefault(x, {})[metric_name] = value
+            return out
+        sampler = self._samplers.get(metric_name)
+        if sampler is None:
+            sampler = self._samplers[metric_name] = StreamingLTTB(self.x_min, self.x_max, self.max_points)
+        for px, py in sampler.push(x, value):
+            self._pending.setdefault(int(px), {})[metric_name] = py
+        return out
+
+    def finish(self) -> list[TimelineRow]:
+        for metric_name, sampler in self._samplers.items():
+            for px, py in sampler.finish():
+                self._pending.setdefault(int(px), {})[metric_name] = py
+        return self._release(math.inf)
+
+
+def timeline_from_rows(
+    rows: Iterable[PeriodRow],
     start_date: date,
     end_date: date,
-    user_id: str | None = None,
+    resolution: Resolution = "day",
+    max_points: int | None = None,
+) -> TimelineResponse:
+    """Build timeline points from (period, metric_name, value) rows ordered by period."""
+    builder = TimelineRowBuilder.for_range(start_date, end_date, resolution, max_points)
+    out = [r for period, metric_name, value in rows for r in builder.push(_slot(period, resolution), metric_name, value)]
+    out += builder.finish()
+    return TimelineResponse(
+        points=[TimelinePoint(ts=_slot_ts(x, resolution), metrics=metrics) for x, metrics in out]
+    )
+
+
+def timeline_from_buckets(
+    by_metric: DailyBuckets,
+    start_date: date,
+    end_date: date,
+    max_points: int | None = None,
 ) -> TimelineResponse:
     """
-    Return daily-bucketed, time-aligned timeline points from HealthMetric.
-    Multiple rows per (day, metric_name) are averaged. Date range inclusive.
+    Pivot pre-fetched daily buckets into one point per day within [start_date, end_date].
+    max_points downsamples each metric with LTTB (see TimelineRowBuilder).
     """
-    start_dt = datetime.combine(start_date, time.min, tzinfo=timezone.utc)
-    end_dt = datetime.combine(end_date, time.min, tzinfo=timezone.utc)
-    end_dt += timedelta(days=1)  # exclusive upper bound
-
-    day_col = func.date_trunc("day", HealthMetric.ts).label("day")
-    stmt = (
-        select(
-            day_col,
-            HealthMetric.metric_name,
-            func.avg(HealthMetric.value).label("avg_value"),
+    if max_points is not None:
+        rows = sorted(
+            (d, metric_name, value)
+            for metric_name, series in by_metric.items()
+            for d, value in series.items()
+            if start_date <= d <= end_date
         )
-        .where(HealthMetric.ts >= start_dt, HealthMetric.ts < end_dt)
-        .group_by(day_col, HealthMetric.metric_name)
-        .order_by(day_col)
-    )
-    if user_id is not None:
-        stmt = stmt.where(HealthMetric.user_id == user_id)
-
-    rows = db.execute(stmt).all()
+        return timeline_from_rows(rows, start_date, end_date, "day", max_points)
 
-    by_day: dict[datetime, dict[str, float]] = defaultdict(dict)
-    for row in rows:
-        day_ts = row.day
-        if isinstance(day_ts, datetime):
-            key = day_ts
-        else:
-            key = datetime.combine(day_ts, time.min, tzinfo=timezone.utc)
-        by_day[key][row.metric_name] = float(row.avg_value)
+    by_day: dict[date, dict[str, float]] = defaultdict(dict)
+    for metric_name, series in by_metric.items():
+        for d, value in series.items():
+            if start_date <= d <= end_date:
+                by_day[d][metric_name] = value
 
     points = [
         TimelinePoint(
-            ts=f"{day_ts.date()}T00:00:00Z",
+            ts=f"{d}T00:00:00Z",
             metrics=dict(metrics),
         )
-        for day_ts, metrics in sorted(by_day.items())
+        for d, metrics in sorted(by_day.items())
     ]
     return TimelineResponse(points=points)
+
+
+def get_timeline(
+    db: Session,
+    start_date: date,
+    end_date: date,
+    user_id: str | None = None,
+    max_points: int | None = None,
+    resolution: Resolution = "day",
+) -> TimelineResponse:
+    """
+    Return time-aligned timeline points from HealthMetric, one per period of `resolution`.
+    Multiple rows per (period, metric_name) are averaged. Date range inclusive.
+    """
+    if resolution != "day":
+        with timed("get_timeline", "fetch"):
+            rows = fetch_period_rows(db, start_date, end_date, user_id, resolution)
+        with timed("get_timeline", "compute"):
+            return timeline_from_rows(rows, start_date, end_date, resolution, max_points)
+    with timed("get_timeline", "fetch"):
+        by_metric = fetch_daily_buckets(db, start_date, end_date, user_id)
+    with timed("get_timeline", "compute"):
+        return timeline_from_buckets(by_metric, start_date, end_date, max_points)
+
+
+async def get_timeline_async(
+    db: AsyncSession,
+    start_date: date,
+    end_date: date,
+    user_id: str | None = None,
+    max_points: int | None = None,
+    resolution: Resolution = "day",
+) -> TimelineResponse:
+    """get_timeline on an AsyncSession; the pivot runs in a worker thread."""
+    if resolution != "day":
+        with timed("get_timeline", "fetch"):
+            rows = await fetch_period_rows_async(db, start_date, end_date, user_id, resolution)
+        with timed("get_timeline", "compute"):
+            return await to_thread.run_sync(
+                timeline_from_rows, rows, start_date, end_date, resolution, max_points
+            )
+    with timed("get_timeline", "fetch"):
+        by_metric = await fetch_daily_buckets_async(db, start_date, end_date, user_id)
+    with timed("get_timeline", "compute"):
+        return await to_thread.run_sync(
+            timeline_from_buckets, by_metric, start_date, end_date, max_points
+        )
+
+
+def _ndjson(rows: Sequence[TimelineRow], resolution: Resolution) -> bytes:
+    return "".join(
+        json.dumps({"ts": _slot_ts(x, resolution), "metrics": metrics}, separators=(",", ":")) + "\n"
+        for x, metrics in rows
+    ).encode()
+
+
+async def _period_row_batches(
+    db: AsyncSession,
+    start_date: date,
+    end_date: date,
+    user_id: str | None,
+    resolution: Resolution,
+) -> AsyncIterator[Sequence[PeriodRow]]:
+    """(period, metric_name, avg_value) rows in period order, STREAM_BATCH_ROWS at a time."""
+    if ANALYTICS_BACKEND == "duckdb":
+        rows = await fetch_period_rows_async(db, start_date, end_date, user_id, resolution)
+        for i in range(0, len(rows), STREAM_BATCH_ROWS):
+            yield rows[i : i + STREAM_BATCH_ROWS]
+        return
+    stmt = period_avg_select(start_date, end_date, user_id, resolution)
+    result = await db.stream(stmt.execution_options(yield_per=STREAM_BATCH_ROWS))
+    async for partition in result.partitions():
+        yield [(r.period, r.metric_name, float(r.avg_value)) for r in partition]
+
+
+async def stream_timeline(
+    db: AsyncSession,
+    start_date: date,
+    end_date: date,
+    user_id: str | None = None,
+    max_points: int | None = None,
+    resolution: Resolution = "day",
+) -> AsyncIterator[bytes]:
+    """
+    get_timeline as NDJSON, one TimelinePoint per line, read from a server-side cursor
+    and emitted per fetched batch, so memory does not grow with the range.
+    """
+    builder = TimelineRowBuilder.for_range(start_date, end_date, resolution, max_points)
+    n_rows = 0
+    async for batch in _period_row_batches(db, start_date, end_date, user_id, resolution):
+        n_rows += len(batch)
+        out = [
+            r
+            for period, metric_name, value in batch
+            for r in builder.push(_slot(period, resolution), metric_name, value)
+        ]
+        if out:
+            yield _ndjson(out, resolution)
+    tail = builder.finish()
+    if tail:
+        yield _ndjson(tail, resolution)
+    query_rows.observe(n_rows, "timeline_stream")
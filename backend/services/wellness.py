@@ -1,15 +1,33 @@
 """
 Deterministic wellness score from HealthMetric daily buckets.
 No DB writes; explainable component scores and trend.
+compute_cohort_wellness scores a page of users from one query, all users at once on
+a (user, metric, day) array, with the same rules as the single-user score.
+compute_wellness_history scores every day of a range from per-metric prefix sums.
 """
-from collections import defaultdict
-from datetime import date, datetime, time, timedelta, timezone
+from collections.abc import Sequence
+from datetime import date, timedelta
 
-from sqlalchemy import func, select
+import numpy as np
+from anyio import to_thread
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from models.health_metric import HealthMetric
-from schemas.analytics import WellnessScoreResponse
+from core.metrics import timed
+from schemas.analytics import (
+    CohortMemberScore,
+    CohortWellnessResponse,
+    WellnessHistoryPoint,
+    WellnessScoreResponse,
+)
+from services.buckets import (
+    DailyBuckets,
+    UserDayRow,
+    fetch_cohort_rows,
+    fetch_cohort_rows_async,
+    fetch_daily_buckets,
+    fetch_daily_buckets_async,
+)
 
 WINDOW_DAYS = 30
 BASELINE_DAYS = 23  # [end-30, end-8]
@@ -24,42 +42,7 @@ ALL_METRICS = METRICS_HIGHER_BETTER | METRICS_LOWER_BETTER
 TREND_UP_THRESHOLD = 5
 TREND_DOWN_THRESHOLD = -5
 
-
-def _daily_buckets(
-    db: Session,
-    start_dt: datetime,
-    end_dt: datetime,
-    user_id: str | None,
-) -> dict[str, dict[date, float]]:
-    """Return metric_name -> {date -> avg_value} for [start_dt, end_dt)."""
-    day_col = func.date_trunc("day", HealthMetric.ts).label("day")
-    stmt = (
-        select(
-            day_col,
-            HealthMetric.metric_name,
-            func.avg(HealthMetric.value).label("avg_value"),
-        )
-        .where(HealthMetric.ts >= start_dt, HealthMetric.ts < end_dt)
-        .group_by(day_col, HealthMetric.metric_name)
-        .order_by(day_col)
-    )
-    if user_id is not None:
-        stmt = stmt.where(HealthMetric.user_id == user_id)
-    rows = db.execute(stmt).all()
-
-    by_metric: dict[str, dict[date, float]] = defaultdict(dict)
-    for row in rows:
-        day_ts = row.day
-        if hasattr(day_ts, "date"):
-            d = day_ts.date()
-        else:
-            d = (
-                day_ts
-                if isinstance(day_ts, date)
-                else datetime.combine(day_ts, time.min, tzinfo=timezone.utc).date()
-            )
-        by_metric[row.metric_name][d] = float(row.avg_value)
-    return dict(by_metric)
+COHORT_PAGE_SIZE = 100
 
 
 def _component_score(
@@ -83,7 +66,7 @@ def _component_score(
 
 
 def _score_for_window_end(
-    by_metric: dict[str, dict[date, float]],
+    by_metric: DailyBuckets,
     window_end: date,
 ) -> tuple[int, dict[str, int]]:
     """
@@ -121,6 +104,45 @@ def _score_for_window_end(
     return max(0, min(100, overall)), components
 
 
+def _trend(diff: int) -> str:
+    if diff >= TREND_UP_THRESHOLD:
+        return "up"
+    if diff <= TREND_DOWN_THRESHOLD:
+        return "down"
+    return "flat"
+
+
+def wellness_query_window(start_date: date, end_date: date) -> tuple[date, date]:
+    """Inclusive day range needed to score the window ending at end_date plus its trend."""
+    return end_date - timedelta(days=WINDOW_DAYS + QUERY_PAD_DAYS), end_date
+
+
+def wellness_history_window(start_date: date, end_date: date) -> tuple[date, date]:
+    """Inclusive day range needed to score every day in [start_date, end_date] with trends."""
+    return start_date - timedelta(days=WINDOW_DAYS + QUERY_PAD_DAYS), end_date
+
+
+def compute_wellness_from_buckets(
+    by_metric: DailyBuckets,
+    end_date: date,
+) -> WellnessScoreResponse:
+    """Score and trend from pre-fetched daily buckets covering wellness_query_window."""
+    score_recent7, components = _score_for_window_end(by_metric, end_date)
+    score_prev7, _ = _score_for_window_end(by_metric, end_date - timedelta(days=RECENT_DAYS))
+
+    if not components:
+        top_driver = None
+    else:
+        top_driver = max(components.keys(), key=lambda m: abs(components[m] - 50))
+
+    return WellnessScoreResponse(
+        score=score_recent7,
+        components=components,
+        trend=_trend(score_recent7 - score_prev7),
+        top_driver=top_driver,
+    )
+
+
 def compute_wellness_score(
     db: Session,
     start_date: date,
@@ -131,32 +153,269 @@ def compute_wellness_score(
     Compute wellness score from daily-bucketed metrics in 30-day window ending at end_date.
     Trend compares overall score at end_date vs end_date-7. Deterministic.
     """
-    query_start = end_date - timedelta(days=WINDOW_DAYS + QUERY_PAD_DAYS)
-    start_dt = datetime.combine(query_start, time.min, tzinfo=timezone.utc)
-    end_dt = datetime.combine(end_date, time.min, tzinfo=timezone.utc)
-    end_dt += timedelta(days=1)
+    query_start, query_end = wellness_query_window(start_date, end_date)
+    with timed("compute_wellness_score", "fetch"):
+        by_metric = fetch_daily_buckets(db, query_start, query_end, user_id)
+    with timed("compute_wellness_score", "compute"):
+        return compute_wellness_from_buckets(by_metric, end_date)
 
-    by_metric = _daily_buckets(db, start_dt, end_dt, user_id)
 
-    score_recent7, components = _score_for_window_end(by_metric, end_date)
-    score_prev7, _ = _score_for_window_end(by_metric, end_date - timedelta(days=RECENT_DAYS))
+async def compute_wellness_score_async(
+    db: AsyncSession,
+    start_date: date,
+    end_date: date,
+    user_id: str | None = None,
+) -> WellnessScoreResponse:
+    """compute_wellness_score on an AsyncSession; scoring runs in a worker thread."""
+    with timed("compute_wellness_score", "fetch"):
+        by_metric = await fetch_daily_buckets_async(
+            db, *wellness_query_window(start_date, end_date), user_id
+        )
+    with timed("compute_wellness_score", "compute"):
+        return await to_thread.run_sync(compute_wellness_from_buckets, by_metric, end_date)
 
-    diff = score_recent7 - score_prev7
-    if diff >= TREND_UP_THRESHOLD:
-        trend = "up"
-    elif diff <= TREND_DOWN_THRESHOLD:
-        trend = "down"
-    else:
-        trend = "flat"
 
-    if not components:
-        top_driver = None
+def _scores_from_sums(
+    base_sum: np.ndarray, base_n: np.ndarray, recent_sum: np.ndarray, recent_n: np.ndarray, higher: np.ndarray
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    _component_score and the overall score for many windows at once, from per-window
+    baseline/recent sums and day counts shaped [window, metric]. Returns (overall[w],
+    components[w, m]) with NaN for components lacking data; overall is 0 without any.
+    """
+    ok = (base_n > 0) & (recent_n > 0) & (base_n + recent_n >= MIN_DAYS)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        base_mean = base_sum / base_n
+        recent_mean = recent_sum / recent_n
+        rel = (recent_mean - base_mean) / np.maximum(np.abs(base_mean), 1e-6)
+    adj = np.where(higher, rel, -rel)
+    components = np.where(ok, np.clip(np.round(50 + 200 * adj), 0, 100), np.nan)
+    n_components = ok.sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        overall = np.round(np.nansum(components, axis=1) / n_components)
+    overall = np.where(n_components > 0, np.clip(overall, 0, 100), 0).astype(int)
+    return overall, components
+
+
+def _window_scores(values: np.ndarray, higher: np.ndarray, end: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    _score_for_window_end for every user at once. values[u, m, t] is NaN where a day is
+    missing and `end` is the window end's index on t; see _scores_from_sums.
+    """
+    baseline = values[:, :, end - WINDOW_DAYS : end - RECENT_DAYS]  # [end-30, end-8]
+    recent = values[:, :, end - RECENT_DAYS + 1 : end + 1]  # [end-6, end]
+    return _scores_from_sums(
+        np.nansum(baseline, axis=2),
+        np.count_nonzero(~np.isnan(baseline), axis=2),
+        np.nansum(recent, axis=2),
+        np.count_nonzero(~np.isnan(recent), axis=2),
+        higher,
+    )
+
+
+def _score_fields(score: int, diff: int, components: np.ndarray, metrics: list[str]) -> dict:
+    """WellnessScoreResponse fields for one window from a components[m] row."""
+    present = np.flatnonzero(~np.isnan(components))
+    distance = np.abs(components[present] - 50)
+    return {
+        "score": int(score),
+        "components": {metrics[j]: int(components[j]) for j in present},
+        "trend": _trend(int(diff)),
+        # first maximum in metrics order, as max() over the components dict
+        "top_driver": metrics[present[np.argmax(distance)]] if present.size else None,
+    }
+
+
+def score_cohort(rows: Sequence[UserDayRow], user_ids: Sequence[str], end_date: date) -> list[CohortMemberScore]:
+    """
+    Wellness scores for user_ids (in that order) from their daily rows covering
+    wellness_query_window; same results as compute_wellness_from_buckets per user.
+    Rows of other users or metrics are ignored.
+    """
+    metrics = list(ALL_METRICS)  # same order as the per-user loop, so ties pick the same driver
+    metric_index = {m: i for i, m in enumerate(metrics)}
+    user_index = {u: i for i, u in enumerate(user_ids)}
+    query_start, _ = wellness_query_window(end_date, end_date)
+    n_days = (end_date - query_start).days + 1
+    values = np.full((len(user_ids), len(metrics), n_days), np.nan)
+    if rows:
+        users, metric_names, days, avgs = zip(*rows)
+        u = np.array([user_index.get(x, -1) for x in users])
+        m = np.array([metric_index.get(x, -1) for x in metric_names])
+        t = np.array([d.toordinal() for d in days]) - query_start.toordinal()
+        keep = (u >= 0) & (m >= 0) & (t >= 0) & (t < n_days)
+        values[u[keep], m[keep], t[keep]] = np.asarray(avgs, dtype=float)[keep]
+
+    higher = np.array([m in METRICS_HIGHER_BETTER for m in metrics])
+    end = n_days - 1
+    score, components = _window_scores(values, higher, end)
+    prev_score, _ = _window_scores(values, higher, end - RECENT_DAYS)
+    diff = score - prev_score
+    return [
+        CohortMemberScore(user_id=user_id, **_score_fields(score[i], diff[i], components[i], metrics))
+        for i, user_id in enumerate(user_ids)
+    ]
+
+
+def _cohort_page(
+    rows: list[UserDayRow], user_ids: Sequence[str] | None, limit: int
+) -> tuple[list[str], list[UserDayRow], str | None]:
+    """Members of this page, their rows and the next cursor, from a limit + 1 fetch."""
+    if user_ids is not None:
+        members = list(user_ids[:limit])
+        more = len(user_ids) > limit
     else:
-        top_driver = max(components.keys(), key=lambda m: abs(components[m] - 50))
+        members = list(dict.fromkeys(r[0] for r in rows))  # rows are ordered by user_id
+        more = len(members) > limit
+        members = members[:limit]
+    if more:
+        last = members[-1]
+        rows = [r for r in rows if r[0] <= last]
+    return members, rows, members[-1] if more else None
 
-    return WellnessScoreResponse(
-        score=score_recent7,
-        components=components,
-        trend=trend,
-        top_driver=top_driver,
+
+def _explicit_page(user_ids: Sequence[str] | None, after: str | None, limit: int) -> list[str] | None:
+    if user_ids is None:
+        return None
+    return sorted(u for u in set(user_ids) if after is None or u > after)[: limit + 1]
+
+
+def compute_cohort_wellness(
+    db: Session,
+    end_date: date,
+    user_ids: Sequence[str] | None = None,
+    user_prefix: str | None = None,
+    limit: int = COHORT_PAGE_SIZE,
+    after: str | None = None,
+) -> CohortWellnessResponse:
+    """
+    Wellness score per user for a page of at most `limit` users ordered by id, after the
+    cursor `after`. Users are user_ids when given (scored even without data), otherwise
+    those with data in the window whose id starts with user_prefix (all when None).
+    One query fetches every member's daily rows; scoring is vectorized over users.
+    """
+    query_start, query_end = wellness_query_window(end_date, end_date)
+    page_ids = _explicit_page(user_ids, after, limit)
+    with timed("compute_cohort_wellness", "fetch"):
+        rows = fetch_cohort_rows(
+            db,
+            query_start,
+            query_end,
+            ALL_METRICS,
+            user_ids=page_ids[:limit] if page_ids is not None else None,
+            user_prefix=user_prefix,
+            after=after,
+            limit=limit + 1,
+        )
+    with timed("compute_cohort_wellness", "compute"):
+        members, rows, next_cursor = _cohort_page(rows, page_ids, limit)
+        users = score_cohort(rows, members, end_date)
+    return CohortWellnessResponse(end_date=end_date, users=users, next_cursor=next_cursor)
+
+
+async def compute_cohort_wellness_async(
+    db: AsyncSession,
+    end_date: date,
+    user_ids: Sequence[str] | None = None,
+    user_prefix: str | None = None,
+    limit: int = COHORT_PAGE_SIZE,
+    after: str | None = None,
+) -> CohortWellnessResponse:
+    """compute_cohort_wellness on an AsyncSession; scoring runs in a worker thread."""
+    query_start, query_end = wellness_query_window(end_date, end_date)
+    page_ids = _explicit_page(user_ids, after, limit)
+    with timed("compute_cohort_wellness", "fetch"):
+        rows = await fetch_cohort_rows_async(
+            db,
+            query_start,
+            query_end,
+            ALL_METRICS,
+            user_ids=page_ids[:limit] if page_ids is not None else None,
+            user_prefix=user_prefix,
+            after=after,
+            limit=limit + 1,
+        )
+
+    def _score() -> tuple[list[CohortMemberScore], str | None]:
+        members, page_rows, next_cursor = _cohort_page(rows, page_ids, limit)
+        return score_cohort(page_rows, members, end_date), next_cursor
+
+    with timed("compute_cohort_wellness", "compute"):
+        users, next_cursor = await to_thread.run_sync(_score)
+    return CohortWellnessResponse(end_date=end_date, users=users, next_cursor=next_cursor)
+
+
+def wellness_history_from_buckets(
+    by_metric: DailyBuckets,
+    start_date: date,
+    end_date: date,
+) -> list[WellnessHistoryPoint]:
+    """
+    compute_wellness_from_buckets for every day in [start_date, end_date], from buckets
+    covering wellness_history_window. Baseline and recent sums and day counts of each
+    window are differences of per-metric prefix sums, so cost is linear in the range.
+    """
+    metrics = list(ALL_METRICS)
+    query_start, _ = wellness_history_window(start_date, end_date)
+    first = query_start.toordinal()
+    n_days = (end_date - query_start).days + 1
+    values = np.zeros((len(metrics), n_days))
+    present = np.zeros((len(metrics), n_days), dtype=bool)
+    for m, metric_name in enumerate(metrics):
+        for d, value in by_metric.get(metric_name, {}).items():
+            t = d.toordinal() - first
+            if 0 <= t < n_days:
+                values[m, t] = value
+                present[m, t] = True
+    sums = np.zeros((len(metrics), n_days + 1))
+    np.cumsum(values, axis=1, out=sums[:, 1:])
+    counts = np.zeros((len(metrics), n_days + 1), dtype=int)
+    np.cumsum(present, axis=1, out=counts[:, 1:])
+
+    # window ends from start_date-7 (for the first trend) to end_date; prefix index i covers days < i
+    ends = np.arange(WINDOW_DAYS, n_days)
+    base_lo, base_hi = ends - WINDOW_DAYS, ends - RECENT_DAYS  # [end-30, end-8]
+    recent_lo, recent_hi = ends - RECENT_DAYS + 1, ends + 1  # [end-6, end]
+    score, components = _scores_from_sums(
+        (sums[:, base_hi] - sums[:, base_lo]).T,
+        (counts[:, base_hi] - counts[:, base_lo]).T,
+        (sums[:, recent_hi] - sums[:, recent_lo]).T,
+        (counts[:, recent_hi] - counts[:, recent_lo]).T,
+        np.array([m in METRICS_HIGHER_BETTER for m in metrics]),
     )
+    diff = score[RECENT_DAYS:] - score[:-RECENT_DAYS]
+    return [
+        WellnessHistoryPoint(
+            day=start_date + timedelta(days=i),
+            **_score_fields(score[i + RECENT_DAYS], diff[i], components[i + RECENT_DAYS], metrics),
+        )
+        for i in range(len(diff))
+    ]
+
+
+def compute_wellness_history(
+    db: Session,
+    start_date: date,
+    end_date: date,
+    user_id: str | None = None,
+) -> list[WellnessHistoryPoint]:
+    """Wellness score, components and trend for each day in the range, from one bucket fetch."""
+    with timed("compute_wellness_history", "fetch"):
+        by_metric = fetch_daily_buckets(db, *wellness_history_window(start_date, end_date), user_id)
+    with timed("compute_wellness_history", "compute"):
+        return wellness_history_from_buckets(by_metric, start_date, end_date)
+
+
+async def compute_wellness_history_async(
+    db: AsyncSession,
+    start_date: date,
+    end_date: date,
+    user_id: str | None = None,
+) -> list[WellnessHistoryPoint]:
+    """compute_wellness_history on an AsyncSession; scoring runs in a worker thread."""
+    with timed("compute_wellness_history", "fetch"):
+        by_metric = await fetch_daily_buckets_async(
+            db, *wellness_history_window(start_date, end_date), user_id
+        )
+    with timed("compute_wellness_history", "compute"):
+        return await to_thread.run_sync(wellness_history_from_buckets, by_metric, start_date, end_date)
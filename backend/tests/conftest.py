@@ -0,0 +1,84 @@
+"""
+Tests run against the PostgreSQL database in DATABASE_URL (schema created with
+db.schema.create_schema) and are skipped when it is unreachable. Each test writes
+under its own pytest-* user ids, removed afterwards.
+
+    DATABASE_URL=postgresql+psycopg2://... uv run --with pytest python -m pytest
+"""
+import threading
+import uuid
+from collections.abc import Callable, Iterator
+
+import pytest
+from sqlalchemy import delete, text
+from sqlalchemy.exc import OperationalError
+
+from db.schema import create_schema
+from db.session import SessionLocal, engine
+from services.ingest import write_batch
+from models import (
+    AnalyticsSnapshot,
+    Anomaly,
+    AnomalyWatermark,
+    HealthMetric,
+    HealthMetricDaily,
+    UserDataVersion,
+)
+
+_USER_TABLES = (HealthMetric, HealthMetricDaily, Anomaly, AnomalyWatermark, AnalyticsSnapshot, UserDataVersion)
+
+
+@pytest.fixture(scope="session")
+def database() -> None:
+    try:
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+    except OperationalError as exc:
+        pytest.skip(f"PostgreSQL not reachable: {exc.orig}")
+    create_schema(engine)
+
+
+@pytest.fixture
+def make_user(database) -> Iterator:
+    """Factory for fresh user ids; their rows in every per-user table are deleted after the test."""
+    created: list[str] = []
+
+    def make() -> str:
+        created.append(f"pytest-{uuid.uuid4().hex[:12]}")
+        return created[-1]
+
+    yield make
+    if created:
+        with SessionLocal() as db:
+            for model in _USER_TABLES:
+                db.execute(delete(model).where(model.user_id.in_(created)))
+            db.commit()
+
+
+@pytest.fixture
+def write_concurrently() -> Callable[..., None]:
+    """Run write_batch for each batch in its own thread and session, released together."""
+
+    def write(*batches: list[dict]) -> None:
+        barrier = threading.Barrier(len(batches))
+        errors: list[BaseException] = []
+
+        def run(rows: list[dict]) -> None:
+            db = SessionLocal()
+            try:
+                barrier.wait()
+                write_batch(db, rows)
+            except BaseException as exc:  # re-raised in the test thread
+                errors.append(exc)
+            finally:
+                db.close()
+
+        threads = [threading.Thread(target=run, args=(rows,)) for rows in batches]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        if errors:
+            raise errors[0]
+
+    return write
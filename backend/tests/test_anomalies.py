@@ -0,0 +1,75 @@
+from datetime import date, datetime, time, timedelta, timezone
+
+import numpy as np
+import pytest
+
+from db.session import SessionLocal
+from scripts.check_anomaly_modes import compare
+from services.anomalies import RollingBaseline, detect_anomalies, exact_z
+from services.ingest import write_batch
+
+START = date(2024, 1, 1)
+END = date(2024, 4, 30)
+CONSTANT = 61.7  # 30 copies have a stddev_samp of ~1.7e-14 in Postgres, not 0
+
+
+def _series(rng: np.random.Generator) -> dict[str, list[float | None]]:
+    """Daily values per metric over START..END; None = no data that day."""
+    n = (END - START).days + 1
+    noisy = rng.normal(60.0, 3.0, n)
+    noisy[[45, 46, 47, 90]] += [25.0, 22.0, 18.0, -20.0]
+    steps = rng.normal(8000.0, 1500.0, n)
+    steps[70] = 20000.0
+    sparse = [float(v) if i % 3 else None for i, v in enumerate(rng.normal(7.0, 0.5, n))]
+    sparse[60] = 12.0
+    constant = [CONSTANT] * n
+    constant[40] = 70.0  # after a constant baseline: no variance, so no z either way
+    return {"resting_hr": noisy.tolist(), "steps": steps.tolist(), "sleep_hours": sparse, "weight": constant}
+
+
+@pytest.fixture
+def anomaly_user(make_user) -> str:
+    user_id = make_user()
+    rows = [
+        {
+            "user_id": user_id,
+            "source": "pytest",
+            "metric_name": metric_name,
+            "value": value,
+            "unit": "x",
+            "ts": datetime.combine(START + timedelta(days=i), time(9), tzinfo=timezone.utc),
+            "metadata_": None,
+        }
+        for metric_name, values in _series(np.random.default_rng(7)).items()
+        for i, value in enumerate(values)
+        if value is not None
+    ]
+    with SessionLocal() as db:
+        write_batch(db, rows)
+    return user_id
+
+
+def test_sql_mode_matches_python_mode(anomaly_user):
+    with SessionLocal() as db:
+        for start in (START, date(2024, 2, 10)):
+            python_out = detect_anomalies(db, start, END, user_id=anomaly_user, mode="python")
+            sql_out = detect_anomalies(db, start, END, user_id=anomaly_user, mode="sql")
+            assert python_out
+            assert compare(python_out, sql_out) == []
+
+
+def test_constant_baseline_scores_nothing_in_either_mode(anomaly_user):
+    with SessionLocal() as db:
+        for mode in ("python", "sql"):
+            out = detect_anomalies(db, START, END, user_id=anomaly_user, mode=mode)
+            assert [a for a in out if a.metric_name == "weight"] == [], mode
+
+
+def test_near_constant_baseline_is_treated_as_constant():
+    baseline = [CONSTANT] * 29 + [CONSTANT + 1e-13]
+    assert exact_z(baseline, 70.0) is None
+    assert exact_z([CONSTANT, CONSTANT + 1.0] * 15, 70.0) is not None
+
+    streaming = RollingBaseline()
+    days = [START + timedelta(days=i) for i in range(31)]
+    assert [streaming.observe(d, v) for d, v in zip(days, baseline + [70.0])] == [None] * 31
@@ -0,0 +1,54 @@
+from datetime import date, datetime, time, timedelta, timezone
+
+from sqlalchemy import func, select
+
+from db.session import SessionLocal
+from models import Anomaly, AnomalyWatermark
+from services.anomalies import detect_anomalies_from_buckets
+from services.anomaly_store import stored_anomalies
+from services.buckets import fetch_rollup_buckets
+
+START = date(2024, 1, 1)
+DAYS = 90
+SPIKES = {45: 30.0, 46: 28.0, 47: 25.0, 75: -20.0}
+
+
+def _value(i: int) -> float:
+    return 60.0 + (i * 7 % 5) - 2 + SPIKES.get(i, 0.0)
+
+
+def _rows(user_id: str, days: range) -> list[dict]:
+    return [
+        {
+            "user_id": user_id,
+            "source": "pytest",
+            "metric_name": "resting_hr",
+            "value": _value(i),
+            "unit": "bpm",
+            "ts": datetime.combine(START + timedelta(days=i), time(12), tzinfo=timezone.utc),
+            "metadata_": None,
+        }
+        for i in days
+    ]
+
+
+def test_overlapping_ingest_batches_store_the_same_windows_as_one_pass(make_user, write_concurrently):
+    end = START + timedelta(days=DAYS - 1)
+    for _ in range(3):  # interleavings vary run to run; a few rounds make one likely
+        user_id = make_user()
+        # Both batches span the whole range on alternate days of one series: no rollup row
+        # is shared, so nothing but the detector lock orders their invalidate/advance.
+        write_concurrently(_rows(user_id, range(0, DAYS, 2)), _rows(user_id, range(1, DAYS, 2)))
+
+        with SessionLocal() as db:
+            expected = detect_anomalies_from_buckets(fetch_rollup_buckets(db, START, end, user_id), START, end)
+            stored = stored_anomalies(db, START, end, user_id)
+            rows = db.scalar(select(func.count()).select_from(Anomaly).where(Anomaly.user_id == user_id))
+            mark = db.scalar(select(AnomalyWatermark.last_day).where(AnomalyWatermark.user_id == user_id))
+
+        assert expected, "fixture should contain anomalies"
+        assert sorted((a.start_ts, a.end_ts, a.severity) for a in stored) == sorted(
+            (a.start_ts, a.end_ts, a.severity) for a in expected
+        )
+        assert rows == len(stored)
+        assert mark == end
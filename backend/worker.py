@@ -0,0 +1,35 @@
+"""
+Standalone precompute worker: same scheduler as PRECOMPUTE_ENABLED in the API,
+in its own process so precompute does not compete with request handling.
+
+    uv run python worker.py [--once] [--end-date 2024-03-30] [--interval 300] [--concurrency 4]
+"""
+import argparse
+import logging
+from datetime import date
+
+import anyio
+
+from core.config import PRECOMPUTE_CONCURRENCY, PRECOMPUTE_INTERVAL_S
+from services.precompute import PrecomputeScheduler
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Precompute analytics snapshots for active users.")
+    parser.add_argument("--once", action="store_true", help="Run a single pass and exit")
+    parser.add_argument("--end-date", type=date.fromisoformat, help="Window end (default: today UTC)")
+    parser.add_argument("--interval", type=float, default=PRECOMPUTE_INTERVAL_S)
+    parser.add_argument("--concurrency", type=int, default=PRECOMPUTE_CONCURRENCY)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    scheduler = PrecomputeScheduler(interval_s=args.interval, concurrency=args.concurrency)
+    if args.once:
+        anyio.run(scheduler.run_once, args.end_date)
+        print(scheduler.stats())
+    else:
+        anyio.run(scheduler.run_forever, args.end_date)
+
+
+if __name__ == "__main__":
+    main()